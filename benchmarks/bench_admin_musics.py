@@ -0,0 +1,107 @@
+"""Benchmark de la réponse GET /api/admin/musics (500 lignes).
+
+Compare la sérialisation en une passe (serialization.dump_list) à l'ancien
+chemin : construction manuelle des modèles puis revalidation par response_model.
+
+Usage : python benchmarks/bench_admin_musics.py [--rows 500] [--runs 50]
+(nécessite httpx pour le TestClient de FastAPI)
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # Base SQLite et uploads temporaires
+
+import database
+database.engine.echo = False
+
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlmodel import Session, select
+from sqlalchemy.orm import selectinload
+from typing import List
+from main import app
+from models import User, UserRole, Music, MusicStatus, MusicFullRead, UserReade
+from routers.auth import get_password_hash, create_access_token
+from serialization import dump_list
+
+def seed(rows: int) -> str:
+    """Créer un admin, 20 artistes et `rows` musiques ; retourne un jeton admin"""
+    database.create_db_and_tables()
+    with Session(database.engine) as session:
+        admin = User(email="admin@bench", username="admin", hashed_password=get_password_hash("x"), role=UserRole.ADMIN)
+        artists = [
+            User(email=f"artist{i}@bench", username=f"artist{i}", hashed_password="x", role=UserRole.ARTISTE, full_name=f"Artist {i}")
+            for i in range(20)
+        ]
+        session.add(admin)
+        session.add_all(artists)
+        session.flush()
+        session.add_all([
+            Music(
+                title=f"Track {i}", description="Lorem ipsum " * 5, genre="Rock",
+                file_path=f"uploads/music/{i}.mp3", is_free=i % 3 == 0, price_cents=199,
+                status=MusicStatus.PUBLISHED, artist_id=artists[i % 20].id
+            )
+            for i in range(rows)
+        ])
+        session.commit()
+        return create_access_token({"user_id": admin.id})
+
+def legacy_serialize(musics) -> bytes:
+    """Ancien chemin : modèles construits champ par champ puis revalidés"""
+    built = []
+    for music in musics:
+        artist = music.artist
+        built.append(MusicFullRead(
+            id=music.id, title=music.title, description=music.description, genre=music.genre,
+            duration=music.duration, file_path=music.file_path, cover_image_path=music.cover_image_path,
+            is_free=music.is_free, price=music.price, status=music.status, play_count=music.play_count,
+            download_count=music.download_count, artist_id=music.artist_id, created_at=music.created_at,
+            updated_at=music.updated_at,
+            artist=UserReade(
+                id=artist.id, email=artist.email, username=artist.username, full_name=artist.full_name or "",
+                role=artist.role.value, is_active=artist.is_active
+            )
+        ))
+    adapter = TypeAdapter(List[MusicFullRead])
+    return adapter.dump_json(adapter.validate_python(built, from_attributes=True))
+
+def timed(label: str, func, runs: int) -> None:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    print(f"{label:<28} p50={statistics.median(samples):7.2f} ms  p95={samples[int(len(samples) * 0.95) - 1]:7.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    
+    token = seed(args.rows)
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    with Session(database.engine) as session:
+        musics = session.exec(select(Music).options(selectinload(Music.artist)).limit(args.rows)).all()
+        assert legacy_serialize(musics) == dump_list(MusicFullRead, musics)
+        print(f"Sérialisation de {len(musics)} musiques")
+        timed("  ancien chemin", lambda: legacy_serialize(musics), args.runs)
+        timed("  dump_list", lambda: dump_list(MusicFullRead, musics), args.runs)
+    
+    with TestClient(app) as client:
+        url = f"/api/admin/musics?limit={args.rows}"
+        assert len(client.get(url, headers=headers).json()) == args.rows
+        print(f"Requête complète GET {url}")
+        timed("  GET /api/admin/musics", lambda: client.get(url, headers=headers), args.runs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Benchmark des listes paginées : projections de colonnes contre entités ORM.
+
+Pour chaque liste (parcours client, utilisateurs et musiques admin, codes de
+paiement d'un artiste), compare sur une page de 500 lignes :
+- l'ancien chemin : select(Entité) (+ selectinload de l'artiste), instances ORM
+  suivies par la session, puis dump_list ;
+- la projection : select(*Projection.columns), tuples, puis Projection.dump.
+
+Mesure la latence (requête + sérialisation) et le pic mémoire (tracemalloc).
+
+Usage : python benchmarks/bench_projections.py [--rows 500] [--runs 30]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())  # Base SQLite temporaire
+
+import database
+database.engine.echo = False
+database.sql_logger.setLevel(logging.ERROR)
+
+from sqlmodel import Session, select, desc
+from sqlalchemy.orm import selectinload
+from models import User, UserRole, Music, MusicStatus, PaymentCode, MusicRead, MusicFullRead, UserReade, PaymentCodeRead
+from serialization import dump_list
+from routers.client import MUSIC_READ
+from routers.admin import USER_READ, MUSIC_FULL_READ
+from routers.artiste import PAYMENT_CODE_READ
+
+def seed(rows: int) -> int:
+    """`rows` clients, 20 artistes, `rows` musiques et `rows` codes ; retourne l'artiste des codes"""
+    database.create_db_and_tables()
+    now = datetime.utcnow()
+    with Session(database.engine) as session:
+        artists = [
+            User(email=f"artist{i}@bench", username=f"artist{i}", hashed_password="x", role=UserRole.ARTISTE, full_name=f"Artist {i}")
+            for i in range(20)
+        ]
+        session.add_all(artists)
+        session.add_all([
+            User(email=f"client{i}@bench", username=f"client{i}", hashed_password="x", role=UserRole.CLIENT, full_name=f"Client {i}")
+            for i in range(rows)
+        ])
+        session.flush()
+        musics = [
+            Music(
+                title=f"Track {i}", description="Lorem ipsum " * 5, genre="Rock",
+                file_path=f"uploads/music/{i}.mp3", is_free=i % 3 == 0, price_cents=0 if i % 3 == 0 else 199,
+                status=MusicStatus.PUBLISHED, artist_id=artists[i % 20].id, created_at=now - timedelta(minutes=i)
+            )
+            for i in range(rows)
+        ]
+        session.add_all(musics)
+        session.flush()
+        session.add_all([
+            PaymentCode(code=f"B{i:011d}", music_id=musics[0].id, price_cents=199, expires_at=now + timedelta(hours=24))
+            for i in range(rows)
+        ])
+        session.commit()
+        return artists[0].id
+
+def measure(func, runs: int):
+    """(latence p50 en ms, pic mémoire en Kio)"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(samples), peak / 1024
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+    
+    artist_id = seed(args.rows)
+    limit = args.rows
+    published = Music.status == MusicStatus.PUBLISHED
+    
+    def run(build):
+        # Une session par appel, comme une requête HTTP
+        def call():
+            with Session(database.engine) as session:
+                return build(session)
+        return call
+    
+    cases = {
+        "GET /client/musiques": (
+            run(lambda s: dump_list(MusicRead, s.exec(
+                select(Music).where(published).options(selectinload(Music.artist))
+                .limit(limit).order_by(desc(Music.created_at))
+            ).all())),
+            run(lambda s: MUSIC_READ.dump(MusicRead, s.exec(
+                select(*MUSIC_READ.columns).join(User, User.id == Music.artist_id).where(published)
+                .limit(limit).order_by(desc(Music.created_at))
+            ).all())),
+        ),
+        "GET /admin/users": (
+            run(lambda s: dump_list(UserReade, s.exec(
+                select(User).limit(limit).order_by(desc(User.created_at))
+            ).all())),
+            run(lambda s: USER_READ.dump(UserReade, s.exec(
+                select(*USER_READ.columns).limit(limit).order_by(desc(User.created_at))
+            ).all())),
+        ),
+        "GET /admin/musics": (
+            run(lambda s: dump_list(MusicFullRead, s.exec(
+                select(Music).options(selectinload(Music.artist)).limit(limit).order_by(desc(Music.created_at))
+            ).all())),
+            run(lambda s: MUSIC_FULL_READ.dump(MusicFullRead, s.exec(
+                select(*MUSIC_FULL_READ.columns).join(User, User.id == Music.artist_id)
+                .limit(limit).order_by(desc(Music.created_at))
+            ).all())),
+        ),
+        "GET /artiste/codes-paiement": (
+            run(lambda s: dump_list(PaymentCodeRead, s.exec(
+                select(PaymentCode).join(Music).where(Music.artist_id == artist_id)
+            ).all())),
+            run(lambda s: PAYMENT_CODE_READ.dump(PaymentCodeRead, s.exec(
+                select(*PAYMENT_CODE_READ.columns).join(Music).where(Music.artist_id == artist_id)
+            ).all())),
+        ),
+    }
+    
+    print(f"Pages de {limit} lignes, médiane sur {args.runs} appels\n")
+    print(f"{'':28} {'ORM':>20} {'projection':>20}")
+    for name, (orm, projection) in cases.items():
+        assert orm() == projection(), name
+        orm_ms, orm_kib = measure(orm, args.runs)
+        projection_ms, projection_kib = measure(projection, args.runs)
+        print(
+            f"{name:28} {orm_ms:8.2f} ms {orm_kib:7.0f} Kio {projection_ms:8.2f} ms {projection_kib:7.0f} Kio"
+            f"   x{orm_ms / projection_ms:.1f} / -{1 - projection_kib / orm_kib:.0%}"
+        )
+
+if __name__ == "__main__":
+    main()
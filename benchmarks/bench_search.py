@@ -0,0 +1,120 @@
+"""Benchmark de la recherche approchée (index trigramme) sur une base générée.
+
+Prend des titres et des noms d'artistes de la base, y introduit des fautes
+de frappe (substitution, suppression, inversion, doublement), puis mesure la
+latence et le rappel (le morceau visé est-il dans les 10 premiers résultats)
+de la recherche trigramme, comparée au filtre ilike précédent.
+
+Usage :
+    python benchmarks/seed.py --workdir /tmp/evazo-bench --tracks 1000000 ...
+    python benchmarks/bench_search.py --workdir /tmp/evazo-bench [--queries 200]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def add_typo(value: str, rng: random.Random) -> str:
+    """Une faute de frappe au hasard, hors premier caractère"""
+    if len(value) < 4:
+        return value
+    position = rng.randint(1, len(value) - 2)
+    kind = rng.choice(["substitute", "delete", "swap", "double"])
+    if kind == "substitute":
+        return value[:position] + rng.choice("aeioursnt") + value[position + 1:]
+    if kind == "delete":
+        return value[:position] + value[position + 1:]
+    if kind == "swap":
+        return value[:position] + value[position + 1] + value[position] + value[position + 2:]
+    return value[:position] + value[position] + value[position:]
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def report(name: str, latencies, hits: int, timeouts: int = 0) -> None:
+    count = len(latencies)
+    print(
+        f"{name:42} n={count:4}  p50 {percentile(latencies, 0.5):7.1f} ms  p95 {percentile(latencies, 0.95):7.1f} ms  "
+        f"p99 {percentile(latencies, 0.99):7.1f} ms  max {max(latencies):7.1f} ms  "
+        f"rappel@10 {hits / count:5.1%}  dépassements {timeouts}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la recherche approchée")
+    parser.add_argument("--workdir", required=True, help="Dossier généré par benchmarks/seed.py")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.chdir(args.workdir)
+    import database
+    database.engine.echo = False
+    database.sql_logger.setLevel(logging.ERROR)
+    from sqlmodel import Session, select, func, or_
+    from models import Music, MusicStatus, User
+    from search import music_search, SearchTimeout
+
+    started = time.perf_counter()
+    music_search.setup()
+    print(f"Index prêt en {time.perf_counter() - started:.1f} s")
+
+    rng = random.Random(args.seed)
+    published = Music.status == MusicStatus.PUBLISHED
+    with Session(database.engine) as session:
+        total = session.exec(select(func.count(Music.id))).one()
+        max_id = session.exec(select(func.max(Music.id))).one()
+        targets = []
+        while len(targets) < args.queries:
+            row = session.exec(
+                select(Music.id, Music.title, User.full_name, Music.is_free)
+                .join(User, User.id == Music.artist_id)
+                .where(published, Music.id >= rng.randint(1, max_id))
+                .limit(1)
+            ).first()
+            if row:
+                targets.append(row)
+    print(f"{total} morceaux, {len(targets)} requêtes\n")
+
+    cases = {
+        "titre exact": lambda row: row.title,
+        "titre avec faute": lambda row: add_typo(row.title, rng),
+        "titre + artiste avec faute": lambda row: add_typo(f"{row.title} {row.full_name}", rng),
+    }
+    for name, make_query in cases.items():
+        queries = [(row, make_query(row)) for row in targets]
+        for label, filtered in ((name, False), (name + " (gratuit)", True)):
+            fuzzy, fuzzy_hits, timeouts = [], 0, 0
+            baseline, baseline_hits = [], 0
+            for row, query in queries:
+                conditions = [published] + ([Music.is_free == row.is_free] if filtered else [])
+                with Session(database.engine) as session:
+                    started = time.perf_counter()
+                    try:
+                        ids = music_search.search_ids(session, query, conditions, 10) or []
+                    except SearchTimeout:
+                        ids = []
+                        timeouts += 1
+                    fuzzy.append((time.perf_counter() - started) * 1000)
+                    fuzzy_hits += row.id in ids
+
+                    # Ancien chemin : ilike sur titre / description, tri par date
+                    started = time.perf_counter()
+                    ids = session.exec(
+                        select(Music.id).where(*conditions, or_(
+                            Music.title.ilike(f"%{query}%"), Music.description.ilike(f"%{query}%")
+                        )).order_by(Music.created_at.desc()).limit(10)
+                    ).all()
+                    baseline.append((time.perf_counter() - started) * 1000)
+                    baseline_hits += row.id in ids
+            report("trigramme · " + label, fuzzy, fuzzy_hits, timeouts)
+            report("ilike     · " + label, baseline, baseline_hits)
+        print()
+
+if __name__ == "__main__":
+    main()
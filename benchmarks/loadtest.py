@@ -0,0 +1,373 @@
+"""Test de charge reproductible sur une base générée par benchmarks/seed.py.
+
+Rejoue un mélange de trafic pondéré (parcours du catalogue, écoute, achat,
+téléchargement, tableaux de bord) avec N clients concurrents, puis affiche
+p50/p95/p99 par opération et le débit global. Le résultat est écrit en JSON
+(avec le commit courant) pour comparer deux versions du code.
+
+Usage :
+    python benchmarks/seed.py --workdir bench-data
+    python benchmarks/loadtest.py --workdir bench-data --mix mixed --requests 5000 --output before.json
+    git checkout <autre commit>
+    python benchmarks/loadtest.py --workdir bench-data --mix mixed --requests 5000 --compare before.json
+
+Sans --base-url l'application tourne dans le processus (TestClient, nécessite httpx) ;
+avec --base-url on cible un serveur uvicorn lancé depuis --workdir (avec
+QUERY_DEBUG_HEADERS=1 pour relever le nombre de requêtes SQL par opération, et
+RATE_LIMIT_ENABLED=0). La limitation de débit est désactivée par défaut : des
+réponses 429, rapides, fausseraient les latences (--rate-limit pour la garder).
+Les colonnes 4xx / 429 / 5xx du rapport comptent les réponses en erreur.
+Les achats et téléchargements modifient la base : re-générer les données entre deux mesures.
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# ===== MÉLANGES DE TRAFIC =====
+
+MIXES = {
+    "browse": {"browse": 55, "browse_filtered": 15, "detail": 25, "favorites": 5},
+    "listen": {"stream": 50, "play_history_add": 30, "browse": 15, "play_history": 5},
+    "commerce": {"purchase": 25, "download": 35, "purchases": 20, "browse": 20},
+    "discovery": {"recommendations": 45, "charts": 25, "detail": 20, "stream": 10},
+    "dashboards": {"artist_stats": 40, "artist_tracks": 20, "admin_stats": 20, "admin_musics": 20},
+    "mixed": {
+        "browse": 30, "browse_filtered": 8, "detail": 15, "stream": 15, "play_history_add": 8,
+        "favorites": 4, "purchase": 3, "download": 7, "purchases": 4,
+        "artist_stats": 3, "admin_stats": 2, "admin_musics": 1,
+    },
+}
+
+GENRES = ["Pop", "Rock", "Hip-Hop", "Jazz", "Electro", "Salegy"]
+
+class Workload:
+    """Identifiants et jetons tirés de la base générée, partagés par les workers"""
+
+    def __init__(self, seed: int, users: int):
+        import database
+        from sqlalchemy import text
+        from routers.auth import create_access_token
+
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+        with database.engine.connect() as connection:
+            def ids(sql, **params):
+                return [row[0] for row in connection.execute(text(sql), params)]
+
+            clients = ids("SELECT id FROM users WHERE role = 'CLIENT' AND is_active = 1 ORDER BY id LIMIT :n", n=users)
+            artists = ids("SELECT artist_id FROM musics GROUP BY artist_id ORDER BY COUNT(*) DESC LIMIT :n", n=users)
+            admins = ids("SELECT id FROM users WHERE role = 'ADMIN' AND is_active = 1 LIMIT 1")
+            # Morceaux publiés classés par popularité : le tirage Zipf reproduit la distribution réelle
+            self.tracks = ids("SELECT id FROM musics WHERE status = 'PUBLISHED' ORDER BY play_count DESC")
+            self.free_tracks = ids("SELECT id FROM musics WHERE status = 'PUBLISHED' AND is_free = 1 ORDER BY play_count DESC")
+            self.owned = [
+                (row[0], row[1]) for row in connection.execute(text(
+                    "SELECT client_id, music_id FROM purchases WHERE download_count < max_downloads AND client_id IN "
+                    f"({','.join(str(client) for client in clients) or 'NULL'})"
+                ))
+            ]
+            self.codes = [
+                (row[0], row[1]) for row in connection.execute(text(
+                    "SELECT code, music_id FROM payment_codes WHERE is_used = 0 AND expires_at > :now"
+                ), {"now": datetime.utcnow()})
+            ]
+
+        if not clients or not self.tracks:
+            raise SystemExit("Base vide : lancer d'abord benchmarks/seed.py")
+
+        self.client_tokens = {client: create_access_token({"user_id": client}) for client in clients}
+        self.clients = clients
+        self.artist_tokens = [create_access_token({"user_id": artist}) for artist in artists]
+        self.admin_token = create_access_token({"user_id": admins[0]}) if admins else None
+        self.rng.shuffle(self.codes)
+
+        cumulative = list(itertools.accumulate(1.0 / rank for rank in range(1, len(self.tracks) + 1)))
+        self._track_weights = (cumulative, cumulative[-1])
+
+    def popular_track(self) -> int:
+        cumulative, total = self._track_weights
+        with self.lock:
+            value = self.rng.random()
+        return self.tracks[bisect.bisect_left(cumulative, value * total)]
+
+    def choice(self, items):
+        with self.lock:
+            return self.rng.choice(items)
+
+    def take_code(self):
+        """Chaque code n'est utilisable qu'une fois"""
+        with self.lock:
+            return self.codes.pop() if self.codes else None
+
+    def headers(self, token):
+        return {"Authorization": f"Bearer {token}"}
+
+    def client_headers(self, client_id=None):
+        if client_id is None:
+            client_id = self.choice(self.clients)
+        return self.headers(self.client_tokens[client_id])
+
+# ===== OPÉRATIONS =====
+# Chaque opération retourne (méthode, url, options de requête)
+
+def op_browse(work):
+    page = work.choice([0, 0, 0, 50, 100])
+    return "GET", f"/api/client/musiques?skip={page}&limit=50", {"headers": work.client_headers()}
+
+def op_browse_filtered(work):
+    genre = work.choice(GENRES)
+    is_free = work.choice(["true", "false"])
+    return "GET", f"/api/client/musiques?genre={genre}&is_free={is_free}&limit=20", {"headers": work.client_headers()}
+
+def op_detail(work):
+    return "GET", f"/api/client/musiques/{work.popular_track()}", {"headers": work.client_headers()}
+
+def op_recommendations(work):
+    return "GET", "/api/client/recommendations?limit=20", {"headers": work.client_headers()}
+
+def op_charts(work):
+    genre = work.choice([None, None] + GENRES)
+    query = f"&genre={genre}" if genre else ""
+    return "GET", f"/api/client/charts?chart={work.choice(['hot', 'weekly'])}&limit=20{query}", {"headers": work.client_headers()}
+
+def op_favorites(work):
+    return "GET", "/api/client/favorites", {"headers": work.client_headers()}
+
+def op_stream(work):
+    track = work.choice(work.free_tracks[:500]) if work.free_tracks else work.popular_track()
+    return "GET", f"/api/client/stream/{track}", {"headers": work.client_headers()}
+
+def op_play_history_add(work):
+    payload = {"music_id": work.popular_track(), "duration_played": work.choice([15, 60, 180])}
+    return "POST", "/api/client/play-history", {"headers": work.client_headers(), "json": payload}
+
+def op_play_history(work):
+    return "GET", "/api/client/play-history", {"headers": work.client_headers()}
+
+def op_purchase(work):
+    code = work.take_code()
+    if code is None:
+        return op_browse(work)
+    payload = {"music_id": code[1], "payment_code": code[0]}
+    return "POST", "/api/client/purchase", {"headers": work.client_headers(), "json": payload}
+
+def op_download(work):
+    if work.owned:
+        client_id, music_id = work.choice(work.owned)
+        return "GET", f"/api/client/download/{music_id}", {"headers": work.client_headers(client_id)}
+    return "GET", f"/api/client/download/{work.choice(work.free_tracks)}", {"headers": work.client_headers()}
+
+def op_purchases(work):
+    return "GET", "/api/client/purchases", {"headers": work.client_headers()}
+
+def op_artist_stats(work):
+    return "GET", "/api/artiste/statistiques", {"headers": work.headers(work.choice(work.artist_tokens))}
+
+def op_artist_tracks(work):
+    return "GET", "/api/artiste/musiques", {"headers": work.headers(work.choice(work.artist_tokens))}
+
+def op_admin_stats(work):
+    return "GET", "/api/admin/statistics", {"headers": work.headers(work.admin_token)}
+
+def op_admin_musics(work):
+    return "GET", "/api/admin/musics?limit=100", {"headers": work.headers(work.admin_token)}
+
+OPERATIONS = {name[3:]: function for name, function in globals().items() if name.startswith("op_")}
+
+# ===== EXÉCUTION =====
+
+def percentile(sorted_values, fraction: float) -> float:
+    """Percentile par interpolation linéaire sur une liste triée"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def summarize(latencies) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "mean_ms": round(statistics.fmean(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 0.50), 2),
+        "p95_ms": round(percentile(values, 0.95), 2),
+        "p99_ms": round(percentile(values, 0.99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0,
+    }
+
+def run(client, work, mix: dict, total_requests: int, concurrency: int, warmup: int, seed: int) -> dict:
+    """Répartir `total_requests` tirages du mélange sur `concurrency` workers"""
+    names = list(mix)
+    plan_rng = random.Random(seed)
+    plan = plan_rng.choices(names, weights=[mix[name] for name in names], k=warmup + total_requests)
+
+    for name in plan[:warmup]:
+        method, url, options = OPERATIONS[name](work)
+        client.request(method, url, **options)
+
+    plan = plan[warmup:]
+    cursor = itertools.count()
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    queries = defaultdict(list)
+    record_lock = threading.Lock()
+
+    def worker():
+        while True:
+            index = next(cursor)
+            if index >= len(plan):
+                return
+            name = plan[index]
+            method, url, options = OPERATIONS[name](work)
+            started = time.perf_counter()
+            response = client.request(method, url, **options)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with record_lock:
+                latencies[name].append(elapsed_ms)
+                statuses[name][response.status_code] += 1
+                if "x-query-count" in response.headers:
+                    queries[name].append(int(response.headers["x-query-count"]))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    operations = {}
+    for name in sorted(latencies):
+        summary = summarize(latencies[name])
+        summary["statuses"] = {str(code): count for code, count in sorted(statuses[name].items())}
+        summary["errors"] = sum(count for code, count in statuses[name].items() if code >= 500)
+        summary["client_errors"] = sum(count for code, count in statuses[name].items() if 400 <= code < 500)
+        summary["limited"] = statuses[name].get(429, 0)
+        if queries[name]:
+            summary["queries_mean"] = round(statistics.fmean(queries[name]), 2)
+        operations[name] = summary
+
+    overall = summarize([value for values in latencies.values() for value in values])
+    overall["throughput_rps"] = round(len(plan) / wall, 1)
+    for key in ("errors", "client_errors", "limited"):
+        overall[key] = sum(operation[key] for operation in operations.values())
+    overall["wall_s"] = round(wall, 2)
+    return {"overall": overall, "operations": operations}
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+
+# ===== RAPPORT =====
+
+def print_report(result: dict, previous: dict = None) -> None:
+    def delta(current, before):
+        if not before:
+            return ""
+        return f" ({(current - before) / before * 100:+.0f}%)"
+
+    print(f"\n{result['mix']} @ {result['revision']} — concurrence {result['concurrency']}")
+    print(f"{'opération':<18}{'n':>7}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'SQL':>7}{'4xx':>6}{'429':>6}{'5xx':>6}")
+    rows = list(result["operations"].items()) + [("TOTAL", result["overall"])]
+    for name, stats in rows:
+        before = (previous or {}).get("operations", {}).get(name) if name != "TOTAL" else (previous or {}).get("overall")
+        cells = [
+            f"{stats[key]:.1f}{delta(stats[key], (before or {}).get(key))}".rjust(18)
+            for key in ("p50_ms", "p95_ms", "p99_ms")
+        ]
+        print(
+            f"{name:<18}{stats['count']:>7}{''.join(cells)}{stats.get('queries_mean', ''):>7}"
+            f"{stats['client_errors']:>6}{stats['limited']:>6}{stats['errors']:>6}"
+        )
+
+    throughput = result["overall"]["throughput_rps"]
+    before = (previous or {}).get("overall", {}).get("throughput_rps")
+    print(f"\nDébit : {throughput} req/s{delta(throughput, before)}")
+    if previous:
+        print(f"Comparé à {previous['mix']} @ {previous['revision']} ({previous['timestamp']})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge E-Vazo")
+    parser.add_argument("--workdir", default="bench-data", help="Dossier généré par benchmarks/seed.py")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--users", type=int, default=200, help="Nombre de comptes clients/artistes simulés")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--base-url", help="Cibler un serveur déjà lancé au lieu du TestClient")
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    parser.add_argument("--compare", help="Résultats JSON d'une exécution précédente")
+    parser.add_argument("--rate-limit", action="store_true", help="Garder la limitation de débit (429) dans le processus")
+    args = parser.parse_args()
+
+    os.chdir(os.path.abspath(args.workdir))
+    if not os.path.exists("evazo.db"):
+        raise SystemExit(f"Aucune base dans {args.workdir} : lancer d'abord benchmarks/seed.py")
+
+    os.environ.setdefault("QUERY_DEBUG_HEADERS", "1")
+    os.environ["RATE_LIMIT_ENABLED"] = "1" if args.rate_limit else "0"
+    import logging
+    import database
+    database.engine.echo = False
+    database.sql_logger.setLevel(logging.ERROR)
+
+    work = Workload(args.seed, args.users)
+
+    if args.base_url:
+        import httpx
+        client = httpx.Client(base_url=args.base_url, timeout=30, limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        from fastapi.testclient import TestClient
+        from main import app
+        client = TestClient(app)
+
+    with client:
+        measured = run(client, work, MIXES[args.mix], args.requests, args.concurrency, args.warmup, args.seed)
+
+    result = {
+        "revision": git_revision(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "mix": args.mix,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "target": args.base_url or "in-process",
+        "rate_limit": args.rate_limit,
+        "python": platform.python_version(),
+        **measured,
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as handle:
+            previous = json.load(handle)
+    print_report(result, previous)
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(result, handle, indent=2)
+        print(f"Résultats écrits dans {args.output}")
+
+if __name__ == "__main__":
+    main()
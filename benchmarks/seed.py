@@ -0,0 +1,267 @@
+"""Remplir la base avec des données synthétiques réalistes.
+
+La popularité des morceaux et l'activité des clients suivent une loi de Zipf :
+quelques titres concentrent la majorité des écoutes, favoris et achats.
+Les insertions se font par lots (executemany) avec la journalisation SQLite
+désactivée pendant le chargement.
+
+Usage :
+    python benchmarks/seed.py --workdir /tmp/evazo-bench --clients 10000 --artists 500 \\
+        --tracks 50000 --plays 1000000 --favorites 100000 --purchases 50000 --codes 20000
+
+La base est créée dans `<workdir>/evazo.db` (chemin attendu par l'API lancée depuis ce dossier).
+Tous les comptes ont le mot de passe "password" ; l'admin est admin@seed.local.
+"""
+import argparse
+import logging
+import bisect
+import itertools
+import os
+import random
+import struct
+from collections import Counter
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BATCH_SIZE = 20000
+GENRES = ["Pop", "Rock", "Hip-Hop", "Jazz", "Electro", "Salegy", "Reggae", "Classique", "R&B", "Afrobeat"]
+GENRE_WEIGHTS = [30, 20, 18, 5, 10, 8, 4, 2, 2, 1]
+
+SYLLABLES = [consonant + vowel for consonant in ["b", "d", "f", "g", "h", "k", "l", "m", "n", "p", "r", "s", "t", "v", "z", "ts", "tr", "ny"]
+             for vowel in ["a", "e", "i", "o", "u", "y"]] + ["an", "on", "el", "ir", "ou", "ai"]
+
+def make_word(rng: random.Random) -> str:
+    """Mot inventé de 2 à 4 syllabes (titres et noms variés pour la recherche)"""
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+def make_title(rng: random.Random) -> str:
+    return " ".join(make_word(rng) for _ in range(rng.choice([1, 2, 2, 3]))).capitalize()
+
+def zipf_sampler(size: int, exponent: float, rng: random.Random):
+    """Tirage d'un indice dans [0, size) selon une loi de Zipf"""
+    cumulative = list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, size + 1)))
+    total = cumulative[-1]
+    return lambda: bisect.bisect_left(cumulative, rng.random() * total)
+
+def write_silent_wav(path: str, seconds: float, sample_rate: int = 8000) -> None:
+    """Petit fichier WAV mono 8 bits (silence)"""
+    frames = int(seconds * sample_rate)
+    header = b"RIFF" + struct.pack("<I", 36 + frames) + b"WAVE"
+    header += b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate, 1, 8)
+    header += b"data" + struct.pack("<I", frames)
+    with open(path, "wb") as audio:
+        audio.write(header + b"\x80" * frames)
+
+def insert_batches(connection, table, rows) -> int:
+    """Insérer un itérable de dictionnaires par lots"""
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            connection.execute(table.insert(), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        connection.execute(table.insert(), batch)
+        total += len(batch)
+    return total
+
+def seed(args) -> None:
+    os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir)
+    if os.path.exists("evazo.db") and not args.append:
+        os.remove("evazo.db")
+    
+    import database
+    database.engine.echo = False
+    database.sql_logger.setLevel(logging.ERROR)  # Chaque lot dépasse le seuil de requête lente
+    from sqlalchemy import text
+    from models import User, UserRole, Music, MusicStatus, PaymentCode, PaymentStatus, Purchase, Favorite, PlayHistory
+    from routers.auth import get_password_hash
+    
+    database.create_db_and_tables()
+    rng = random.Random(args.seed)
+    
+    # Genres normalisés : (id, nom canonique) par nom généré
+    from sqlmodel import Session
+    from genres import resolve_genre, seed_genre_aliases
+    with Session(database.engine) as session:
+        seed_genre_aliases(session)
+        genres = {name: resolve_genre(session, name) for name in GENRES}
+        session.commit()
+        genres = {name: (genre.id, genre.name) for name, genre in genres.items()}
+    now = datetime.utcnow()
+    password_hash = get_password_hash("password")  # Un seul hash bcrypt pour tous les comptes
+    
+    # Fichiers audio partagés entre les morceaux
+    os.makedirs(os.path.join("uploads", "music"), exist_ok=True)
+    audio_files = []
+    for index in range(args.audio_files):
+        path = os.path.join("uploads", "music", f"seed_{index}.wav")
+        write_silent_wav(path, seconds=rng.uniform(1, 5))
+        audio_files.append(path)
+    
+    started = time.perf_counter()
+    counts = {}
+    with database.engine.begin() as connection:
+        connection.execute(text("PRAGMA journal_mode=OFF"))
+        connection.execute(text("PRAGMA synchronous=OFF"))
+        
+        base_user_id = (connection.execute(text("SELECT COALESCE(MAX(id), 0) FROM users")).scalar() or 0) + 1
+        base_music_id = (connection.execute(text("SELECT COALESCE(MAX(id), 0) FROM musics")).scalar() or 0) + 1
+        base_code_id = (connection.execute(text("SELECT COALESCE(MAX(id), 0) FROM payment_codes")).scalar() or 0) + 1
+        
+        def users():
+            if not args.append:
+                yield dict(id=base_user_id - 1 + 1, email="admin@seed.local", username="admin", hashed_password=password_hash,
+                           full_name="Admin", role=UserRole.ADMIN, is_active=True, created_at=now)
+            offset = 0 if args.append else 1
+            for index in range(args.artists):
+                yield dict(id=base_user_id + offset + index, email=f"artist{base_user_id + index}@seed.local",
+                           username=f"artist{base_user_id + index}", hashed_password=password_hash,
+                           full_name=f"{make_word(rng).capitalize()} {make_word(rng).capitalize()}", role=UserRole.ARTISTE, is_active=True,
+                           artist_bio="Artiste généré", created_at=now - timedelta(days=rng.randint(0, 900)))
+            for index in range(args.clients):
+                yield dict(id=base_user_id + offset + args.artists + index, email=f"client{base_user_id + index}@seed.local",
+                           username=f"client{base_user_id + index}", hashed_password=password_hash,
+                           full_name=f"Client {index}", role=UserRole.CLIENT, is_active=rng.random() > 0.02,
+                           created_at=now - timedelta(days=rng.randint(0, 900)))
+        
+        counts["users"] = insert_batches(connection, User.__table__, users())
+        offset = 0 if args.append else 1
+        artist_ids = range(base_user_id + offset, base_user_id + offset + args.artists)
+        client_ids = range(base_user_id + offset + args.artists, base_user_id + offset + args.artists + args.clients)
+        
+        # Morceaux : quelques artistes très prolifiques
+        pick_artist = zipf_sampler(len(artist_ids), 0.8, rng)
+        paid_tracks = []
+        
+        def musics():
+            for index in range(args.tracks):
+                music_id = base_music_id + index
+                is_free = rng.random() < 0.4
+                if not is_free:
+                    paid_tracks.append(music_id)
+                status = rng.choices(
+                    [MusicStatus.PUBLISHED, MusicStatus.DRAFT, MusicStatus.ARCHIVED], [90, 7, 3]
+                )[0]
+                genre_id, genre = genres[rng.choices(GENRES, GENRE_WEIGHTS)[0]]
+                title = make_title(rng)
+                yield dict(id=music_id, title=title, description=f"{title} : {make_word(rng)} {make_word(rng)} {make_word(rng)}",
+                           genre=genre, genre_id=genre_id, duration=rng.randint(90, 420),
+                           file_path=audio_files[index % len(audio_files)], is_free=is_free,
+                           price_cents=0 if is_free else rng.choice([99, 149, 199, 299, 499]),
+                           status=status, play_count=0, download_count=0,
+                           artist_id=artist_ids[pick_artist()], created_at=now - timedelta(days=rng.randint(0, 700)))
+        
+        counts["musics"] = insert_batches(connection, Music.__table__, musics())
+        music_ids = range(base_music_id, base_music_id + args.tracks)
+        pick_track = zipf_sampler(len(music_ids), args.skew, rng)
+        pick_client = zipf_sampler(len(client_ids), 0.6, rng)
+        
+        play_counts = Counter()
+        download_counts = Counter()
+        
+        def plays():
+            for _ in range(args.plays):
+                music_id = music_ids[pick_track()]
+                play_counts[music_id] += 1
+                yield dict(user_id=client_ids[pick_client()], music_id=music_id,
+                           played_at=now - timedelta(seconds=rng.randint(0, 90 * 86400)),
+                           duration_played=rng.randint(5, 300))
+        
+        counts["play_history"] = insert_batches(connection, PlayHistory.__table__, plays())
+        
+        def favorites():
+            seen = set()
+            for _ in range(args.favorites):
+                pair = (client_ids[pick_client()], music_ids[pick_track()])
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                yield dict(user_id=pair[0], music_id=pair[1], created_at=now - timedelta(days=rng.randint(0, 300)))
+        
+        counts["favorites"] = insert_batches(connection, Favorite.__table__, favorites())
+        
+        # Codes de paiement : une partie sert aux achats, le reste est actif ou expiré
+        pick_paid = zipf_sampler(len(paid_tracks), args.skew, rng) if paid_tracks else None
+        purchase_codes = []
+        
+        def codes():
+            if not paid_tracks:
+                return
+            seen_purchases = set()
+            for index in range(args.purchases + args.codes):
+                code_id = base_code_id + index
+                music_id = paid_tracks[pick_paid()]
+                price_cents = 199
+                created_at = now - timedelta(days=rng.randint(0, 400))
+                used = index < args.purchases
+                if used:
+                    client_id = client_ids[pick_client()]
+                    if (client_id, music_id) in seen_purchases:
+                        used = False
+                    else:
+                        seen_purchases.add((client_id, music_id))
+                        purchase_codes.append((code_id, client_id, music_id, price_cents, created_at))
+                expires_at = created_at + timedelta(hours=24) if used or rng.random() < 0.7 else now + timedelta(hours=rng.randint(1, 48))
+                yield dict(id=code_id, code=f"S{code_id:011d}", music_id=music_id, price_cents=price_cents, is_used=used,
+                           status=PaymentStatus.COMPLETED if used else PaymentStatus.PENDING,
+                           expires_at=expires_at, created_at=created_at,
+                           used_at=created_at + timedelta(minutes=5) if used else None,
+                           used_by_client_id=client_id if used else None)
+        
+        counts["payment_codes"] = insert_batches(connection, PaymentCode.__table__, codes())
+        
+        def purchases():
+            for code_id, client_id, music_id, price_cents, created_at in purchase_codes:
+                downloads = rng.randint(0, 3)
+                download_counts[music_id] += downloads
+                yield dict(client_id=client_id, music_id=music_id, payment_code_id=code_id, amount_paid_cents=price_cents,
+                           status=PaymentStatus.COMPLETED, download_count=downloads, max_downloads=5,
+                           purchased_at=created_at + timedelta(minutes=5))
+        
+        counts["purchases"] = insert_batches(connection, Purchase.__table__, purchases())
+        
+        # Compteurs dénormalisés cohérents avec l'historique (comptés en Python, sans sous-requête corrélée)
+        counters = [
+            {"music_id": music_id, "plays": play_counts[music_id], "downloads": download_counts[music_id]}
+            for music_id in play_counts.keys() | download_counts.keys()
+        ]
+        if counters:
+            connection.execute(
+                text("UPDATE musics SET play_count = :plays, download_count = :downloads WHERE id = :music_id"),
+                counters,
+            )
+    
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    print(f"✅ {total} lignes insérées en {elapsed:.1f} s ({total / max(elapsed, 1e-9):,.0f} lignes/s)")
+    for table, count in counts.items():
+        print(f"   {table:<14} {count}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Générer des données synthétiques pour E-Vazo")
+    parser.add_argument("--workdir", default="bench-data", help="Dossier de la base et des uploads")
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--artists", type=int, default=100)
+    parser.add_argument("--tracks", type=int, default=5000)
+    parser.add_argument("--plays", type=int, default=100000)
+    parser.add_argument("--favorites", type=int, default=20000)
+    parser.add_argument("--purchases", type=int, default=10000)
+    parser.add_argument("--codes", type=int, default=5000, help="Codes non utilisés (actifs ou expirés)")
+    parser.add_argument("--audio-files", type=int, default=20, help="Fichiers audio partagés entre les morceaux")
+    parser.add_argument("--skew", type=float, default=1.1, help="Exposant de Zipf pour la popularité des morceaux")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--append", action="store_true", help="Ajouter à une base existante")
+    args = parser.parse_args()
+    args.workdir = os.path.abspath(args.workdir)
+    seed(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Archives ZIP de plusieurs morceaux, construites pendant l'envoi.
+
+Les entrées sont stockées sans compression (l'audio est déjà compressé) et
+écrites dans un flux non positionnable : zipfile ajoute alors un descripteur
+après chaque entrée (CRC calculé au fil de la lecture) et passe en ZIP64 si
+nécessaire. Ni fichier temporaire, ni morceau entier en mémoire : chaque bloc
+lu est envoyé aussitôt (tranches du cache de fichiers quand il les contient).
+"""
+from file_cache import file_cache
+from delivery import DELIVERY_CHUNK_BYTES, delivery_threads
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, NamedTuple, Set
+import anyio
+import re
+import zipfile
+
+# Configuration
+BUNDLE_MAX_TRACKS = 100
+
+UNSAFE_NAME = re.compile(r'[\x00-\x1f\\/:*?"<>|]+')
+
+class BundleEntry(NamedTuple):
+    name: str
+    path: str
+    size: int
+
+def entry_name(artist: str, title: str, path: str, used: Set[str]) -> str:
+    """Nom de l'entrée dans l'archive (« Artiste - Titre.ext »), unique et sans séparateur de chemin"""
+    stem = UNSAFE_NAME.sub("_", f"{artist} - {title}").strip(" .") or "musique"
+    extension = path.rsplit(".", 1)[-1] if "." in path else "mp3"
+    name, index = f"{stem}.{extension}", 2
+    while name.lower() in used:
+        name, index = f"{stem} ({index}).{extension}", index + 1
+    used.add(name.lower())
+    return name
+
+class ZipSink:
+    """Destination non positionnable : les blocs écrits par zipfile sont récupérés puis envoyés"""
+
+    def __init__(self):
+        self.parts: List = []
+
+    def write(self, data) -> int:
+        self.parts.append(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> List:
+        parts, self.parts = self.parts, []
+        return parts
+
+def iter_zip(entries: List[BundleEntry], chunk_size: int = DELIVERY_CHUNK_BYTES) -> Iterator:
+    sink = ZipSink()
+    date_time = datetime.now().timetuple()[:6]
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        for entry in entries:
+            info = zipfile.ZipInfo(entry.name, date_time=date_time)
+            info.file_size = entry.size  # Décide du ZIP64 avant l'écriture
+            with archive.open(info, "w") as target:
+                data = file_cache.get(entry.path)
+                if data is not None:
+                    for start in range(0, len(data), chunk_size):
+                        target.write(data[start:start + chunk_size])
+                        yield from sink.drain()
+                else:
+                    with open(entry.path, "rb") as source:
+                        while chunk := source.read(chunk_size):
+                            target.write(chunk)
+                            yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+async def stream_zip(entries: List[BundleEntry]) -> AsyncIterator:
+    """Archive produite sur les threads de livraison (pas ceux de l'API)"""
+    parts = iter_zip(entries)
+    try:
+        while True:
+            part = await anyio.to_thread.run_sync(next, parts, None, limiter=delivery_threads)
+            if part is None:
+                break
+            yield part
+    finally:
+        parts.close()
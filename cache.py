@@ -0,0 +1,194 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Dépendance optionnelle (backend partagé)
+    redis = None
+
+# Configuration
+CATALOG_CACHE_MAX_ENTRIES = 2048
+CATALOG_CACHE_TTL_SECONDS = 60  # Borne la fraîcheur des compteurs (écoutes, téléchargements)
+CATALOG_CACHE_URL = os.getenv("CATALOG_CACHE_URL")  # ex: redis://localhost:6379/0
+
+# ===== BACKENDS =====
+
+class InProcessBackend:
+    """Cache LRU borné en taille, propre au processus"""
+
+    def __init__(self, max_entries: int = CATALOG_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_version(self) -> int:
+        return self._version
+
+    def bump_version(self) -> int:
+        with self._lock:
+            self._version += 1
+            # Les entrées des versions précédentes ne seront plus jamais lues
+            self._entries.clear()
+            return self._version
+
+    def size(self) -> int:
+        return len(self._entries)
+
+class SharedBackend:
+    """Cache partagé entre workers, via un client compatible Redis (get / set / incr).
+
+    La version du catalogue est stockée dans le backend : un bump dans un worker
+    invalide le cache de tous les autres. Les valeurs sont sérialisées en JSON,
+    l'éviction est laissée au serveur (maxmemory-policy allkeys-lru).
+    """
+
+    VERSION_KEY = "catalog:version"
+
+    def __init__(self, client):
+        self.client = client
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        self.client.set(key, json.dumps(value), ex=ttl)
+
+    def get_version(self) -> int:
+        return int(self.client.get(self.VERSION_KEY) or 0)
+
+    def bump_version(self) -> int:
+        return int(self.client.incr(self.VERSION_KEY))
+
+    def size(self) -> int:
+        return -1  # Inconnu côté application
+
+class LocalSharedClient:
+    """Remplaçant local d'un serveur Redis (tests, développement)"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value, ex: Optional[int] = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            _, value = self._data.get(key, (None, 0))
+            value = int(value) + 1
+            self._data[key] = (None, value)
+            return value
+
+# ===== CACHE DU CATALOGUE =====
+
+def normalize_params(params: Dict[str, Any]) -> str:
+    """Clé stable pour un ensemble de filtres (ordre, casse, espaces, None ignorés)"""
+    normalized = {}
+    for name, value in params.items():
+        if value is None or value == "":
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.lower().split())
+        elif isinstance(value, float):
+            value = round(value, 2)
+        normalized[name] = value
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+class CatalogCache:
+    """Cache en lecture du catalogue publié, invalidé par numéro de version global"""
+
+    def __init__(self, backend, ttl: int = CATALOG_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._counters_lock = threading.Lock()  # Appelé depuis les threads du threadpool
+
+    def get_or_load(self, namespace: str, params: Dict[str, Any], loader: Callable[[], Any]) -> Any:
+        """Retourner la valeur en cache, ou l'obtenir via `loader` et la mémoriser.
+
+        La valeur doit être sérialisable en JSON (backend partagé).
+        """
+        key = f"catalog:v{self.backend.get_version()}:{namespace}:{normalize_params(params)}"
+        value = self.backend.get(key)
+        if value is not None:
+            with self._counters_lock:
+                self.hits += 1
+            return value
+        
+        with self._counters_lock:
+            self.misses += 1
+        value = loader()
+        self.backend.set(key, value, self.ttl)
+        return value
+
+    def bump_version(self) -> int:
+        """À appeler après chaque modification visible du catalogue publié"""
+        return self.backend.bump_version()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "version": self.backend.get_version(),
+            "entries": self.backend.size(),
+            "hits": hits,
+            "misses": misses,
+            "evictions": self.backend.evictions,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+def create_catalog_backend(url: Optional[str] = CATALOG_CACHE_URL):
+    """Backend partagé si une URL est configurée, sinon cache en mémoire"""
+    if not url:
+        return InProcessBackend()
+    if url == "local://":
+        return SharedBackend(LocalSharedClient())
+    if redis is None:
+        raise RuntimeError("CATALOG_CACHE_URL est défini mais le paquet 'redis' n'est pas installé")
+    return SharedBackend(redis.Redis.from_url(url))
+
+catalog_cache = CatalogCache(create_catalog_backend())
@@ -0,0 +1,290 @@
+"""Classements « tendances » à décroissance exponentielle, maintenus en mémoire.
+
+Chaque écoute, favori ou achat ajoute son poids au score du morceau ; ce poids
+perd la moitié de sa valeur toutes les `half_life` secondes. Les scores sont
+tenus en « décroissance différée » : un événement à l'instant t vaut
+poids × 2^((t - repère) / demi-vie). Tous les scores partagent le même facteur
+de décroissance, l'ordre ne change donc qu'à l'arrivée d'un événement et les
+scores ne font qu'augmenter : un tas-min de taille N suffit pour chaque top.
+
+Les scores sont enregistrés périodiquement dans chart_scores (fusion des
+deltas de chaque worker), puis rechargés.
+"""
+from sqlmodel import Session, select, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import engine
+from models import PlayHistory, Favorite, Purchase, PaymentStatus, Music, ChartScore
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import heapq
+import os
+import threading
+
+# Configuration
+CHART_SIZE = 100                # Entrées conservées par top (les non publiés sont filtrés à la lecture)
+CHART_SNAPSHOT_INTERVAL_SECONDS = 60
+CHART_RETENTION_HALF_LIVES = 20  # Au-delà, un score vaut moins d'un millionième de sa valeur
+EVENT_WEIGHTS = {"play": 1.0, "favorite": 3.0, "purchase": 5.0}
+RESCALE_EXPONENT = 512          # Recaler le repère avant que 2^exposant ne déborde
+
+def parse_half_lives(value: str) -> Dict[str, float]:
+    """« hot=6,weekly=84 » -> demi-vies en secondes par classement (heures en entrée)"""
+    half_lives = {}
+    for item in value.split(","):
+        name, hours = item.split("=")
+        half_lives[name.strip()] = float(hours) * 3600
+    return half_lives
+
+CHART_HALF_LIVES = parse_half_lives(os.getenv("CHART_HALF_LIVES", "hot=6,weekly=84"))
+
+def normalize_genre(genre: Optional[str]) -> Optional[str]:
+    if not genre:
+        return None
+    return " ".join(genre.lower().split()) or None
+
+def timestamp(moment: datetime) -> float:
+    """Secondes depuis l'époque (les dates de la base sont en UTC naïf)"""
+    return (moment - datetime(1970, 1, 1)).total_seconds()
+
+# ===== TOP-N =====
+
+class TopN:
+    """Les N meilleurs scores, pour des scores qui ne font qu'augmenter.
+
+    Tas-min des membres avec suppression paresseuse : une mise à jour empile
+    une nouvelle entrée, les entrées périmées sont écartées quand elles
+    remontent au sommet. Invariant : tout membre a un score >= tout non-membre.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._members: Dict[int, float] = {}
+        self._heap: List[Tuple[float, int]] = []
+
+    def offer(self, music_id: int, score: float) -> None:
+        if music_id in self._members:
+            self._members[music_id] = score
+            heapq.heappush(self._heap, (score, music_id))
+            if len(self._heap) > 4 * self.size:
+                self._heap = [(value, member) for member, value in self._members.items()]
+                heapq.heapify(self._heap)
+            return
+
+        if len(self._members) < self.size:
+            self._members[music_id] = score
+            heapq.heappush(self._heap, (score, music_id))
+            return
+
+        # Écarter les entrées périmées pour trouver le plus petit membre
+        while self._members.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        lowest_score, lowest_id = self._heap[0]
+        if score <= lowest_score:
+            return
+        heapq.heapreplace(self._heap, (score, music_id))
+        del self._members[lowest_id]
+        self._members[music_id] = score
+
+    def ranked(self) -> List[Tuple[int, float]]:
+        return sorted(self._members.items(), key=lambda item: item[1], reverse=True)
+
+# ===== CLASSEMENT =====
+
+class TrendingChart:
+    """Scores décroissants d'un classement (une demi-vie), top global et par genre"""
+
+    def __init__(self, name: str, half_life: float, genres: Dict[int, str], size: int = CHART_SIZE):
+        self.name = name
+        self.half_life = half_life
+        self.genres = genres
+        self.size = size
+        self.landmark = timestamp(datetime.utcnow())
+        self.scores: Dict[int, float] = {}
+        self.pending: Dict[int, float] = defaultdict(float)  # Apports locaux pas encore enregistrés
+        self.tops: Dict[Optional[str], TopN] = {}
+
+    def factor(self, at: float) -> float:
+        return 2.0 ** ((at - self.landmark) / self.half_life)
+
+    def add(self, music_id: int, weight: float, at: float) -> None:
+        if (at - self.landmark) / self.half_life > RESCALE_EXPONENT:
+            self.reset(self.decayed_scores(at), at)
+        value = weight * self.factor(at)
+        self.scores[music_id] = self.scores.get(music_id, 0.0) + value
+        self.pending[music_id] += value
+        self.offer(music_id)
+
+    def offer(self, music_id: int) -> None:
+        score = self.scores[music_id]
+        self.top(None).offer(music_id, score)
+        genre = self.genres.get(music_id)
+        if genre:
+            self.top(genre).offer(music_id, score)
+
+    def top(self, genre: Optional[str]) -> TopN:
+        top = self.tops.get(genre)
+        if top is None:
+            top = self.tops[genre] = TopN(self.size)
+        return top
+
+    def decayed_scores(self, at: float) -> Dict[int, float]:
+        """Scores réels à l'instant `at`"""
+        scale = 1.0 / self.factor(at)
+        return {music_id: score * scale for music_id, score in self.scores.items()}
+
+    def reset(self, decayed: Dict[int, float], at: float) -> None:
+        """Repartir de scores réels à l'instant `at` (nouveau repère), tops reconstruits"""
+        scale = 1.0 / self.factor(at)
+        self.pending = defaultdict(float, {music_id: value * scale for music_id, value in self.pending.items()})
+        self.landmark = at
+        self.scores = dict(decayed)
+        self.tops = {}
+        for music_id in self.scores:
+            self.offer(music_id)
+
+    def ranked(self, genre: Optional[str], limit: int, at: float) -> List[Tuple[int, float]]:
+        top = self.tops.get(genre)
+        if top is None:
+            return []
+        scale = 1.0 / self.factor(at)
+        return [(music_id, score * scale) for music_id, score in top.ranked()[:limit]]
+
+class ChartBook:
+    """Ensemble des classements, alimentés par les événements des routes client"""
+
+    def __init__(self, half_lives: Dict[str, float] = CHART_HALF_LIVES, size: int = CHART_SIZE):
+        self.genres: Dict[int, str] = {}
+        self.charts = {name: TrendingChart(name, half_life, self.genres, size) for name, half_life in half_lives.items()}
+        self._lock = threading.Lock()
+
+    def record(self, event: str, music_id: int, genre: Optional[str] = None, at: Optional[datetime] = None) -> None:
+        """Enregistrer une écoute / un favori / un achat (O(log N))"""
+        moment = timestamp(at or datetime.utcnow())
+        weight = EVENT_WEIGHTS[event]
+        genre = normalize_genre(genre) or self.genres.get(music_id)
+        with self._lock:
+            if genre:
+                self.genres[music_id] = genre
+            for chart in self.charts.values():
+                chart.add(music_id, weight, moment)
+
+    def top(self, chart: str, genre: Optional[str] = None, limit: int = 20) -> List[Tuple[int, float]]:
+        """(music_id, score) du meilleur au moins bon, sans calcul côté base"""
+        with self._lock:
+            return self.charts[chart].ranked(normalize_genre(genre), limit, timestamp(datetime.utcnow()))
+
+    # ===== PERSISTANCE =====
+
+    def snapshot(self) -> int:
+        """Ajouter les apports locaux aux scores enregistrés, puis recharger le total (tous workers).
+
+        La fusion score_enregistré × décroissance + apport est faite par SQLite,
+        en une requête atomique : plusieurs workers peuvent enregistrer en parallèle.
+        """
+        now = datetime.utcnow()
+        at = timestamp(now)
+        with self._lock:
+            deltas = {}
+            for name, chart in self.charts.items():
+                scale = 1.0 / chart.factor(at)
+                deltas[name] = {music_id: value * scale for music_id, value in chart.pending.items()}
+                chart.pending = defaultdict(float)
+            genres = dict(self.genres)
+
+        written = 0
+        with Session(engine) as session:
+            for name, chart_deltas in deltas.items():
+                half_life = self.charts[name].half_life
+                rows = [
+                    {"chart": name, "music_id": music_id, "genre": genres.get(music_id), "score": score, "scored_at": now}
+                    for music_id, score in chart_deltas.items()
+                ]
+                for start in range(0, len(rows), 500):
+                    statement = sqlite_insert(ChartScore).values(rows[start:start + 500])
+                    session.execute(statement.on_conflict_do_update(
+                        index_elements=["chart", "music_id"],
+                        set_={
+                            "score": statement.excluded.score
+                                + ChartScore.score * func.chart_decay(ChartScore.scored_at, statement.excluded.scored_at, half_life),
+                            "scored_at": statement.excluded.scored_at,
+                            "genre": func.coalesce(statement.excluded.genre, ChartScore.genre),
+                        }
+                    ))
+                written += len(rows)
+                session.exec(delete(ChartScore).where(
+                    ChartScore.chart == name,
+                    ChartScore.scored_at < now - timedelta(seconds=half_life * CHART_RETENTION_HALF_LIVES)
+                ))
+            session.commit()
+
+        self.load()
+        return written
+
+    def load(self) -> int:
+        """Recharger les scores enregistrés (plus les apports locaux arrivés entre-temps)"""
+        with Session(engine) as session:
+            rows = session.exec(
+                select(ChartScore.chart, ChartScore.music_id, ChartScore.genre, ChartScore.score, ChartScore.scored_at)
+            ).all()
+
+        at = timestamp(datetime.utcnow())
+        stored: Dict[str, Dict[int, float]] = defaultdict(dict)
+        genres: Dict[int, str] = {}
+        for name, music_id, genre, score, scored_at in rows:
+            chart = self.charts.get(name)
+            if chart is None:
+                continue
+            stored[name][music_id] = score * 2.0 ** ((timestamp(scored_at) - at) / chart.half_life)
+            if genre:
+                genres[music_id] = genre
+
+        with self._lock:
+            self.genres.update(genres)
+            for name, chart in self.charts.items():
+                # Apports locaux pas encore enregistrés : ajoutés au total, conservés pour le prochain instantané
+                decayed = stored.get(name, {})
+                scale = 1.0 / chart.factor(at)
+                for music_id, value in chart.pending.items():
+                    decayed[music_id] = decayed.get(music_id, 0.0) + value * scale
+                chart.reset(decayed, at)
+        return len(rows)
+
+    def backfill(self) -> int:
+        """Premier démarrage : reconstruire les scores depuis l'historique (agrégé par heure)"""
+        horizon = datetime.utcnow() - timedelta(seconds=max(
+            chart.half_life for chart in self.charts.values()
+        ) * CHART_RETENTION_HALF_LIVES)
+        sources = (
+            ("play", PlayHistory.music_id, PlayHistory.played_at, None),
+            ("favorite", Favorite.music_id, Favorite.created_at, None),
+            ("purchase", Purchase.music_id, Purchase.purchased_at, Purchase.status == PaymentStatus.COMPLETED),
+        )
+        with Session(engine) as session:
+            for music_id, genre in session.exec(select(Music.id, Music.genre).where(Music.genre.isnot(None))).all():
+                if normalize_genre(genre):
+                    self.genres[music_id] = normalize_genre(genre)
+            events = 0
+            for event, music_column, date_column, condition in sources:
+                hour = func.strftime("%Y-%m-%d %H:00:00", date_column)
+                statement = select(music_column, hour, func.count()).where(date_column >= horizon)
+                if condition is not None:
+                    statement = statement.where(condition)
+                for music_id, bucket, count in session.exec(statement.group_by(music_column, hour)).all():
+                    self.record_many(event, music_id, count, datetime.strptime(bucket, "%Y-%m-%d %H:%M:%S"))
+                    events += count
+        return events
+
+    def record_many(self, event: str, music_id: int, count: int, at: datetime) -> None:
+        moment = timestamp(at)
+        weight = EVENT_WEIGHTS[event] * count
+        with self._lock:
+            for chart in self.charts.values():
+                chart.add(music_id, weight, moment)
+
+    def start(self) -> None:
+        """Au démarrage : charger l'instantané, ou reconstruire depuis l'historique"""
+        if self.load() == 0 and self.backfill():
+            self.snapshot()
+
+chart_book = ChartBook()
@@ -0,0 +1,227 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Dict, Iterable, Optional
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Dépendance optionnelle
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Dépendance optionnelle
+    zstandard = None
+
+# Configuration par défaut
+COMPRESSION_MINIMUM_SIZE = 1024
+COMPRESSION_LEVEL = 6
+COMPRESSIBLE_CONTENT_TYPES = ("application/json", "text/")
+
+# ===== ENCODEURS =====
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = en-tête gzip
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+class BrotliEncoder:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+class ZstdEncoder:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+def available_encoders() -> Dict[str, type]:
+    """Encodeurs disponibles, par ordre de préférence du serveur"""
+    encoders = {}
+    if zstandard is not None:
+        encoders["zstd"] = ZstdEncoder
+    if brotli is not None:
+        encoders["br"] = BrotliEncoder
+    encoders["gzip"] = GzipEncoder
+    return encoders
+
+def negotiate_encoding(accept_encoding: str, supported: Iterable[str]) -> Optional[str]:
+    """Choisir l'encodage selon l'en-tête Accept-Encoding (valeurs q respectées)"""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            weights[name] = quality
+    
+    best, best_quality = None, 0.0
+    for encoding in supported:  # L'ordre du serveur départage les égalités
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+# ===== STATISTIQUES =====
+
+class CompressionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.by_encoding: Dict[str, int] = {}
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int) -> None:
+        with self._lock:
+            self.responses += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.by_encoding[encoding] = self.by_encoding.get(encoding, 0) + 1
+
+    def snapshot(self) -> Dict:
+        return {
+            "compressed_responses": self.responses,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "by_encoding": dict(self.by_encoding)
+        }
+
+compression_stats = CompressionStats()
+
+# ===== MIDDLEWARE =====
+
+class CompressionMiddleware:
+    """Compression gzip / brotli / zstd négociée des réponses JSON et texte.
+
+    Les types absents de la liste (audio, images, fichiers) ne sont jamais compressés.
+    Les réponses en streaming sont compressées au fil de l'eau.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+        level: int = COMPRESSION_LEVEL,
+        content_types: Iterable[str] = COMPRESSIBLE_CONTENT_TYPES,
+        stats: CompressionStats = compression_stats
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.content_types = tuple(content_types)
+        self.encoders = available_encoders()
+        self.stats = stats
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""), self.encoders)
+        if encoding is None or "range" in request_headers:
+            await self.app(scope, receive, send)
+            return
+        
+        responder = CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder)
+
+    def is_compressible(self, headers: Headers) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(self.content_types)
+
+class CompressionResponder:
+    """Intercepte les messages ASGI d'une réponse pour la compresser"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message: Optional[Message] = None
+        self.encoder = None
+        self.passthrough = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_length = headers.get("content-length")
+            too_small = content_length is not None and int(content_length) < self.middleware.minimum_size
+            self.passthrough = (
+                not self.middleware.is_compressible(headers)
+                or too_small
+                or message["status"] in (204, 206, 304)
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+        
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+        
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        
+        if self.encoder is None:
+            # Réponse complète trop petite : on l'envoie telle quelle
+            if not more_body and len(body) < self.middleware.minimum_size:
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            self.encoder = self.middleware.encoders[self.encoding](self.middleware.level)
+        
+        self.bytes_in += len(body)
+        chunk = self.encoder.compress(body)
+        if not more_body:
+            chunk += self.encoder.flush()
+        self.bytes_out += len(chunk)
+        
+        if self.start_message is not None:
+            # Corps complet en un seul message : la longueur compressée est connue
+            await self.send_start(None if more_body else len(chunk))
+        
+        if not more_body:
+            self.middleware.stats.record(self.encoding, self.bytes_in, self.bytes_out)
+        
+        if chunk or not more_body:
+            await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def send_start(self, content_length: Optional[int]) -> None:
+        headers = MutableHeaders(scope=self.start_message)
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+        await self.send(self.start_message)
+        self.start_message = None
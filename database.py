@@ -1,10 +1,91 @@
 from sqlmodel import SQLModel, create_engine, Session
 from fastapi import Depends
+from sqlalchemy import event
 from sqlalchemy.orm import configure_mappers
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Optional
+import logging
+import os
+import time
 
 
 DATABASE_URL = "sqlite:///evazo.db"
-engine = create_engine(DATABASE_URL, echo=True)
+engine = create_engine(DATABASE_URL, echo=os.getenv("SQL_ECHO", "0") == "1")
+
+# ===== FONCTIONS SQL =====
+
+def chart_decay(scored_at: str, now: str, half_life: float) -> float:
+    """Facteur de décroissance d'un score de tendance entre deux dates (voir charts.py)"""
+    elapsed = (datetime.fromisoformat(now) - datetime.fromisoformat(scored_at)).total_seconds()
+    return 2.0 ** (-elapsed / half_life)
+
+@event.listens_for(engine, "connect")
+def _register_functions(dbapi_connection, connection_record):
+    # Enregistré avec le moteur : toute connexion du pool dispose des fonctions
+    dbapi_connection.create_function("chart_decay", 3, chart_decay, deterministic=True)
+
+# ===== INSTRUMENTATION DES REQUÊTES SQL =====
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+REQUEST_QUERY_BUDGET = int(os.getenv("REQUEST_QUERY_BUDGET", "50"))
+
+sql_logger = logging.getLogger("evazo.sql")
+
+class QueryStats:
+    """Nombre et durée cumulée des requêtes SQL d'une requête HTTP"""
+    __slots__ = ("count", "duration", "scope", "profile")
+
+    def __init__(self, scope: Optional[Dict[str, Any]] = None):
+        self.count = 0
+        self.duration = 0.0
+        self.scope = scope
+        self.profile = None  # RequestProfile (profiling.py) quand la requête est profilée
+
+    @property
+    def route(self) -> str:
+        """Route d'origine (gabarit une fois le routage effectué)"""
+        if self.scope is None:
+            return "-"
+        route = getattr(self.scope.get("route"), "path", None) or self.scope.get("path", "-")
+        return f"{self.scope.get('method', '')} {route}"
+
+# Positionné par le middleware de métriques, propagé au threadpool par contextvars
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+def parameters_shape(parameters, executemany: bool) -> str:
+    """Forme des paramètres liés (types uniquement, jamais les valeurs)"""
+    if executemany:
+        count = len(parameters)
+        return f"{count} x {parameters_shape(parameters[0], False)}" if count else "[]"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{name}: {type(value).__name__}" for name, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+@event.listens_for(engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._query_started_at = time.perf_counter()
+
+@event.listens_for(engine, "after_cursor_execute")
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started_at
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += elapsed
+        if stats.profile is not None:
+            stats.profile.record_query(statement, parameters_shape(parameters, executemany), elapsed)
+    
+    if elapsed * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+        sql_logger.warning(
+            "Requête SQL lente (%.1f ms) route=%s params=%s sql=%s",
+            elapsed * 1000,
+            stats.route if stats is not None else "-",
+            parameters_shape(parameters, executemany),
+            " ".join(statement.split())
+        )
 
 def create_db_and_tables():
     configure_mappers()
@@ -13,4 +94,4 @@ def create_db_and_tables():
 def get_session():
     with Session(engine) as session:
         yield session
-        print("Session closed")
\ No newline at end of file
+        print("Session closed")
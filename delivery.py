@@ -0,0 +1,202 @@
+"""Livraison des fichiers audio (stream et téléchargement), séparée de l'API.
+
+Chaque livraison occupe un créneau, de l'entrée dans la route jusqu'à la fin
+de l'envoi du corps : au plus DELIVERY_MAX_CONCURRENT livraisons en même temps,
+dont DELIVERY_MAX_PER_USER par utilisateur. Les demandes en trop attendent
+(sur la boucle d'événements, sans occuper de thread) dans une file FIFO ; un
+créneau libéré revient à la première demande dont l'utilisateur est sous son
+plafond, pour qu'un client gourmand ne bloque pas les autres. Au-delà de
+DELIVERY_QUEUE_TIMEOUT secondes d'attente : 429 (plafond utilisateur) ou 503.
+
+Les lectures de fichiers non mis en cache passent par un limiteur de threads
+dédié (DELIVERY_THREADS, voir iter_file) : des clients lents ne vident plus le
+threadpool utilisé par le reste de l'API (connexion, catalogue...). Seules les
+reprises de téléchargement (en-tête Range) sont servies par FileResponse, qui
+lit sur le threadpool par défaut.
+"""
+from collections import deque
+from fastapi import HTTPException, status
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+from metrics import Histogram
+from typing import AsyncIterator, Deque, Dict, Optional
+import anyio
+import os
+import time
+
+# Configuration
+DELIVERY_MAX_CONCURRENT = int(os.getenv("DELIVERY_MAX_CONCURRENT", "16"))
+DELIVERY_MAX_PER_USER = int(os.getenv("DELIVERY_MAX_PER_USER", "2"))
+DELIVERY_QUEUE_TIMEOUT = float(os.getenv("DELIVERY_QUEUE_TIMEOUT", "10"))
+DELIVERY_THREADS = int(os.getenv("DELIVERY_THREADS", "8"))
+DELIVERY_CHUNK_BYTES = 64 * 1024
+
+# Bornes (secondes) de l'histogramme d'attente d'un créneau
+WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DELIVERY_WAIT = Histogram(
+    "evazo_delivery_wait_seconds", "Attente d'un créneau de livraison de fichier",
+    ("kind", "outcome"), WAIT_BUCKETS
+)
+
+delivery_threads = anyio.CapacityLimiter(DELIVERY_THREADS)
+
+class DeliverySlot:
+    """Créneau obtenu ; libéré une seule fois (par la réponse, ou par la dépendance en cas d'erreur)"""
+    __slots__ = ("pool", "user_id", "handed_off", "released")
+
+    def __init__(self, pool: "DeliveryPool", user_id: int):
+        self.pool = pool
+        self.user_id = user_id
+        self.handed_off = False
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.pool._finish(self.user_id)
+
+class Waiter:
+    __slots__ = ("user_id", "event", "granted")
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.event = anyio.Event()
+        self.granted = False
+
+class DeliveryPool:
+    """Créneaux de livraison (utilisé uniquement depuis la boucle d'événements : pas de verrou)"""
+
+    def __init__(self, capacity: int = DELIVERY_MAX_CONCURRENT, per_user: int = DELIVERY_MAX_PER_USER,
+                 timeout: float = DELIVERY_QUEUE_TIMEOUT):
+        self.capacity = capacity
+        self.per_user = per_user
+        self.timeout = timeout
+        self.active = 0
+        self._users: Dict[int, int] = {}
+        self._waiters: Deque[Waiter] = deque()
+        self.granted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    async def acquire(self, user_id: int, kind: str) -> DeliverySlot:
+        """Attendre un créneau (HTTPException 429/503 après DELIVERY_QUEUE_TIMEOUT)"""
+        started = time.perf_counter()
+        waiter = Waiter(user_id)
+        self._waiters.append(waiter)
+        # Servie tout de suite si rien ne la précède ou si les demandes en attente
+        # sont toutes bloquées par leur plafond utilisateur
+        self._dispatch()
+        if waiter.granted:
+            DELIVERY_WAIT.observe(0.0, (kind, "granted"))
+            return DeliverySlot(self, user_id)
+        self.queued += 1
+        try:
+            with anyio.move_on_after(self.timeout):
+                await waiter.event.wait()
+        except BaseException:
+            # Annulation (client parti) : rendre le créneau s'il venait d'être attribué
+            if waiter.granted:
+                self._finish(user_id)
+            else:
+                self._waiters.remove(waiter)
+            raise
+        if not waiter.granted:
+            self._waiters.remove(waiter)
+        waited = time.perf_counter() - started
+
+        if waiter.granted:
+            DELIVERY_WAIT.observe(waited, (kind, "granted"))
+            return DeliverySlot(self, user_id)
+
+        self.rejected += 1
+        DELIVERY_WAIT.observe(waited, (kind, "timeout"))
+        if self._users.get(user_id, 0) >= self.per_user:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Trop de lectures ou téléchargements simultanés (maximum {self.per_user})",
+                headers={"Retry-After": str(max(1, round(self.timeout)))}
+            )
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Serveur de fichiers saturé, réessayez dans quelques instants",
+            headers={"Retry-After": str(max(1, round(self.timeout)))}
+        )
+
+    def _available(self, user_id: int) -> bool:
+        return self.active < self.capacity and self._users.get(user_id, 0) < self.per_user
+
+    def _start(self, user_id: int) -> None:
+        self.active += 1
+        self._users[user_id] = self._users.get(user_id, 0) + 1
+        self.granted += 1
+
+    def _finish(self, user_id: int) -> None:
+        self.active -= 1
+        remaining = self._users[user_id] - 1
+        if remaining:
+            self._users[user_id] = remaining
+        else:
+            del self._users[user_id]
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Servir, dans l'ordre d'arrivée, les demandes dont l'utilisateur est sous son plafond"""
+        for waiter in list(self._waiters):
+            if self.active >= self.capacity:
+                break
+            if self._available(waiter.user_id):
+                self._waiters.remove(waiter)
+                self._start(waiter.user_id)
+                waiter.granted = True
+                waiter.event.set()
+
+    def stats(self) -> Dict:
+        return {
+            "capacity": self.capacity,
+            "per_user": self.per_user,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "users": len(self._users),
+            "granted": self.granted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+        }
+
+delivery_pool = DeliveryPool()
+
+# ===== RÉPONSES =====
+
+class SlotResponseMixin:
+    """Garde le créneau jusqu'à la fin de l'envoi, y compris si le client se déconnecte"""
+    slot: Optional[DeliverySlot] = None
+
+    def hold(self, slot: DeliverySlot):
+        slot.handed_off = True
+        self.slot = slot
+        return self
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.slot is not None:
+                self.slot.release()
+
+class DeliveryStreamingResponse(SlotResponseMixin, StreamingResponse):
+    pass
+
+class DeliveryFileResponse(SlotResponseMixin, FileResponse):
+    """FileResponse pour les requêtes Range ; lectures sur le threadpool par défaut, bornées par les créneaux"""
+
+async def iter_file(path: str, chunk_size: int = DELIVERY_CHUNK_BYTES) -> AsyncIterator[bytes]:
+    """Lecture par blocs sur les threads de livraison (pas ceux de l'API)"""
+    file = await anyio.to_thread.run_sync(open, path, "rb", limiter=delivery_threads)
+    try:
+        while True:
+            chunk = await anyio.to_thread.run_sync(file.read, chunk_size, limiter=delivery_threads)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
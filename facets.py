@@ -0,0 +1,60 @@
+from sqlmodel import Session, select, func
+from models import Genre, Music
+from collections import defaultdict
+from money import from_cents
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Tranches de prix (en centimes) : [min, max[, la dernière sans borne haute
+PRICE_BUCKETS: List[Tuple[int, Optional[int]]] = [
+    (0, 100),
+    (100, 200),
+    (200, 500),
+    (500, 1000),
+    (1000, None),
+]
+
+def price_bucket(price_cents: int) -> int:
+    """Indice de la tranche de prix"""
+    for index, (_, upper) in enumerate(PRICE_BUCKETS):
+        if upper is None or price_cents < upper:
+            return index
+    return len(PRICE_BUCKETS) - 1
+
+def music_facets(session: Session, conditions: Sequence) -> Dict:
+    """Comptages par genre, gratuit/payant et tranche de prix pour un jeu de filtres.
+
+    Une seule requête groupée par (genre, is_free, prix), servie par l'index
+    couvrant (status, genre_id, is_free, price_cents) : ses lignes, peu nombreuses,
+    sont ensuite additionnées par facette. Les tranches sont calculées ici
+    plutôt qu'avec un CASE SQL évalué sur chaque ligne.
+    """
+    rows = session.exec(
+        select(Music.genre_id, Music.is_free, Music.price_cents, func.count(Music.id))
+        .where(*conditions)
+        .group_by(Music.genre_id, Music.is_free, Music.price_cents)
+    ).all()
+
+    total = 0
+    genres: Dict[int, int] = defaultdict(int)
+    is_free: Dict[bool, int] = defaultdict(int)
+    buckets: Dict[int, int] = defaultdict(int)
+    for genre_id, free, price_cents, count in rows:
+        total += count
+        if genre_id is not None:
+            genres[genre_id] += count
+        is_free[bool(free)] += count
+        buckets[price_bucket(price_cents or 0)] += count
+
+    names = dict(session.exec(select(Genre.id, Genre.name).where(Genre.id.in_(list(genres)))).all()) if genres else {}
+    return {
+        "total": total,
+        "genres": sorted(
+            ({"id": genre_id, "name": names.get(genre_id, ""), "track_count": count} for genre_id, count in genres.items()),
+            key=lambda genre: (-genre["track_count"], genre["name"])
+        ),
+        "is_free": [{"is_free": value, "count": is_free[value]} for value in (True, False) if is_free[value]],
+        "price_buckets": [
+            {"min_price": float(from_cents(lower)), "max_price": float(from_cents(upper)) if upper is not None else None, "count": buckets[index]}
+            for index, (lower, upper) in enumerate(PRICE_BUCKETS)
+        ],
+    }
@@ -0,0 +1,183 @@
+"""Cache des fichiers audio les plus demandés (stream et téléchargement).
+
+Les fichiers admis sont projetés en mémoire (mmap, lecture seule) : les
+réponses envoient des tranches memoryview du mapping, sans copie ni
+réouverture du fichier. Les pages restent dans le cache du noyau et sont
+partagées entre workers.
+
+Admission : un fichier n'entre qu'à sa FILE_CACHE_ADMIT_AFTER-ième demande,
+et seulement s'il est plus demandé que les entrées qu'il évincerait (les
+lectures ponctuelles ne chassent pas les morceaux populaires). Éviction :
+du moins récemment utilisé au plus récent, dans la limite du budget d'octets.
+
+Chaque accès vérifie le fichier (inode, taille, date de modification) : un
+fichier remplacé ou supprimé est retiré du cache. Les uploads ne sont jamais
+réécrits sur place (noms uniques) ; un mapping évincé reste valide tant
+qu'une réponse en cours l'utilise.
+"""
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import quote
+import mmap
+import os
+import threading
+
+# Configuration
+FILE_CACHE_MAX_BYTES = int(os.getenv("FILE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+FILE_CACHE_MAX_FILE_BYTES = int(os.getenv("FILE_CACHE_MAX_FILE_BYTES", str(32 * 1024 * 1024)))
+FILE_CACHE_ADMIT_AFTER = 2          # Demandes avant admission
+FILE_CACHE_TRACKED_FILES = 10000    # Compteurs de demandes conservés (fichiers non admis compris)
+FILE_CACHE_AGING_ACCESSES = 10000   # Tous les N accès, les compteurs sont divisés par deux
+FILE_CACHE_CHUNK_BYTES = 64 * 1024
+
+Signature = Tuple[int, int, int]  # (inode, taille, mtime en ns)
+
+def file_signature(stat: os.stat_result) -> Signature:
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+class CachedFile:
+    __slots__ = ("data", "signature")
+
+    def __init__(self, data: memoryview, signature: Signature):
+        self.data = data
+        self.signature = signature
+
+class FileCache:
+    def __init__(self, max_bytes: int = FILE_CACHE_MAX_BYTES, max_file_bytes: int = FILE_CACHE_MAX_FILE_BYTES):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries: "OrderedDict[str, CachedFile]" = OrderedDict()
+        self._frequencies: "OrderedDict[str, int]" = OrderedDict()
+        self._accesses = 0
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.admissions = 0
+        self.rejections = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, path: str) -> Optional[memoryview]:
+        """Contenu du fichier s'il est (ou entre) en cache, None sinon (lecture classique)"""
+        try:
+            signature = file_signature(os.stat(path))
+        except OSError:
+            self.invalidate(path)
+            return None
+
+        with self._lock:
+            frequency = self._count(path)
+            entry = self._entries.get(path)
+            if entry is not None:
+                if entry.signature == signature:
+                    self._entries.move_to_end(path)
+                    self.hits += 1
+                    return entry.data
+                self._drop(path)
+                self.invalidations += 1
+            self.misses += 1
+            if frequency < FILE_CACHE_ADMIT_AFTER or not 0 < signature[1] <= self.max_file_bytes:
+                return None
+            if not self._make_room(signature[1], frequency):
+                self.rejections += 1
+                return None
+            # Réservé avant la projection, faite hors verrou
+            self.size += signature[1]
+
+        data = self._map(path, signature)
+        with self._lock:
+            if data is None or path in self._entries:
+                self.size -= signature[1]
+                return data
+            self._entries[path] = CachedFile(data, signature)
+            self.admissions += 1
+        return data
+
+    def invalidate(self, path: str) -> None:
+        """Retirer un fichier (remplacé ou supprimé)"""
+        with self._lock:
+            if path in self._entries:
+                self._drop(path)
+                self.invalidations += 1
+            self._frequencies.pop(path, None)
+
+    def _count(self, path: str) -> int:
+        frequency = self._frequencies.pop(path, 0) + 1
+        self._frequencies[path] = frequency
+        if len(self._frequencies) > FILE_CACHE_TRACKED_FILES:
+            self._frequencies.popitem(last=False)
+        self._accesses += 1
+        if self._accesses >= FILE_CACHE_AGING_ACCESSES:
+            # Vieillissement : la popularité passée compte de moins en moins
+            self._accesses = 0
+            for key in self._frequencies:
+                self._frequencies[key] //= 2
+        return frequency
+
+    def _make_room(self, size: int, frequency: int) -> bool:
+        """Évincer les entrées les moins récentes, sauf si l'une est plus demandée que le candidat"""
+        victims, freed = [], 0
+        for path in self._entries:
+            if self.size - freed + size <= self.max_bytes:
+                break
+            if self._frequencies.get(path, 0) > frequency:
+                return False
+            victims.append(path)
+            freed += len(self._entries[path].data)
+        if self.size - freed + size > self.max_bytes:
+            return False
+        for path in victims:
+            self._drop(path)
+            self.evictions += 1
+        return True
+
+    def _drop(self, path: str) -> None:
+        entry = self._entries.pop(path)
+        self.size -= len(entry.data)
+        # Le mapping est libéré quand plus aucune réponse n'utilise ses tranches
+
+    @staticmethod
+    def _map(path: str, signature: Signature) -> Optional[memoryview]:
+        try:
+            with open(path, "rb") as file:
+                if file_signature(os.fstat(file.fileno())) != signature:
+                    return None
+                return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+        except (OSError, ValueError):
+            return None
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "admissions": self.admissions,
+            "rejections": self.rejections,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+file_cache = FileCache()
+
+# ===== RÉPONSES =====
+
+async def iter_chunks(data: memoryview, chunk_size: int = FILE_CACHE_CHUNK_BYTES) -> AsyncIterator[memoryview]:
+    """Tranches sans copie, envoyées depuis la boucle d'événements (pas de threadpool)"""
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+def file_headers(size: Optional[int], filename: Optional[str] = None) -> Dict[str, str]:
+    """En-têtes d'une réponse servie depuis le cache (comme FileResponse pour le nom de fichier)"""
+    headers = {} if size is None else {"content-length": str(size)}
+    if filename is not None:
+        quoted = quote(filename)
+        if quoted != filename:
+            headers["content-disposition"] = f"attachment; filename*=utf-8''{quoted}"
+        else:
+            headers["content-disposition"] = f'attachment; filename="{filename}"'
+    return headers
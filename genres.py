@@ -0,0 +1,120 @@
+from sqlmodel import Session, select, update, func, desc
+from sqlalchemy import false
+from sqlalchemy.exc import IntegrityError
+from models import Genre, GenreAlias, Music, MusicStatus
+from typing import Dict, List, Optional
+import re
+import unicodedata
+
+# Alias usuels -> nom canonique (créés au démarrage s'ils sont libres)
+DEFAULT_GENRE_ALIASES: Dict[str, List[str]] = {
+    "Hip-Hop": ["rap"],
+    "R&B": ["rnb", "rhythm and blues"],
+    "Electro": ["electronic", "électronique", "edm"],
+    "Classique": ["classical"],
+    "Afrobeat": ["afrobeats"],
+}
+
+def genre_key(name: Optional[str]) -> str:
+    """Clé de comparaison : sans casse, accents, espaces ni ponctuation ("Hip-Hop" == "hip hop")"""
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"[^0-9a-z]+", "", text.casefold())
+
+def display_name(name: str) -> str:
+    return " ".join(name.split())
+
+# ===== RÉSOLUTION =====
+
+def find_genre(session: Session, name: Optional[str]) -> Optional[Genre]:
+    """Genre correspondant à un nom ou un alias (recherche par clé primaire)"""
+    key = genre_key(name)
+    if not key:
+        return None
+    return session.exec(
+        select(Genre).join(GenreAlias, GenreAlias.genre_id == Genre.id).where(GenreAlias.alias == key)
+    ).first()
+
+def resolve_genre(session: Session, name: Optional[str]) -> Optional[Genre]:
+    """Genre correspondant, créé s'il n'existe pas encore (None pour un genre vide)"""
+    genre = find_genre(session, name)
+    if genre is not None or not genre_key(name):
+        return genre
+
+    try:
+        with session.begin_nested():
+            genre = Genre(name=display_name(name))
+            session.add(genre)
+            session.flush()
+            session.add(GenreAlias(alias=genre_key(name), genre_id=genre.id))
+    except IntegrityError:
+        # Créé entre-temps par une autre requête
+        return find_genre(session, name)
+    return genre
+
+def apply_genre(session: Session, music: Music, name: Optional[str]) -> None:
+    """Rattacher une musique à son genre normalisé"""
+    genre = resolve_genre(session, name)
+    music.genre_id = genre.id if genre else None
+    music.genre = genre.name if genre else None
+
+def genre_filter(session: Session, name: str):
+    """Condition d'égalité indexée sur genre_id (toujours fausse pour un genre inconnu)"""
+    genre = find_genre(session, name)
+    return Music.genre_id == genre.id if genre else false()
+
+# ===== ALIAS =====
+
+def add_alias(session: Session, alias: str, genre: Genre) -> Genre:
+    """Faire d'`alias` un synonyme de `genre`.
+
+    Si l'alias désigne déjà un autre genre, celui-ci est fusionné dans `genre` :
+    ses alias et ses musiques le suivent.
+    """
+    key = genre_key(alias)
+    existing = session.get(GenreAlias, key)
+    if existing is None:
+        session.add(GenreAlias(alias=key, genre_id=genre.id))
+    elif existing.genre_id != genre.id:
+        merge_genres(session, session.get(Genre, existing.genre_id), genre)
+    return genre
+
+def merge_genres(session: Session, source: Genre, target: Genre) -> None:
+    session.exec(
+        update(GenreAlias).where(GenreAlias.genre_id == source.id).values(genre_id=target.id)
+    )
+    session.exec(
+        update(Music).where(Music.genre_id == source.id).values(genre_id=target.id, genre=target.name)
+    )
+    session.delete(source)
+
+def seed_genre_aliases(session: Session) -> int:
+    """Créer les alias par défaut encore libres (idempotent)"""
+    taken = set(session.exec(select(GenreAlias.alias)).all())
+    created = 0
+    for name, aliases in DEFAULT_GENRE_ALIASES.items():
+        keys = [key for key in map(genre_key, aliases) if key not in taken]
+        if not keys:
+            continue
+        genre = resolve_genre(session, name)
+        for key in keys:
+            session.add(GenreAlias(alias=key, genre_id=genre.id))
+            taken.add(key)
+            created += 1
+    return created
+
+# ===== COMPTAGES =====
+
+def genre_counts(session: Session) -> List[Dict]:
+    """Nombre de musiques publiées par genre (parcours de l'index genre_id, status)"""
+    track_count = func.count(Music.id)
+    rows = session.exec(
+        select(Genre.id, Genre.name, track_count)
+        .join(Music, Music.genre_id == Genre.id)
+        .where(Music.status == MusicStatus.PUBLISHED)
+        .group_by(Genre.id, Genre.name)
+        .order_by(desc(track_count), Genre.name)
+    ).all()
+    return [{"id": genre_id, "name": name, "track_count": count} for genre_id, name, count in rows]
@@ -0,0 +1,308 @@
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
+from sqlmodel import Session, select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import engine
+from models import IdempotencyRecord
+from ratelimit import token_subject
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import hashlib
+import json
+import threading
+
+# Configuration
+IDEMPOTENCY_HEADER = "idempotency-key"
+IDEMPOTENCY_TTL = timedelta(hours=24)
+MAX_KEY_LENGTH = 255
+MAX_CACHED_RESPONSES = 1024
+MAX_STORED_BODY_BYTES = 64 * 1024
+MAX_FINGERPRINT_BODY_BYTES = 1024 * 1024  # Au-delà (uploads), seule la taille est prise en compte
+PURGE_EVERY_N_STORES = 100
+
+# Réponse mise en cache : (status_code, content_type, body, expires_at, fingerprint)
+StoredResponse = Tuple[int, Optional[str], bytes, datetime, Optional[str]]
+
+# ===== STOCKAGE =====
+
+class IdempotencyStore:
+    """Stockage des réponses : cache LRU en mémoire devant la table idempotency_keys"""
+
+    def __init__(self, max_entries: int = MAX_CACHED_RESPONSES, ttl: timedelta = IDEMPOTENCY_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._cache: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._in_flight: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stores_since_purge = 0
+
+    def _remember(self, key: str, stored: StoredResponse) -> None:
+        with self._lock:
+            self._cache[key] = stored
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        """Retrouver une réponse enregistrée (cache mémoire puis base)"""
+        now = datetime.utcnow()
+        with self._lock:
+            stored = self._cache.get(key)
+            if stored is not None:
+                if stored[3] > now:
+                    self._cache.move_to_end(key)
+                    return stored
+                del self._cache[key]
+        
+        with Session(engine) as session:
+            record = session.exec(
+                select(IdempotencyRecord).where(
+                    IdempotencyRecord.key == key,
+                    IdempotencyRecord.expires_at > now
+                )
+            ).first()
+            if not record:
+                return None
+            stored = (record.status_code, record.content_type, record.body, record.expires_at, record.fingerprint)
+        
+        self._remember(key, stored)
+        return stored
+
+    def save(self, key: str, status_code: int, content_type: Optional[str], body: bytes,
+             fingerprint: Optional[str] = None) -> StoredResponse:
+        """Enregistrer la réponse d'origine pour les futures tentatives.
+
+        Deux workers peuvent traiter la même clé en même temps (le verrou en cours
+        est local au processus) : la première réponse enregistrée est conservée, et
+        c'est elle qui est retournée et rejouée ensuite.
+        """
+        now = datetime.utcnow()
+        statement = sqlite_insert(IdempotencyRecord).values(
+            key=key,
+            fingerprint=fingerprint,
+            status_code=status_code,
+            content_type=content_type,
+            body=body,
+            created_at=now,
+            expires_at=now + self.ttl
+        )
+        # Une clé expirée mais pas encore purgée est remplacée
+        statement = statement.on_conflict_do_update(
+            index_elements=["key"],
+            set_={
+                "fingerprint": statement.excluded.fingerprint,
+                "status_code": statement.excluded.status_code,
+                "content_type": statement.excluded.content_type,
+                "body": statement.excluded.body,
+                "created_at": statement.excluded.created_at,
+                "expires_at": statement.excluded.expires_at,
+            },
+            where=IdempotencyRecord.expires_at <= now
+        )
+        with Session(engine) as session:
+            session.execute(statement)
+            record = session.exec(select(IdempotencyRecord).where(IdempotencyRecord.key == key)).one()
+            stored = (record.status_code, record.content_type, record.body, record.expires_at, record.fingerprint)
+            session.commit()
+        
+        self._remember(key, stored)
+        
+        self._stores_since_purge += 1
+        if self._stores_since_purge >= PURGE_EVERY_N_STORES:
+            self._stores_since_purge = 0
+            self.purge_expired()
+        return stored
+
+    def purge_expired(self) -> int:
+        """Supprimer les clés expirées de la base et du cache"""
+        now = datetime.utcnow()
+        with self._lock:
+            for key in [k for k, v in self._cache.items() if v[3] <= now]:
+                del self._cache[key]
+        with Session(engine) as session:
+            result = session.exec(delete(IdempotencyRecord).where(IdempotencyRecord.expires_at <= now))
+            session.commit()
+            return result.rowcount or 0
+
+    def acquire(self, key: str) -> bool:
+        """Marquer une clé comme en cours de traitement (False si déjà en cours)"""
+        with self._lock:
+            if key in self._in_flight:
+                return False
+            self._in_flight.add(key)
+            return True
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._in_flight.discard(key)
+
+idempotency_store = IdempotencyStore()
+
+# ===== MIDDLEWARE =====
+
+def build_storage_key(idempotency_key: str, subject: str, method: str, path: str) -> str:
+    """Empreinte de la clé, limitée à l'utilisateur (sub du jeton, stable au renouvellement) et à la route"""
+    raw = "\n".join((subject, method, path, idempotency_key))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+async def read_body(receive: Receive, limit: int) -> Tuple[List[Message], Optional[bytes]]:
+    """Lire le corps de la requête jusqu'à `limit` octets.
+
+    Retourne les messages lus (à rejouer au handler) et le corps, ou None s'il
+    dépasse la limite (le reste n'est alors pas lu).
+    """
+    messages, size = [], 0
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            return messages, None
+        size += len(message.get("body", b""))
+        if size > limit:
+            return messages, None
+        if not message.get("more_body", False):
+            return messages, b"".join(m.get("body", b"") for m in messages)
+
+def replay_receive(messages: List[Message], receive: Receive) -> Receive:
+    """Rejouer les messages déjà lus, puis revenir au flux d'origine"""
+    pending = list(messages)
+
+    async def wrapped() -> Message:
+        if pending:
+            return pending.pop(0)
+        return await receive()
+    return wrapped
+
+async def request_fingerprint(scope: Scope, receive: Receive, headers: Dict[bytes, bytes]) -> Tuple[str, Receive]:
+    """Empreinte de la requête (méthode, route, corps) pour refuser une clé réutilisée avec un autre contenu.
+
+    Les uploads multipart ne sont pas lus (leur séparateur change à chaque
+    tentative) : seule leur taille compte, comme pour les corps trop grands.
+    """
+    digest = hashlib.sha256(f"{scope['method']}\n{scope['path']}\n".encode("utf-8"))
+    content_type = headers.get(b"content-type", b"")
+    body = None
+    if not content_type.startswith(b"multipart/"):
+        messages, body = await read_body(receive, MAX_FINGERPRINT_BODY_BYTES)
+        receive = replay_receive(messages, receive)
+    if body is None:
+        digest.update(b"length:" + headers.get(b"content-length", b""))
+    else:
+        digest.update(b"body:" + body)
+    return digest.hexdigest(), receive
+
+async def send_json(send: Send, status_code: int, content: Dict) -> None:
+    body = json.dumps(content).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode())
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class IdempotencyMiddleware:
+    """Rejouer la réponse d'origine d'une requête envoyée avec le même en-tête Idempotency-Key.
+
+    Seules les routes listées et les requêtes authentifiées sont concernées. Lors
+    d'un rejeu, le handler n'est pas exécuté et un upload n'est pas lu. La même clé
+    avec un autre contenu est refusée (422).
+    """
+
+    def __init__(self, app: ASGIApp, routes: Iterable[Tuple[str, str]], store: IdempotencyStore = idempotency_store):
+        self.app = app
+        self.routes = set(routes)
+        self.store = store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in self.routes:
+            await self.app(scope, receive, send)
+            return
+        
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(IDEMPOTENCY_HEADER.encode())
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+        
+        idempotency_key = idempotency_key.decode("latin-1")
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            await send_json(send, 400, {"detail": "En-tête Idempotency-Key trop long"})
+            return
+        
+        # Sans jeton valide, la route répondra 401 : rien à mémoriser
+        subject = token_subject(scope)
+        if subject is None:
+            await self.app(scope, receive, send)
+            return
+        
+        key = build_storage_key(idempotency_key, subject, scope["method"], scope["path"])
+        fingerprint, receive = await request_fingerprint(scope, receive, headers)
+        
+        stored = await run_in_threadpool(self.store.get, key)
+        if stored is not None:
+            await self.replay(send, stored, fingerprint)
+            return
+        
+        if not self.store.acquire(key):
+            await send_json(send, 409, {"detail": "Une requête avec cette clé d'idempotence est déjà en cours"})
+            return
+        
+        try:
+            # La première tentative a pu se terminer entre-temps
+            stored = await run_in_threadpool(self.store.get, key)
+            if stored is not None:
+                await self.replay(send, stored, fingerprint)
+                return
+            await self.run_and_store(scope, receive, send, key, fingerprint)
+        finally:
+            self.store.release(key)
+
+    async def replay(self, send: Send, stored: StoredResponse, fingerprint: str) -> None:
+        status_code, content_type, body, _, stored_fingerprint = stored
+        if stored_fingerprint is not None and stored_fingerprint != fingerprint:
+            await send_json(send, 422, {"detail": "Cette clé d'idempotence a déjà été utilisée pour une autre requête"})
+            return
+        headers = [
+            (b"content-length", str(len(body)).encode()),
+            (b"idempotent-replayed", b"true")
+        ]
+        if content_type:
+            headers.append((b"content-type", content_type.encode("latin-1")))
+        await send({"type": "http.response.start", "status": status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def run_and_store(self, scope: Scope, receive: Receive, send: Send, key: str, fingerprint: str) -> None:
+        response = {"status": 500, "content_type": None, "chunks": [], "size": 0, "storable": True}
+        
+        async def capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-type":
+                        response["content_type"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body" and response["storable"]:
+                chunk = message.get("body", b"")
+                response["size"] += len(chunk)
+                if response["size"] > MAX_STORED_BODY_BYTES:
+                    response["storable"] = False
+                    response["chunks"] = []
+                else:
+                    response["chunks"].append(chunk)
+            await send(message)
+        
+        await self.app(scope, receive, capture)
+        
+        # Les erreurs serveur ne sont pas mémorisées : le client peut réessayer
+        if response["storable"] and response["status"] < 500:
+            await run_in_threadpool(
+                self.store.save,
+                key,
+                response["status"],
+                response["content_type"],
+                b"".join(response["chunks"]),
+                fingerprint
+            )
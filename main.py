@@ -1,6 +1,16 @@
 from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from database import create_db_and_tables, get_session
+from migrations import run_migrations
+from tasks import run_payment_code_sweeper, run_system_sampler, run_recommendation_builder, run_chart_snapshots, run_suggest_refresh
+from charts import chart_book
+from suggest import suggest_index
+from search import music_search
+from sales import ensure_daily_sales
+from monitoring import system_sampler, upload_usage
+from cache import catalog_cache
+from file_cache import file_cache
+from delivery import DELIVERY_WAIT, delivery_pool
 from routers.musique import musique_router
 from routers.artiste import artiste_router
 from routers.admin import admin_router
@@ -10,12 +20,18 @@ from sqlmodel import Session, select, func
 from models import User, Music, Purchase , EndpointInfo, HealthStatus, StorageInfo, SystemInfo
 import psutil
 import os
-import shutil
 from datetime import datetime
 from typing import Dict, List, Any , Optional
 import platform
+import asyncio
 from sqlmodel import SQLModel
 from fastapi.middleware.cors import CORSMiddleware
+from idempotency import IdempotencyMiddleware, idempotency_store
+from compression import CompressionMiddleware, compression_stats
+from metrics import MetricsMiddleware, render_metrics, render_sampled
+from profiling import ProfilingMiddleware
+from ratelimit import RateLimitMiddleware, RatePolicy, rate_limiter
+import anyio
 
 app = FastAPI(
     title="E-Vazo API", 
@@ -23,6 +39,28 @@ app = FastAPI(
     description="API pour la plateforme de musique E-Vazo"
 )
 
+# Rejeu des requêtes réessayées (en-tête Idempotency-Key)
+app.add_middleware(
+    IdempotencyMiddleware,
+    routes={
+        ("POST", "/api/client/purchase"),
+        ("POST", "/api/artiste/musiques"),
+    }
+)
+
+# Limitation de débit (seau à jetons, par utilisateur ou par IP) ; politiques « capacité/secondes »
+app.add_middleware(
+    RateLimitMiddleware,
+    policies={
+        ("POST", "/api/login"): RatePolicy.from_env("login", "10/60", key="ip"),
+        ("POST", "/api/client/purchase"): RatePolicy.from_env("purchase", "10/60"),
+        ("GET", "/api/client/stream/{music_id:int}"): RatePolicy.from_env("stream", "60/60"),
+        ("GET", "/api/client/download/{music_id:int}"): RatePolicy.from_env("download", "20/60"),
+        # Une archive contient jusqu'à 100 morceaux : politique propre, plus stricte
+        ("GET", "/api/client/download/bundle"): RatePolicy.from_env("bundle", "2/60"),
+    }
+)
+
 # Configuration CORS (Cross-Origin Resource Sharing)
 app.add_middleware(
     CORSMiddleware,
@@ -30,8 +68,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset"],
+)
+
+# Compression des réponses JSON (gzip, et brotli / zstd si installés)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024")),
+    level=int(os.getenv("COMPRESSION_LEVEL", "6")),
+    content_types=("application/json", "text/")
+)
+
+# Profilage à la demande (en-tête X-Profile d'un admin, ou échantillonnage)
+app.add_middleware(
+    ProfilingMiddleware,
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    interval=float(os.getenv("PROFILE_INTERVAL_MS", "2")) / 1000
 )
 
+# Métriques Prometheus (middleware le plus externe : mesure la requête complète)
+app.add_middleware(MetricsMiddleware)
+
 # Inclusion des routers
 app.include_router(auth_router, prefix="/api", tags=["Authentification"])
 app.include_router(artiste_router, prefix="/api/artiste", tags=["Artiste"])
@@ -43,66 +100,6 @@ app.include_router(admin_router, prefix="/api/admin", tags=["Administration"])
 
 
 
-# ===== FONCTIONS UTILITAIRES =====
-
-def get_directory_size(path: str) -> Dict[str, Any]:
-    """Calculer la taille d'un dossier"""
-    if not os.path.exists(path):
-        return {
-            "exists": False,
-            "size_bytes": 0,
-            "size_mb": 0,
-            "file_count": 0
-        }
-    
-    total_size = 0
-    file_count = 0
-    
-    try:
-        for dirpath, dirnames, filenames in os.walk(path):
-            for filename in filenames:
-                filepath = os.path.join(dirpath, filename)
-                if os.path.exists(filepath):
-                    total_size += os.path.getsize(filepath)
-                    file_count += 1
-    except PermissionError:
-        pass
-    
-    return {
-        "exists": True,
-        "size_bytes": total_size,
-        "size_mb": round(total_size / (1024 * 1024), 2),
-        "file_count": file_count
-    }
-
-def get_database_status(session: Session) -> str:
-    """Vérifier le statut de la base de données"""
-    try:
-        # Test simple de connexion
-        session.exec(select(func.count(User.id))).one()
-        return "connected"
-    except Exception as e:
-        return f"error: {str(e)}"
-
-def get_system_storage_info() -> Dict[str, Any]:
-    """Obtenir les informations de stockage système"""
-    try:
-        disk_usage = shutil.disk_usage("/")
-        return {
-            "total_gb": round(disk_usage.total / (1024**3), 2),
-            "used_gb": round(disk_usage.used / (1024**3), 2),
-            "free_gb": round(disk_usage.free / (1024**3), 2),
-            "usage_percent": round((disk_usage.used / disk_usage.total) * 100, 2)
-        }
-    except Exception as e:
-        return {
-            "error": str(e),
-            "total_gb": 0,
-            "used_gb": 0,
-            "free_gb": 0,
-            "usage_percent": 0
-        }
-
 # ===== ROUTES UTILITAIRES =====
 
 @app.get("/", response_model=Dict[str, Any])
@@ -146,16 +143,16 @@ async def get_all_endpoints():
     return endpoints
 
 @app.get("/health", response_model=HealthStatus)
-async def health_check(session: Session = Depends(get_session)):
-    """Vérification de l'état de santé de l'API"""
+async def health_check():
+    """Vérification de l'état de santé de l'API (dernières mesures de fond)"""
     
     # Calculer l'uptime (approximatif)
     uptime = psutil.boot_time()
     current_time = datetime.now().timestamp()
     uptime_seconds = current_time - uptime
     
-    # Vérifier le statut de la base de données
-    db_status = get_database_status(session)
+    # Statut de la base mesuré par l'échantillonneur
+    db_status = system_sampler.database_status
     
     # Déterminer le statut global
     overall_status = "healthy" if db_status == "connected" else "unhealthy"
@@ -168,57 +165,47 @@ async def health_check(session: Session = Depends(get_session)):
         uptime_seconds=round(uptime_seconds, 2)
     )
 
+@app.get("/health/live")
+async def liveness_probe():
+    """Sonde de vivacité : aucune E/S"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_probe():
+    """Sonde de disponibilité : base joignable et mesures récentes"""
+    if not system_sampler.is_ready():
+        return JSONResponse(
+            status_code=503,
+            content={"status": "not_ready", "database_status": system_sampler.database_status}
+        )
+    return {"status": "ready"}
+
 @app.get("/storage", response_model=StorageInfo)
 async def get_storage_info():
     """Obtenir les informations de stockage"""
-    
-    # Informations des dossiers d'upload
-    uploads_info = {
-        "music_folder": get_directory_size("uploads/music"),
-        "covers_folder": get_directory_size("uploads/covers"),
-        "total_uploads": {}
-    }
-    
-    # Calculer le total des uploads
-    total_size = uploads_info["music_folder"]["size_bytes"] + uploads_info["covers_folder"]["size_bytes"]
-    total_files = uploads_info["music_folder"]["file_count"] + uploads_info["covers_folder"]["file_count"]
-    
-    uploads_info["total_uploads"] = {
-        "size_bytes": total_size,
-        "size_mb": round(total_size / (1024 * 1024), 2),
-        "file_count": total_files
-    }
-    
-    # Informations du système
-    system_storage = get_system_storage_info()
-    
-    # Informations de la base de données
-    db_info = get_directory_size(".")  # Approximation pour SQLite
-    database_size = {
-        "database_file": get_directory_size("music_platform.db") if os.path.exists("music_platform.db") else {"exists": False, "size_bytes": 0, "size_mb": 0},
-        "logs_folder": get_directory_size("logs")
-    }
+    snapshot = system_sampler.snapshot
     
     return StorageInfo(
-        uploads_folder=uploads_info,
-        system_storage=system_storage,
-        database_size=database_size
+        uploads_folder=upload_usage.snapshot(),
+        system_storage=snapshot.get("system_storage", {}),
+        database_size={
+            "database_file": snapshot.get("database_file", {}),
+            "logs_folder": snapshot.get("logs_folder", {})
+        }
     )
 
 @app.get("/system-info", response_model=SystemInfo)
 async def get_system_info():
     """Obtenir les informations système"""
-    
-    # Informations système
-    memory = psutil.virtual_memory()
+    snapshot = system_sampler.snapshot
     
     return SystemInfo(
-        platform=f"{platform.system()} {platform.release()}",
-        python_version=platform.python_version(),
-        cpu_count=psutil.cpu_count(),
-        memory_total_gb=round(memory.total / (1024**3), 2),
-        memory_available_gb=round(memory.available / (1024**3), 2),
-        cpu_usage_percent=round(psutil.cpu_percent(interval=1), 2)
+        platform=snapshot.get("platform", ""),
+        python_version=snapshot.get("python_version", ""),
+        cpu_count=snapshot.get("cpu_count", 0),
+        memory_total_gb=snapshot.get("memory_total_gb", 0),
+        memory_available_gb=snapshot.get("memory_available_gb", 0),
+        cpu_usage_percent=snapshot.get("cpu_usage_percent", 0)
     )
 
 @app.get("/stats", response_model=Dict[str, Any])
@@ -247,11 +234,67 @@ async def get_quick_stats(session: Session = Depends(get_session)):
             "commerce": {
                 "total_purchases": total_purchases
             },
+            "catalog_cache": catalog_cache.stats(),
+            "compression": compression_stats.snapshot(),
+            "rate_limit": rate_limiter.stats(),
+            "suggest": suggest_index.stats(),
+            "file_cache": file_cache.stats(),
+            "delivery": delivery_pool.stats(),
             "timestamp": datetime.now()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors du calcul des statistiques: {str(e)}")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Métriques au format texte Prometheus"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    cache_stats = catalog_cache.stats()
+    compression = compression_stats.snapshot()
+    rate_limits = rate_limiter.stats()
+    files = file_cache.stats()
+    delivery = delivery_pool.stats()
+    
+    samples = [
+        render_sampled("evazo_threadpool_busy_threads", "Threads du threadpool occupés", [({}, limiter.borrowed_tokens)]),
+        render_sampled("evazo_threadpool_size", "Taille maximale du threadpool", [({}, limiter.total_tokens)]),
+        render_sampled("evazo_catalog_cache_lookups_total", "Lectures du cache catalogue", [
+            ({"result": "hit"}, cache_stats["hits"]),
+            ({"result": "miss"}, cache_stats["misses"])
+        ], "counter"),
+        render_sampled("evazo_catalog_cache_hit_ratio", "Taux de succès du cache catalogue", [({}, cache_stats["hit_ratio"])]),
+        render_sampled("evazo_file_cache_lookups_total", "Lectures du cache de fichiers audio", [
+            ({"result": "hit"}, files["hits"]),
+            ({"result": "miss"}, files["misses"])
+        ], "counter"),
+        render_sampled("evazo_file_cache_hit_ratio", "Taux de succès du cache de fichiers audio", [({}, files["hit_ratio"])]),
+        render_sampled("evazo_file_cache_evictions_total", "Fichiers retirés du cache", [
+            ({"reason": "evicted"}, files["evictions"]),
+            ({"reason": "invalidated"}, files["invalidations"])
+        ], "counter"),
+        render_sampled("evazo_file_cache_bytes", "Octets en cache de fichiers audio", [({}, files["bytes"])]),
+        render_sampled("evazo_delivery_slots", "Créneaux de livraison de fichiers", [
+            ({"state": "active"}, delivery["active"]),
+            ({"state": "waiting"}, delivery["waiting"])
+        ]),
+        render_sampled("evazo_delivery_rejected_total", "Livraisons refusées après attente", [({}, delivery["rejected"])], "counter"),
+        DELIVERY_WAIT.render(),
+        render_sampled("evazo_compression_bytes_total", "Octets avant / après compression", [
+            ({"stage": "in"}, compression["bytes_in"]),
+            ({"stage": "out"}, compression["bytes_out"])
+        ], "counter"),
+        render_sampled("evazo_rate_limit_decisions_total", "Décisions du limiteur de débit", [
+            ({"policy": policy, "decision": decision}, count)
+            for decision in ("allowed", "limited")
+            for policy, count in rate_limits[decision].items()
+        ], "counter")
+    ]
+    
+    return PlainTextResponse(
+        render_metrics(samples),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 @app.get("/version")
 async def get_version():
     """Obtenir la version de l'API"""
@@ -292,6 +335,8 @@ async def internal_error_handler(request, exc):
 
 # ===== ÉVÉNEMENTS DE DÉMARRAGE =====
 
+background_tasks: List[asyncio.Task] = []
+
 @app.on_event("startup")
 def on_startup():
     """Initialisation au démarrage"""
@@ -299,14 +344,34 @@ def on_startup():
     
     # Créer les tables de base de données
     create_db_and_tables()
+    run_migrations()
+    music_search.setup()
+    ensure_daily_sales()
     print("✅ Base de données initialisée")
     
+    # Purger les clés d'idempotence expirées
+    idempotency_store.purge_expired()
+    
     # Créer les dossiers nécessaires
     os.makedirs("uploads/music", exist_ok=True)
     os.makedirs("uploads/covers", exist_ok=True)
     os.makedirs("logs", exist_ok=True)
     print("✅ Dossiers créés")
     
+    # Mesures initiales (un seul parcours des dossiers d'upload)
+    upload_usage.scan()
+    system_sampler.sample()
+    chart_book.start()
+    suggest_index.build()
+    
+    # Tâches de fond
+    background_tasks.append(asyncio.create_task(run_payment_code_sweeper()))
+    background_tasks.append(asyncio.create_task(run_system_sampler()))
+    background_tasks.append(asyncio.create_task(run_recommendation_builder()))
+    background_tasks.append(asyncio.create_task(run_chart_snapshots()))
+    background_tasks.append(asyncio.create_task(run_suggest_refresh()))
+    print("✅ Tâches de fond démarrées")
+    
     print("🎵 E-Vazo API prête!")
     print("📚 Documentation disponible sur: http://localhost:8000/docs")
     print("🏥 Health check: http://localhost:8000/health")
@@ -316,6 +381,8 @@ def on_startup():
 def on_shutdown():
     """Nettoyage à l'arrêt"""
     print("🛑 Arrêt de E-Vazo API...")
+    for task in background_tasks:
+        task.cancel()
     print("👋 Au revoir!")
 
 # ===== DÉMARRAGE DE L'APPLICATION =====
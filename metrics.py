@@ -0,0 +1,219 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from database import QueryStats, current_query_stats, sql_logger, REQUEST_QUERY_BUDGET
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import os
+import threading
+import time
+import weakref
+
+# Bornes (secondes) des histogrammes de latence
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# En-têtes X-Query-Count / X-Query-Time-Ms (tests, benchmarks) : jamais en production
+QUERY_DEBUG_HEADERS = os.getenv("QUERY_DEBUG_HEADERS", "0") == "1"
+
+LabelValues = Tuple[str, ...]
+
+# ===== STOCKAGE SANS VERROU =====
+
+class ThreadShards:
+    """Une table de valeurs par thread : l'enregistrement ne prend aucun verrou.
+
+    Les tables sont additionnées à la lecture (/metrics). Celles des threads
+    terminés sont fusionnées puis libérées, la mémoire reste bornée.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Tuple[weakref.ref, Dict[LabelValues, List[float]]]] = []
+        self._retired: Dict[LabelValues, List[float]] = {}
+
+    def local(self) -> Dict[LabelValues, List[float]]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    @staticmethod
+    def _merge(target: Dict[LabelValues, List[float]], source: Dict[LabelValues, List[float]]) -> None:
+        for labels, values in list(source.items()):
+            existing = target.get(labels)
+            if existing is None:
+                target[labels] = list(values)
+            else:
+                for index, value in enumerate(values):
+                    existing[index] += value
+
+    def collect(self) -> Dict[LabelValues, List[float]]:
+        with self._lock:
+            alive = []
+            for thread_ref, shard in self._shards:
+                thread = thread_ref()
+                if thread is None or not thread.is_alive():
+                    self._merge(self._retired, shard)
+                else:
+                    alive.append((thread_ref, shard))
+            self._shards = alive
+            
+            total: Dict[LabelValues, List[float]] = {}
+            self._merge(total, self._retired)
+            for _, shard in alive:
+                self._merge(total, shard)
+            return total
+
+# ===== TYPES DE MÉTRIQUES =====
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: Sequence[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._shards = ThreadShards()
+
+    def inc(self, labels: LabelValues = (), amount: float = 1) -> None:
+        shard = self._shards.local()
+        values = shard.get(labels)
+        if values is None:
+            shard[labels] = [amount]
+        else:
+            values[0] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, values in sorted(self._shards.collect().items()):
+            lines.append(f"{self.name}{format_labels(self.label_names, labels)} {values[0]:g}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._shards = ThreadShards()
+
+    def observe(self, value: float, labels: LabelValues = ()) -> None:
+        shard = self._shards.local()
+        values = shard.get(labels)
+        if values is None:
+            # [compte par borne..., somme, nombre]
+            values = [0.0] * (len(self.buckets) + 2)
+            shard[labels] = values
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                values[index] += 1
+                break
+        values[-2] += value
+        values[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        for labels, values in sorted(self._shards.collect().items()):
+            cumulative = 0.0
+            for index, bound in enumerate(self.buckets):
+                cumulative += values[index]
+                lines.append(f"{self.name}_bucket{format_labels(names, labels + (f'{bound:g}',))} {cumulative:g}")
+            lines.append(f"{self.name}_bucket{format_labels(names, labels + ('+Inf',))} {values[-1]:g}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {values[-1]:g}")
+        return lines
+
+def render_sampled(name: str, documentation: str, samples: Iterable[Tuple[Dict[str, str], float]], metric_type: str = "gauge") -> List[str]:
+    """Métrique lue au moment de l'export (jauge, ou compteur tenu ailleurs)"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{format_labels(list(labels), labels.values())} {value:g}")
+    return lines
+
+# ===== MÉTRIQUES DE L'API =====
+
+REQUESTS = Counter("evazo_http_requests_total", "Requêtes HTTP traitées", ("method", "route", "status"))
+REQUEST_LATENCY = Histogram("evazo_http_request_duration_seconds", "Latence des requêtes HTTP", ("method", "route"))
+RESPONSE_BYTES = Counter("evazo_http_response_bytes_total", "Octets de corps de réponse envoyés (streaming et téléchargements inclus)", ("method", "route"))
+DB_QUERIES = Histogram("evazo_db_queries_per_request", "Nombre de requêtes SQL par requête HTTP", ("method", "route"), QUERY_COUNT_BUCKETS)
+DB_TIME = Counter("evazo_db_query_seconds_total", "Temps cumulé passé en requêtes SQL", ("method", "route"))
+
+class InFlight:
+    """Requêtes en cours (modifié uniquement depuis la boucle d'événements)"""
+    value = 0
+
+def route_label(scope: Scope) -> str:
+    """Gabarit de la route (ex: /api/client/stream/{music_id}) pour borner la cardinalité"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """Mesure latence, statut, octets envoyés et requêtes SQL de chaque requête HTTP.
+
+    Avec QUERY_DEBUG_HEADERS=1, ajoute les en-têtes X-Query-Count / X-Query-Time-Ms
+    à chaque réponse (ils exposent le fonctionnement interne : tests et benchmarks).
+    """
+
+    def __init__(self, app: ASGIApp, excluded_paths: Iterable[str] = ("/metrics",), query_headers: bool = QUERY_DEBUG_HEADERS):
+        self.app = app
+        self.excluded_paths = set(excluded_paths)
+        self.query_headers = query_headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+        
+        started_at = time.perf_counter()
+        query_stats = QueryStats(scope)
+        token = current_query_stats.set(query_stats)
+        response = {"status": 500, "bytes": 0}
+        
+        async def instrumented_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                if self.query_headers:
+                    # Nombre de requêtes SQL exécutées avant l'envoi de la réponse
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-query-count", str(query_stats.count).encode()),
+                        (b"x-query-time-ms", f"{query_stats.duration * 1000:.1f}".encode())
+                    ]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+        
+        InFlight.value += 1
+        try:
+            await self.app(scope, receive, instrumented_send)
+        finally:
+            InFlight.value -= 1
+            current_query_stats.reset(token)
+            labels = (scope["method"], route_label(scope))
+            REQUESTS.inc(labels + (str(response["status"]),))
+            REQUEST_LATENCY.observe(time.perf_counter() - started_at, labels)
+            RESPONSE_BYTES.inc(labels, response["bytes"])
+            DB_QUERIES.observe(query_stats.count, labels)
+            DB_TIME.inc(labels, query_stats.duration)
+            if query_stats.count > REQUEST_QUERY_BUDGET:
+                sql_logger.warning(
+                    "Budget de requêtes SQL dépassé : %s a exécuté %d requêtes (budget %d)",
+                    query_stats.route, query_stats.count, REQUEST_QUERY_BUDGET
+                )
+
+def render_metrics(extra: Optional[List[List[str]]] = None) -> str:
+    """Export au format texte Prometheus"""
+    lines: List[str] = []
+    for metric in (REQUESTS, REQUEST_LATENCY, RESPONSE_BYTES, DB_QUERIES, DB_TIME):
+        lines.extend(metric.render())
+    lines.extend(render_sampled("evazo_http_requests_in_flight", "Requêtes HTTP en cours", [({}, InFlight.value)]))
+    for metric_lines in extra or []:
+        lines.extend(metric_lines)
+    return "\n".join(lines) + "\n"
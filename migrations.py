@@ -0,0 +1,109 @@
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel, Session, select, update, case
+from database import engine
+from models import Music, PaymentCode, PaymentStatus
+from genres import resolve_genre, seed_genre_aliases
+from typing import Callable, Dict, Tuple
+
+# ===== BACKFILLS =====
+
+def backfill_payment_code_status(session: Session) -> None:
+    """Initialiser le statut explicite des codes existants"""
+    session.exec(
+        update(PaymentCode)
+        .where(PaymentCode.status.is_(None))
+        .values(status=case(
+            (PaymentCode.is_used == True, PaymentStatus.COMPLETED.name),
+            else_=PaymentStatus.PENDING.name
+        ))
+    )
+
+def backfill_music_genres(session: Session) -> None:
+    """Rattacher les genres en texte libre à la table des genres normalisés"""
+    seed_genre_aliases(session)
+    names = session.exec(select(Music.genre).where(Music.genre.isnot(None)).distinct()).all()
+    for name in names:
+        genre = resolve_genre(session, name)
+        session.exec(
+            update(Music)
+            .where(Music.genre == name)
+            .values(genre_id=genre.id if genre else None, genre=genre.name if genre else None)
+        )
+
+# (table, colonne) -> fonction exécutée juste après l'ajout de la colonne
+BACKFILLS: Dict[Tuple[str, str], Callable[[Session], None]] = {
+    ("payment_codes", "status"): backfill_payment_code_status,
+    ("musics", "genre_id"): backfill_music_genres,
+}
+
+# (table, ancienne colonne décimale) -> colonne en centimes qui la remplace
+CENTS_COLUMNS: Dict[Tuple[str, str], str] = {
+    ("musics", "price"): "price_cents",
+    ("payment_codes", "price"): "price_cents",
+    ("purchases", "amount_paid"): "amount_paid_cents",
+}
+
+def migrate_to_cents(connection, table: str, legacy: str, column: str) -> None:
+    """Recopier un montant décimal en centimes entiers puis supprimer l'ancienne colonne.
+
+    Exécuté dans la même transaction que l'ajout de la colonne : une migration
+    interrompue ne laisse jamais de montant perdu. Les montants ayant plus de
+    deux décimales (aucun en principe) sont arrondis au centime et signalés.
+    """
+    cents = f"ROUND({legacy} * 100)"
+    rounded = connection.execute(text(
+        f"SELECT COUNT(*) FROM {table} WHERE ABS({legacy} * 100 - {cents}) > 0.000001"
+    )).scalar()
+    connection.execute(text(
+        f"UPDATE {table} SET {column} = CAST({cents} AS INTEGER) WHERE {column} IS NULL"
+    ))
+    # SQLite refuse de supprimer une colonne indexée
+    for index in inspect(connection).get_indexes(table):
+        if legacy in index["column_names"]:
+            connection.execute(text(f"DROP INDEX {index['name']}"))
+    connection.execute(text(f"ALTER TABLE {table} DROP COLUMN {legacy}"))
+    print(f"🔧 Montants convertis en centimes: {table}.{legacy} -> {column}")
+    if rounded:
+        print(f"⚠️ {rounded} montant(s) de {table}.{legacy} arrondi(s) au centime")
+
+# ===== MIGRATION =====
+
+def run_migrations() -> None:
+    """Mettre à niveau une base existante.
+
+    `create_all` ne crée que les tables absentes : on ajoute ici les colonnes
+    et index manquants (les montants décimaux passent en centimes), puis on
+    remplit les nouvelles colonnes et on crée les alias de genres par défaut.
+    """
+    added_columns = []
+    
+    with engine.begin() as connection:
+        # Lecture du schéma dans la transaction de migration (sinon verrouillée par elle)
+        inspector = inspect(connection)
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added_columns.append((table.name, column.name))
+                print(f"🔧 Colonne ajoutée: {table.name}.{column.name}")
+            
+            for (table_name, legacy), column_name in CENTS_COLUMNS.items():
+                if table_name == table.name and legacy in existing_columns:
+                    migrate_to_cents(connection, table.name, legacy, column_name)
+            
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    
+    with Session(engine) as session:
+        for added in added_columns:
+            backfill = BACKFILLS.get(added)
+            if backfill:
+                backfill(session)
+        seed_genre_aliases(session)
+        session.commit()
@@ -1,7 +1,10 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
+from pydantic import field_validator
 from typing import Optional, List ,Dict ,Any
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+from money import from_cents
 from enum import Enum
 import uuid
 
@@ -41,7 +44,7 @@ class User(SQLModel, table=True):
     artist_website: Optional[str] = None
     
     # Timestamps
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     updated_at: Optional[datetime] = Field(default=None, sa_column_kwargs={"onupdate": datetime.utcnow})
     
     # Relations
@@ -59,6 +62,16 @@ class UserReade(SQLModel):
     role: str
     is_active: bool
 
+    @field_validator("full_name", mode="before")
+    @classmethod
+    def default_full_name(cls, value):
+        return value or ""
+
+    @field_validator("role", mode="before")
+    @classmethod
+    def role_value(cls, value):
+        return value.value if isinstance(value, Enum) else value
+
 class UserUpdate(SQLModel):
     email: Optional[str] = None
     username: Optional[str] = None
@@ -72,13 +85,36 @@ class UserUpdate(SQLModel):
 
 
 
+class Genre(SQLModel, table=True):
+    __tablename__ = "genres"
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(unique=True)  # Nom canonique affiché (ex: "Hip-Hop")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class GenreAlias(SQLModel, table=True):
+    __tablename__ = "genre_aliases"
+    
+    # Clé normalisée (voir genres.genre_key) : "hip hop", "HipHop" et "hip-hop" -> "hiphop"
+    alias: str = Field(primary_key=True)
+    genre_id: int = Field(foreign_key="genres.id", index=True)
+
 class Music(SQLModel, table=True):
     __tablename__ = "musics"
+    __table_args__ = (
+        # Filtre par genre du catalogue publié (trié par date) et comptages par genre
+        Index("ix_musics_genre_id_status_created_at", "genre_id", "status", "created_at"),
+        # Facettes du parcours : index couvrant, la table n'est pas lue
+        Index("ix_musics_status_genre_id_is_free_price_cents", "status", "genre_id", "is_free", "price_cents"),
+        # Filtre par tranche de prix du catalogue publié
+        Index("ix_musics_status_price_cents", "status", "price_cents"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
     description: Optional[str] = None
-    genre: Optional[str] = None
+    genre: Optional[str] = None  # Nom canonique du genre, recopié pour l'affichage
+    genre_id: Optional[int] = Field(default=None, foreign_key="genres.id")
     duration: Optional[int] = None  # Durée en secondes
     
     # Fichiers
@@ -87,7 +123,7 @@ class Music(SQLModel, table=True):
     
     # Paramètres de vente
     is_free: bool = Field(default=True)
-    price: Decimal = Field(default=Decimal('0.00'))
+    price_cents: int = Field(default=0)  # Prix en centimes
     
     # Statut et compteurs
     status: MusicStatus = Field(default=MusicStatus.DRAFT)
@@ -98,7 +134,7 @@ class Music(SQLModel, table=True):
     artist_id: int = Field(foreign_key="users.id")
     
     # Timestamps
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     updated_at: Optional[datetime] = Field(default=None, sa_column_kwargs={"onupdate": datetime.utcnow})
     
     # Relations
@@ -107,15 +143,24 @@ class Music(SQLModel, table=True):
     favorites: List["Favorite"] = Relationship(back_populates="music")
     payment_codes: List["PaymentCode"] = Relationship(back_populates="music")
     play_history: List["PlayHistory"] = Relationship(back_populates="music")
+    
+    @property
+    def price(self) -> Decimal:
+        return from_cents(self.price_cents)
 
 class PaymentCode(SQLModel, table=True):
     __tablename__ = "payment_codes"
+    __table_args__ = (
+        # Codes actifs / expirés : sert le balayage et les statistiques admin
+        Index("ix_payment_codes_is_used_expires_at", "is_used", "expires_at"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     code: str = Field(unique=True, index=True)
     music_id: int = Field(foreign_key="musics.id")
     # Paramètres du code
-    price: Decimal
+    price_cents: int  # Prix en centimes
     is_used: bool = Field(default=False)
+    status: PaymentStatus = Field(default=PaymentStatus.PENDING, index=True)
     expires_at: datetime
     # Métadonnées d'utilisation
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -125,6 +170,10 @@ class PaymentCode(SQLModel, table=True):
     music: Optional[Music] = Relationship(back_populates="payment_codes")
     used_by: Optional[User] = Relationship(back_populates="used_payment_codes")
     purchases: List["Purchase"] = Relationship(back_populates="payment_code")
+    
+    @property
+    def price(self) -> Decimal:
+        return from_cents(self.price_cents)
 
 
 
@@ -132,22 +181,26 @@ class PaymentCode(SQLModel, table=True):
 class Purchase(SQLModel, table=True):
     __tablename__ = "purchases"
     id: Optional[int] = Field(default=None, primary_key=True)
-    client_id: int = Field(foreign_key="users.id")
+    client_id: int = Field(foreign_key="users.id", index=True)
     music_id: int = Field(foreign_key="musics.id")
     payment_code_id: Optional[int] = Field(default=None, foreign_key="payment_codes.id")
     # Détails de l'achat
-    amount_paid: Decimal
+    amount_paid_cents: int  # Montant en centimes
     status: PaymentStatus = Field(default=PaymentStatus.COMPLETED)
     # Gestion des téléchargements
     download_count: int = Field(default=0)
     max_downloads: int = Field(default=5)
     # Timestamp
-    purchased_at: datetime = Field(default_factory=datetime.utcnow)
+    purchased_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     # Relations
     client: Optional[User] = Relationship(back_populates="purchases")
     music: Optional[Music] = Relationship(back_populates="purchases")
     payment_code: Optional[PaymentCode] = Relationship(back_populates="purchases")
     download_logs: List["DownloadLog"] = Relationship(back_populates="purchase")
+    
+    @property
+    def amount_paid(self) -> Decimal:
+        return from_cents(self.amount_paid_cents)
 
     
 
@@ -155,7 +208,7 @@ class Favorite(SQLModel, table=True):
     __tablename__ = "favorites"
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="users.id")
+    user_id: int = Field(foreign_key="users.id", index=True)
     music_id: int = Field(foreign_key="musics.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
@@ -165,11 +218,15 @@ class Favorite(SQLModel, table=True):
 
 class PlayHistory(SQLModel, table=True):
     __tablename__ = "play_history"
+    __table_args__ = (
+        # Historique récent d'un utilisateur (recommandations, /play-history)
+        Index("ix_play_history_user_id_played_at", "user_id", "played_at"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.id")
     music_id: int = Field(foreign_key="musics.id")
-    played_at: datetime = Field(default_factory=datetime.utcnow)
+    played_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     duration_played: int = Field(default=0)  # Durée écoutée en secondes
     
     # Relations
@@ -189,6 +246,58 @@ class DownloadLog(SQLModel, table=True):
     purchase: Optional[Purchase] = Relationship(back_populates="download_logs")
 
 
+class IdempotencyRecord(SQLModel, table=True):
+    __tablename__ = "idempotency_keys"
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    key: str = Field(unique=True, index=True)  # Empreinte (utilisateur + clé + route)
+    fingerprint: Optional[str] = None  # Empreinte de la requête (méthode, route, corps)
+    status_code: int
+    content_type: Optional[str] = None
+    body: bytes
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime = Field(index=True)
+
+class ChartScore(SQLModel, table=True):
+    __tablename__ = "chart_scores"
+    
+    chart: str = Field(primary_key=True)  # Nom du classement (demi-vie), ex: "hot"
+    music_id: int = Field(primary_key=True, foreign_key="musics.id")
+    genre: Optional[str] = None  # Genre normalisé (minuscules)
+    score: float  # Score décroissant, valeur à scored_at
+    scored_at: datetime = Field(index=True)
+
+class DailySales(SQLModel, table=True):
+    """Ventes agrégées par jour et par musique (mises à jour à l'achat, voir sales.py)"""
+    __tablename__ = "daily_sales"
+    __table_args__ = (
+        # Séries d'un artiste ou d'une musique sur une plage de dates
+        Index("ix_daily_sales_artist_id_day", "artist_id", "day"),
+        Index("ix_daily_sales_music_id_day", "music_id", "day"),
+    )
+    
+    day: date = Field(primary_key=True)  # Jour UTC de l'achat
+    music_id: int = Field(primary_key=True, foreign_key="musics.id")
+    artist_id: int = Field(foreign_key="users.id")
+    sales_count: int = Field(default=0)
+    revenue_cents: int = Field(default=0)
+
+class TrackSimilarity(SQLModel, table=True):
+    __tablename__ = "track_similarities"
+    
+    music_id: int = Field(primary_key=True, foreign_key="musics.id")
+    # K voisins : K entiers int32 (music_id) puis K flottants float32 (score), little-endian
+    neighbors: bytes
+    computed_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class JobLease(SQLModel, table=True):
+    """Bail d'une tâche de fond : un seul worker l'exécute tant que le bail court"""
+    __tablename__ = "job_leases"
+    
+    name: str = Field(primary_key=True)  # Nom de la tâche, ex: "recommendations"
+    owner: str  # Worker détenteur du bail
+    expires_at: datetime
+
 
 class MusicRead(SQLModel):
     id: int
@@ -207,6 +316,67 @@ class MusicRead(SQLModel):
     # Relations
     artist: Optional[UserReade] = None
 
+class GenreCount(SQLModel):
+    id: int
+    name: str
+    track_count: int
+
+class IsFreeCount(SQLModel):
+    is_free: bool
+    count: int
+
+class PriceBucketCount(SQLModel):
+    min_price: float
+    max_price: Optional[float] = None  # Dernière tranche : sans borne haute
+    count: int
+
+class MusicFacets(SQLModel):
+    total: int
+    genres: List[GenreCount]
+    is_free: List[IsFreeCount]
+    price_buckets: List[PriceBucketCount]
+
+class Suggestion(SQLModel):
+    type: str  # "track", "artist" ou "genre"
+    id: int
+    label: str
+    detail: Optional[str] = None  # Artiste d'un morceau
+
+class SalesPoint(SQLModel):
+    period: date  # Premier jour de la période (jour, lundi de la semaine ou 1er du mois)
+    sales: int
+    revenue: Decimal
+
+class SalesSeries(SQLModel):
+    start: date
+    end: date
+    granularity: str  # "day", "week" ou "month"
+    total_sales: int
+    total_revenue: Decimal
+    points: List[SalesPoint]
+
+class ChartEntry(SQLModel):
+    rank: int
+    score: float
+    music: MusicRead
+
+class MusicFullRead(MusicRead):
+    """Vue complète d'une musique (artiste propriétaire et admin)"""
+    file_path: str
+    updated_at: Optional[datetime] = None
+
+class PaymentCodeRead(SQLModel):
+    id: int
+    code: str
+    music_id: int
+    price: Decimal
+    is_used: bool
+    status: PaymentStatus
+    expires_at: datetime
+    created_at: datetime
+    used_at: Optional[datetime] = None
+    used_by_client_id: Optional[int] = None
+
 class PurchaseCreate(SQLModel):
     music_id: int
     payment_code: str
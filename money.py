@@ -0,0 +1,26 @@
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_UP
+from typing import Optional, Union
+
+# Les montants sont stockés en centimes (entiers) : comparaisons indexées et sommes exactes
+CENT = Decimal("0.01")
+
+Amount = Union[Decimal, float, int, str]
+
+def to_cents(amount: Optional[Amount], rounding: str = ROUND_HALF_UP) -> int:
+    """Montant en euros -> centimes (arrondi au centime le plus proche par défaut)"""
+    if amount is None:
+        return 0
+    value = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+    return int((value * 100).to_integral_value(rounding=rounding))
+
+def from_cents(cents: Optional[int]) -> Decimal:
+    """Centimes -> montant en euros avec deux décimales"""
+    return (Decimal(cents or 0) / 100).quantize(CENT)
+
+def min_cents(amount: Amount) -> int:
+    """Borne basse d'un filtre de prix : plus petit nombre de centimes >= amount"""
+    return to_cents(amount, ROUND_CEILING)
+
+def max_cents(amount: Amount) -> int:
+    """Borne haute d'un filtre de prix : plus grand nombre de centimes <= amount"""
+    return to_cents(amount, ROUND_FLOOR)
@@ -0,0 +1,191 @@
+from sqlalchemy import text
+from database import engine
+from datetime import datetime
+from typing import Any, Dict, Optional
+import os
+import platform
+import shutil
+import threading
+import time
+import psutil
+
+# Configuration
+SYSTEM_SAMPLE_INTERVAL_SECONDS = 5
+READINESS_MAX_SAMPLE_AGE_SECONDS = 30
+UPLOAD_FOLDERS = {
+    "music_folder": os.path.join("uploads", "music"),
+    "covers_folder": os.path.join("uploads", "covers"),
+}
+DATABASE_FILE = engine.url.database or ""
+
+# ===== FONCTIONS UTILITAIRES =====
+
+def get_directory_size(path: str) -> Dict[str, Any]:
+    """Calculer la taille d'un dossier"""
+    if not os.path.exists(path):
+        return {
+            "exists": False,
+            "size_bytes": 0,
+            "size_mb": 0,
+            "file_count": 0
+        }
+    
+    total_size = 0
+    file_count = 0
+    
+    try:
+        for dirpath, dirnames, filenames in os.walk(path):
+            for filename in filenames:
+                filepath = os.path.join(dirpath, filename)
+                if os.path.exists(filepath):
+                    total_size += os.path.getsize(filepath)
+                    file_count += 1
+    except PermissionError:
+        pass
+    
+    return {
+        "exists": True,
+        "size_bytes": total_size,
+        "size_mb": round(total_size / (1024 * 1024), 2),
+        "file_count": file_count
+    }
+
+def get_system_storage_info() -> Dict[str, Any]:
+    """Obtenir les informations de stockage système"""
+    try:
+        disk_usage = shutil.disk_usage("/")
+        return {
+            "total_gb": round(disk_usage.total / (1024**3), 2),
+            "used_gb": round(disk_usage.used / (1024**3), 2),
+            "free_gb": round(disk_usage.free / (1024**3), 2),
+            "usage_percent": round((disk_usage.used / disk_usage.total) * 100, 2)
+        }
+    except Exception as e:
+        return {
+            "error": str(e),
+            "total_gb": 0,
+            "used_gb": 0,
+            "free_gb": 0,
+            "usage_percent": 0
+        }
+
+def get_file_size(path: str) -> Dict[str, Any]:
+    """Taille d'un fichier unique (un seul stat)"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return {"exists": False, "size_bytes": 0, "size_mb": 0}
+    return {"exists": True, "size_bytes": size, "size_mb": round(size / (1024 * 1024), 2)}
+
+# ===== USAGE DES UPLOADS =====
+
+class UploadUsage:
+    """Taille et nombre de fichiers des dossiers d'upload.
+
+    Un seul parcours au démarrage, puis mise à jour à chaque upload / suppression.
+    """
+
+    def __init__(self, folders: Dict[str, str] = UPLOAD_FOLDERS):
+        self.folders = folders
+        self._usage = {name: {"size_bytes": 0, "file_count": 0} for name in folders}
+        self._lock = threading.Lock()
+
+    def scan(self) -> None:
+        for name, path in self.folders.items():
+            size = get_directory_size(path)
+            with self._lock:
+                self._usage[name] = {"size_bytes": size["size_bytes"], "file_count": size["file_count"]}
+
+    def _folder_of(self, path: str) -> Optional[str]:
+        directory = os.path.normpath(os.path.dirname(path))
+        for name, folder in self.folders.items():
+            if directory == os.path.normpath(folder):
+                return name
+        return None
+
+    def _apply(self, path: str, sign: int) -> None:
+        name = self._folder_of(path)
+        if name is None:
+            return
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self._usage[name]["size_bytes"] += sign * size
+            self._usage[name]["file_count"] += sign
+
+    def file_added(self, path: str) -> None:
+        """À appeler après l'écriture d'un fichier uploadé"""
+        self._apply(path, 1)
+
+    def file_removed(self, path: str) -> None:
+        """À appeler juste avant la suppression d'un fichier uploadé"""
+        self._apply(path, -1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            usage = {name: dict(values) for name, values in self._usage.items()}
+        
+        result = {}
+        for name, values in usage.items():
+            result[name] = {
+                "exists": os.path.isdir(self.folders[name]),
+                "size_bytes": values["size_bytes"],
+                "size_mb": round(values["size_bytes"] / (1024 * 1024), 2),
+                "file_count": values["file_count"]
+            }
+        
+        total_size = sum(values["size_bytes"] for values in usage.values())
+        result["total_uploads"] = {
+            "size_bytes": total_size,
+            "size_mb": round(total_size / (1024 * 1024), 2),
+            "file_count": sum(values["file_count"] for values in usage.values())
+        }
+        return result
+
+upload_usage = UploadUsage()
+
+# ===== ÉCHANTILLONNEUR SYSTÈME =====
+
+class SystemSampler:
+    """Dernières mesures CPU / mémoire / disque / base, rafraîchies en tâche de fond"""
+
+    def __init__(self):
+        self.snapshot: Dict[str, Any] = {}
+        self.database_status = "unknown"
+        self.sampled_at: Optional[float] = None
+        self.started_at = datetime.now()
+
+    def check_database(self) -> str:
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            return "connected"
+        except Exception as e:
+            return f"error: {str(e)}"
+
+    def sample(self) -> None:
+        """Une mesure (bloquante, à exécuter hors de la boucle d'événements)"""
+        memory = psutil.virtual_memory()
+        self.snapshot = {
+            "platform": f"{platform.system()} {platform.release()}",
+            "python_version": platform.python_version(),
+            "cpu_count": psutil.cpu_count(),
+            "memory_total_gb": round(memory.total / (1024**3), 2),
+            "memory_available_gb": round(memory.available / (1024**3), 2),
+            # Non bloquant : pourcentage depuis l'appel précédent
+            "cpu_usage_percent": round(psutil.cpu_percent(interval=None), 2),
+            "system_storage": get_system_storage_info(),
+            "database_file": get_file_size(DATABASE_FILE),
+            "logs_folder": get_directory_size("logs")
+        }
+        self.database_status = self.check_database()
+        self.sampled_at = time.monotonic()
+
+    def is_ready(self) -> bool:
+        if self.sampled_at is None or self.database_status != "connected":
+            return False
+        return time.monotonic() - self.sampled_at <= READINESS_MAX_SAMPLE_AGE_SECONDS
+
+system_sampler = SystemSampler()
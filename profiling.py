@@ -0,0 +1,322 @@
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
+from sqlmodel import Session
+from database import engine, QueryStats, current_query_stats, sql_logger
+from models import User, UserRole
+from routers.auth import is_token_blacklisted, SECRET_KEY, ALGORITHM
+from jose import JWTError, jwt
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+# Configuration
+PROFILE_HEADER = b"x-profile"
+REQUEST_ID_HEADER = b"x-request-id"
+MAX_STORED_PROFILES = 100
+MAX_RECORDED_QUERIES = 500
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Frames du pool de threads / de la boucle : jamais des points d'entrée de la requête
+RUNNER_PATHS = (
+    os.sep + "threading.py",
+    os.sep + "anyio" + os.sep,
+    os.sep + "concurrent" + os.sep + "futures" + os.sep,
+)
+
+def frame_label(code) -> str:
+    """Libellé d'une frame pour le format « folded » (sans point-virgule)"""
+    filename = code.co_filename
+    if filename.startswith(ROOT):
+        filename = os.path.relpath(filename, ROOT)
+    elif "site-packages" + os.sep in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+def is_runner_frame(frame) -> bool:
+    return any(path in frame.f_code.co_filename for path in RUNNER_PATHS)
+
+def on_stack(frame, anchor) -> bool:
+    while frame is not None:
+        if frame is anchor:
+            return True
+        frame = frame.f_back
+    return False
+
+# ===== PROFIL D'UNE REQUÊTE =====
+
+class RequestProfile:
+    """Échantillons de pile et requêtes SQL d'une requête HTTP.
+
+    Un thread échantillonne `sys._current_frames()` toutes les `interval` secondes.
+    Seules les frames de la requête sont retenues : sur la boucle d'événements, celles
+    situées au-dessus du middleware de profilage ; dans le pool de threads, celles du
+    travail en cours d'un thread rattaché à la requête lors de sa première requête SQL.
+    """
+
+    def __init__(self, scope: Scope, reason: str, interval: float, request_id: Optional[str] = None):
+        # Clé de stockage générée ici : l'identifiant fourni par le client n'est qu'informatif
+        self.id = uuid.uuid4().hex
+        self.request_id = request_id
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.reason = reason
+        self.interval = interval
+        self.started_at = datetime.utcnow()
+        self.status_code: Optional[int] = None
+        self.duration_ms = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.queries: List[Dict] = []
+        self.queries_dropped = 0
+        self._scope = scope
+        self._anchors: Dict[int, object] = {}
+        self._roots: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def route(self) -> str:
+        return getattr(self._scope.get("route"), "path", None) or self.path
+
+    def start(self, anchor) -> None:
+        """Démarrer l'échantillonnage à partir de la frame du middleware (boucle d'événements)"""
+        self._attach(threading.get_ident(), anchor, "event-loop")
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+        self._started = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self, status_code: int) -> None:
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        self.status_code = status_code
+        self._anchors.clear()
+
+    def _attach(self, thread_id: int, anchor, root: str) -> None:
+        with self._lock:
+            self._anchors[thread_id] = anchor
+            self._roots[thread_id] = root
+
+    def join_current_thread(self) -> None:
+        """Rattacher le travail en cours du thread appelant (pool de threads) à la requête"""
+        thread_id = threading.get_ident()
+        current = sys._getframe(1)
+        anchor = self._anchors.get(thread_id)
+        if anchor is not None and on_stack(current, anchor):
+            return
+
+        # Point d'entrée : la frame la plus basse au-dessus du code du pool de threads
+        entry = frame = current
+        while frame is not None and not is_runner_frame(frame):
+            entry = frame
+            frame = frame.f_back
+        self._attach(thread_id, entry, "worker")
+
+    def record_query(self, statement: str, parameters: str, duration: float) -> None:
+        """Appelé par l'instrumentation SQL (database.py) pour chaque requête de la requête HTTP"""
+        self.join_current_thread()
+        with self._lock:
+            if len(self.queries) >= MAX_RECORDED_QUERIES:
+                self.queries_dropped += 1
+                return
+            self.queries.append({
+                "sql": " ".join(statement.split()),
+                "params": parameters,
+                "duration_ms": round(duration * 1000, 3),
+                "thread": threading.current_thread().name,
+            })
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        frames = sys._current_frames()
+        with self._lock:
+            anchors = list(self._anchors.items())
+
+        prefix = f"{self.method} {self.route}"
+        for thread_id, anchor in anchors:
+            frame = frames.get(thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                if frame is anchor:
+                    break
+                frame = frame.f_back
+            else:
+                # Le travail rattaché est terminé : le thread est rendu au pool
+                if self._roots.get(thread_id) == "worker":
+                    with self._lock:
+                        if self._anchors.get(thread_id) is anchor:
+                            del self._anchors[thread_id]
+                continue
+            stack.append(self._roots[thread_id])
+            stack.append(prefix)
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        """Format « folded » (flamegraph.pl, speedscope, inferno) : pile;pile;pile N"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "reason": self.reason,
+            "status_code": self.status_code,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms, 2),
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "query_count": len(self.queries) + self.queries_dropped,
+            "query_time_ms": round(sum(query["duration_ms"] for query in self.queries), 3),
+        }
+
+    def as_dict(self) -> Dict:
+        return {
+            **self.summary(),
+            "stacks": [{"stack": stack, "samples": count} for stack, count in self.stacks.most_common()],
+            "queries": self.queries,
+            "queries_dropped": self.queries_dropped,
+        }
+
+# ===== STOCKAGE =====
+
+class ProfileStore:
+    """Derniers profils en mémoire, indexés par identifiant de profil"""
+
+    def __init__(self, max_profiles: int = MAX_STORED_PROFILES):
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles[profile.id] = profile
+            self._profiles.move_to_end(profile.id)
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[RequestProfile]:
+        with self._lock:
+            return list(reversed(self._profiles.values()))
+
+profile_store = ProfileStore()
+
+# ===== MIDDLEWARE =====
+
+def find_header(scope: Scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+def is_admin_token(authorization: Optional[bytes]) -> bool:
+    """Le profilage à la demande est réservé aux administrateurs actifs"""
+    if not authorization or not authorization.lower().startswith(b"bearer "):
+        return False
+    token = authorization[7:].decode("latin-1").strip()
+    try:
+        user_id = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return False
+    if not user_id:
+        return False
+
+    with Session(engine) as session:
+        if is_token_blacklisted(token, session):
+            return False
+        user = session.get(User, int(user_id))
+        return bool(user and user.is_active and user.role == UserRole.ADMIN)
+
+class ProfilingMiddleware:
+    """Profilage à la demande d'une requête HTTP.
+
+    Déclenché par l'en-tête `X-Profile: 1` d'un administrateur, ou par
+    échantillonnage aléatoire (`sample_rate`). Le profil (piles au format
+    flamegraph et requêtes SQL) est conservé dans `profile_store` ; son
+    identifiant, toujours généré par le serveur, est renvoyé dans l'en-tête
+    `X-Profile-Id` (un `X-Request-Id` du client est seulement recopié dans le
+    profil). Les autres requêtes ne paient qu'une recherche d'en-tête.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate: float = 0.0,
+        interval: float = 0.002,
+        store: ProfileStore = profile_store,
+        excluded_paths: Iterable[str] = ("/metrics",)
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.store = store
+        self.excluded_paths = set(excluded_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        reason = None
+        if find_header(scope, PROFILE_HEADER) in (b"1", b"true"):
+            if await run_in_threadpool(is_admin_token, find_header(scope, b"authorization")):
+                reason = "header"
+        if reason is None and self.sample_rate and random.random() < self.sample_rate:
+            reason = "sample"
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = (find_header(scope, REQUEST_ID_HEADER) or b"").decode("latin-1")[:64] or None
+        profile = RequestProfile(scope, reason, self.interval, request_id)
+
+        # Les requêtes SQL de la requête HTTP sont transmises au profil
+        query_stats = current_query_stats.get()
+        token = None
+        if query_stats is None:
+            query_stats = QueryStats(scope)
+            token = current_query_stats.set(query_stats)
+        query_stats.profile = profile
+        status = {"code": 500}
+
+        async def profiled_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile.id.encode("latin-1"))
+                ]
+            await send(message)
+
+        profile.start(sys._getframe())
+        try:
+            await self.app(scope, receive, profiled_send)
+        finally:
+            profile.stop(status["code"])
+            query_stats.profile = None
+            if token is not None:
+                current_query_stats.reset(token)
+            self.store.add(profile)
+            sql_logger.info(
+                "Profil %s enregistré : %s %s (%.1f ms, %d échantillons, %d requêtes SQL)",
+                profile.id, profile.method, profile.route, profile.duration_ms, profile.samples, len(profile.queries)
+            )
@@ -0,0 +1,284 @@
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+from routers.auth import SECRET_KEY, ALGORITHM
+from cache import LocalSharedClient
+from jose import JWTError, jwt
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import json
+import math
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Dépendance optionnelle (backend partagé)
+    redis = None
+
+# Configuration
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL")  # ex: redis://localhost:6379/1
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+# Résultat d'une prise de jeton : (autorisé, jetons restants, secondes avant nouvel essai)
+Decision = Tuple[bool, float, float]
+
+def take_token(tokens: float, updated_at: float, capacity: float, rate: float, now: float, cost: float = 1) -> Decision:
+    """Seau à jetons : recharge depuis `updated_at` puis retire `cost` jetons si possible"""
+    tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+# ===== POLITIQUES =====
+
+class RatePolicy:
+    """`capacity` requêtes en rafale, rechargées à raison de `capacity` par `period` secondes.
+
+    `key` : "ip" (adresse du client) ou "user" (identifiant du jeton JWT, à défaut l'adresse IP).
+    """
+
+    def __init__(self, name: str, capacity: int, period: float, key: str = "user"):
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+        self.key = key
+
+    @classmethod
+    def from_env(cls, name: str, default: str, key: str = "user") -> "RatePolicy":
+        """Lire une politique « capacité/secondes » (ex: RATE_LIMIT_LOGIN=10/60)"""
+        capacity, period = os.getenv(f"RATE_LIMIT_{name.upper()}", default).split("/")
+        return cls(name, int(capacity), float(period), key)
+
+# ===== BACKENDS =====
+
+class InProcessBuckets:
+    """Seaux en mémoire, propres au processus.
+
+    Accès O(1) par clé ; les seaux sont rangés du moins au plus récemment utilisé.
+    Un seau inactif depuis plus que son temps de recharge complet est plein :
+    le supprimer ne change rien, il est recréé plein au prochain accès.
+    """
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def take(self, key: str, policy: RatePolicy) -> Decision:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(policy.capacity), now, policy.period]
+                self._buckets[key] = bucket
+            else:
+                self._buckets.move_to_end(key)
+            allowed, bucket[0], retry_after = take_token(bucket[0], bucket[1], policy.capacity, policy.rate, now)
+            bucket[1] = now
+            self._evict_idle(now)
+            return allowed, bucket[0], retry_after
+
+    def _evict_idle(self, now: float, budget: int = 2) -> None:
+        # Quelques seaux les plus anciens par appel : coût amorti constant
+        for _ in range(budget):
+            if not self._buckets:
+                return
+            key, (_, updated_at, full_after) = next(iter(self._buckets.items()))
+            if now - updated_at < full_after:
+                break
+            del self._buckets[key]
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+class SharedBuckets:
+    """Seaux partagés entre workers via un client compatible Redis.
+
+    La prise de jeton est atomique (script Lua) ; chaque seau expire une fois
+    rechargé, l'éviction des seaux inactifs est donc assurée par le serveur.
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.evictions = 0
+
+    def take(self, key: str, policy: RatePolicy) -> Decision:
+        allowed, tokens, retry_after = self._script(
+            keys=[self.prefix + key], args=[policy.capacity, policy.rate, time.time()]
+        )
+        return bool(int(allowed)), float(tokens), float(retry_after)
+
+    def size(self) -> int:
+        return -1  # Inconnu côté application
+
+class LocalBucketClient(LocalSharedClient):
+    """Remplaçant local de Redis : le script du seau à jetons est exécuté en Python"""
+
+    def __init__(self):
+        super().__init__()
+        self._script_lock = threading.Lock()  # Un script Redis s'exécute de manière atomique
+
+    def register_script(self, script: str):
+        def run(keys: List[str], args: List[float]):
+            capacity, rate, now = float(args[0]), float(args[1]), float(args[2])
+            with self._script_lock:
+                raw = self.get(keys[0])
+                tokens, updated_at = json.loads(raw) if raw is not None else (capacity, now)
+                allowed, tokens, retry_after = take_token(tokens, updated_at, capacity, rate, now)
+                self.set(keys[0], json.dumps([tokens, now]), ex=math.ceil(capacity / rate))
+            return [int(allowed), str(tokens), str(retry_after)]
+        return run
+
+def create_rate_limit_backend(url: Optional[str] = RATE_LIMIT_URL):
+    """Backend partagé si une URL est configurée, sinon seaux en mémoire"""
+    if not url:
+        return InProcessBuckets()
+    if url == "local://":
+        return SharedBuckets(LocalBucketClient())
+    if redis is None:
+        raise RuntimeError("RATE_LIMIT_URL est défini mais le paquet 'redis' n'est pas installé")
+    return SharedBuckets(redis.Redis.from_url(url))
+
+# ===== LIMITEUR =====
+
+class RateLimiter:
+    def __init__(self, backend, enabled: bool = RATE_LIMIT_ENABLED):
+        self.backend = backend
+        self.enabled = enabled
+        self.allowed: Dict[str, int] = {}
+        self.limited: Dict[str, int] = {}
+        self._counters_lock = threading.Lock()
+
+    def hit(self, policy: RatePolicy, identity: str) -> Decision:
+        allowed, remaining, retry_after = self.backend.take(f"{policy.name}:{identity}", policy)
+        with self._counters_lock:
+            counters = self.allowed if allowed else self.limited
+            counters[policy.name] = counters.get(policy.name, 0) + 1
+        return allowed, remaining, retry_after
+
+    def stats(self) -> Dict:
+        with self._counters_lock:
+            allowed, limited = dict(self.allowed), dict(self.limited)
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "buckets": self.backend.size(),
+            "evictions": self.backend.evictions,
+            "allowed": allowed,
+            "limited": limited,
+        }
+
+rate_limiter = RateLimiter(create_rate_limit_backend())
+
+# ===== MIDDLEWARE =====
+
+def client_ip(scope: Scope) -> str:
+    """Adresse du client (uvicorn --proxy-headers la résout derrière un proxy)"""
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def token_subject(scope: Scope) -> Optional[str]:
+    """Identifiant de l'utilisateur d'après la signature du jeton, sans accès à la base"""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            if not value.lower().startswith(b"bearer "):
+                return None
+            try:
+                return jwt.decode(value[7:].decode("latin-1").strip(), SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            except JWTError:
+                return None
+    return None
+
+class RateLimitMiddleware:
+    """Limitation de débit par route (seau à jetons), avant tout accès à la base.
+
+    Réponse 429 avec `Retry-After` quand le seau est vide ; les réponses des routes
+    limitées portent les en-têtes RateLimit-Limit / RateLimit-Remaining / RateLimit-Reset.
+    """
+
+    def __init__(self, app: ASGIApp, policies: Dict[Tuple[str, str], RatePolicy], limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+        self.policies = [
+            (method, compile_path(path)[0], policy) for (method, path), policy in policies.items()
+        ]
+
+    def match(self, scope: Scope) -> Optional[RatePolicy]:
+        for method, regex, policy in self.policies:
+            if scope["method"] == method and regex.match(scope["path"]):
+                return policy
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.limiter.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        policy = self.match(scope)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        subject = token_subject(scope) if policy.key == "user" else None
+        identity = f"user:{subject}" if subject else f"ip:{client_ip(scope)}"
+        allowed, remaining, retry_after = self.limiter.hit(policy, identity)
+
+        headers = [
+            (b"ratelimit-limit", str(policy.capacity).encode()),
+            (b"ratelimit-remaining", str(int(remaining)).encode()),
+            (b"ratelimit-reset", str(math.ceil((policy.capacity - remaining) / policy.rate)).encode()),
+        ]
+
+        if not allowed:
+            wait = max(1, math.ceil(retry_after))
+            body = json.dumps(
+                {"detail": f"Trop de requêtes, réessayez dans {wait} seconde(s)"}, ensure_ascii=False
+            ).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": headers + [
+                    (b"retry-after", str(wait).encode()),
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,319 @@
+"""Recommandations item-à-item.
+
+Le calcul hors ligne construit la matrice creuse utilisateurs × morceaux
+(écoutes pondérées par la durée écoutée, favoris, achats), puis garde pour
+chaque morceau ses K voisins les plus proches (similarité cosinus) dans la
+table track_similarities. Les recommandations d'un client combinent son
+historique récent avec cette table, chargée en mémoire.
+
+Calcul manuel : python recommendations.py [--top-k 30]
+"""
+from sqlmodel import Session, select, delete, desc, func, literal, union_all
+from sqlalchemy import insert, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import selectinload
+from database import engine
+from models import Music, MusicStatus, PlayHistory, Favorite, Purchase, PaymentStatus, TrackSimilarity, JobLease
+from cache import catalog_cache
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import heapq
+import math
+import os
+import struct
+import threading
+import time
+import uuid
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # Dépendances optionnelles (calcul vectorisé)
+    np = None
+    sparse = None
+
+# Configuration
+RECOMMENDATION_TOP_K = int(os.getenv("RECOMMENDATION_TOP_K", "30"))
+RECOMMENDATION_REFRESH_SECONDS = int(os.getenv("RECOMMENDATION_REFRESH_SECONDS", str(6 * 3600)))
+RECOMMENDATION_LEASE_SECONDS = int(os.getenv("RECOMMENDATION_LEASE_SECONDS", "3600"))  # Durée max d'un calcul
+FULL_LISTEN_SECONDS = 240     # Au-delà, une écoute ne compte pas davantage
+SKIP_WEIGHT = 0.2             # Poids d'une écoute interrompue immédiatement
+FAVORITE_WEIGHT = 3.0
+PURCHASE_WEIGHT = 5.0
+MAX_ITEMS_PER_USER = 50       # Calcul pur Python : morceaux les plus forts de chaque utilisateur
+RECENT_PLAYS = 50             # Historique récent utilisé pour un client
+RECENCY_DECAY = 0.95          # Poids de la n-ième écoute la plus récente : RECENCY_DECAY ** n
+POPULAR_POOL_SIZE = 200
+
+# Interaction agrégée : (utilisateur, morceau, poids)
+Interaction = Tuple[int, int, float]
+Neighbors = Tuple[Tuple[int, ...], Tuple[float, ...]]
+
+# ===== MATRICE D'INTERACTIONS =====
+
+def load_interactions(session: Session) -> Iterator[Interaction]:
+    """Interactions agrégées par (utilisateur, morceau), triées par utilisateur.
+
+    L'agrégation est faite par SQLite : seul un triplet par paire remonte en Python.
+    Le poids cumulé est amorti (log1p) pour qu'une écoute en boucle ne domine pas.
+    """
+    plays = select(
+        PlayHistory.user_id.label("user_id"),
+        PlayHistory.music_id.label("music_id"),
+        (SKIP_WEIGHT + func.min(PlayHistory.duration_played, FULL_LISTEN_SECONDS) / float(FULL_LISTEN_SECONDS)).label("weight")
+    )
+    favorites = select(Favorite.user_id, Favorite.music_id, literal(FAVORITE_WEIGHT))
+    purchases = select(Purchase.client_id, Purchase.music_id, literal(PURCHASE_WEIGHT)).where(
+        Purchase.status == PaymentStatus.COMPLETED
+    )
+    events = union_all(plays, favorites, purchases).subquery()
+    statement = (
+        select(events.c.user_id, events.c.music_id, func.sum(events.c.weight))
+        .group_by(events.c.user_id, events.c.music_id)
+        .order_by(events.c.user_id)
+    )
+    for user_id, music_id, weight in session.exec(statement).yield_per(10000):
+        yield user_id, music_id, math.log1p(weight)
+
+def similar_tracks_python(interactions: Iterable[Interaction], top_k: int) -> Iterator[Tuple[int, List[int], List[float]]]:
+    """Voisins cosinus sans dépendance : index inversé morceau -> utilisateurs.
+
+    Chaque utilisateur est réduit à ses MAX_ITEMS_PER_USER morceaux les plus forts,
+    ce qui borne le coût à O(utilisateurs × MAX_ITEMS_PER_USER²).
+    """
+    user_items: List[List[Tuple[int, float]]] = []
+    track_users: Dict[int, List[Tuple[int, float]]] = defaultdict(list)
+    norms: Dict[int, float] = defaultdict(float)
+
+    for _, rows in groupby(interactions, key=lambda row: row[0]):
+        items = heapq.nlargest(MAX_ITEMS_PER_USER, ((music_id, weight) for _, music_id, weight in rows), key=lambda item: item[1])
+        user_index = len(user_items)
+        user_items.append(items)
+        for music_id, weight in items:
+            track_users[music_id].append((user_index, weight))
+            norms[music_id] += weight * weight
+
+    for music_id, users in track_users.items():
+        scores: Dict[int, float] = defaultdict(float)
+        for user_index, weight in users:
+            for other_id, other_weight in user_items[user_index]:
+                scores[other_id] += weight * other_weight
+        scores.pop(music_id, None)
+        if not scores:
+            continue
+        norm = math.sqrt(norms[music_id])
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        yield (
+            music_id,
+            [other_id for other_id, _ in best],
+            [dot / (norm * math.sqrt(norms[other_id])) for other_id, dot in best]
+        )
+
+def similar_tracks_sparse(interactions: Iterable[Interaction], top_k: int, block_size: int = 2048) -> Iterator[Tuple[int, List[int], List[float]]]:
+    """Voisins cosinus avec NumPy / SciPy : Xᵀ·X calculé par blocs de morceaux"""
+    users, tracks, weights = [], [], []
+    for user_id, music_id, weight in interactions:
+        users.append(user_id)
+        tracks.append(music_id)
+        weights.append(weight)
+    if not weights:
+        return
+
+    user_ids, user_index = np.unique(np.asarray(users, dtype=np.int64), return_inverse=True)
+    track_ids, track_index = np.unique(np.asarray(tracks, dtype=np.int64), return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.asarray(weights, dtype=np.float32), (user_index, track_index)),
+        shape=(len(user_ids), len(track_ids))
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = (matrix @ sparse.diags(1.0 / norms)).tocsc()
+    transposed = normalized.T.tocsr()
+
+    for start in range(0, len(track_ids), block_size):
+        block = (transposed[start:start + block_size] @ normalized).tocsr()
+        for row in range(block.shape[0]):
+            track = start + row
+            columns = block.indices[block.indptr[row]:block.indptr[row + 1]]
+            values = block.data[block.indptr[row]:block.indptr[row + 1]]
+            keep = columns != track
+            columns, values = columns[keep], values[keep]
+            if len(values) == 0:
+                continue
+            if len(values) > top_k:
+                best = np.argpartition(-values, top_k)[:top_k]
+                columns, values = columns[best], values[best]
+            order = np.argsort(-values)
+            yield int(track_ids[track]), track_ids[columns[order]].tolist(), values[order].tolist()
+
+# ===== STOCKAGE =====
+
+def pack_neighbors(music_ids: List[int], scores: List[float]) -> bytes:
+    count = len(music_ids)
+    return struct.pack(f"<{count}i{count}f", *music_ids, *scores)
+
+def unpack_neighbors(blob: bytes) -> Neighbors:
+    count = len(blob) // 8
+    values = struct.unpack(f"<{count}i{count}f", blob)
+    return values[:count], values[count:]
+
+def build_similarities(top_k: int = RECOMMENDATION_TOP_K) -> Dict[str, float]:
+    """Recalculer la table track_similarities (remplacée en une transaction)"""
+    started = time.perf_counter()
+    computed_at = datetime.utcnow()
+    with Session(engine) as session:
+        interactions = load_interactions(session)
+        compute = similar_tracks_sparse if sparse is not None else similar_tracks_python
+        rows = [
+            {"music_id": music_id, "neighbors": pack_neighbors(neighbors, scores), "computed_at": computed_at}
+            for music_id, neighbors, scores in compute(interactions, top_k)
+        ]
+        session.exec(delete(TrackSimilarity))
+        if rows:
+            session.execute(insert(TrackSimilarity), rows)
+        session.commit()
+    return {"tracks": len(rows), "seconds": round(time.perf_counter() - started, 2)}
+
+class SimilarityIndex:
+    """Table des voisins en mémoire : blobs compacts décodés à la demande"""
+
+    def __init__(self):
+        self._neighbors: Dict[int, bytes] = {}
+        self.computed_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        with Session(engine) as session:
+            rows = session.exec(select(TrackSimilarity.music_id, TrackSimilarity.neighbors, TrackSimilarity.computed_at)).all()
+        neighbors = {music_id: blob for music_id, blob, _ in rows}
+        with self._lock:
+            self._neighbors = neighbors
+            self.computed_at = max((computed_at for _, _, computed_at in rows), default=None)
+        return len(neighbors)
+
+    def get(self, music_id: int) -> Optional[Neighbors]:
+        blob = self._neighbors.get(music_id)
+        return unpack_neighbors(blob) if blob else None
+
+    def __len__(self) -> int:
+        return len(self._neighbors)
+
+similarity_index = SimilarityIndex()
+
+# Identifiant de ce worker (détenteur des baux)
+WORKER_ID = uuid.uuid4().hex
+
+def claim_lease(name: str, seconds: int, owner: str = WORKER_ID) -> bool:
+    """Prendre le bail `name` s'il est libre ou expiré (un seul worker réussit)"""
+    now = datetime.utcnow()
+    statement = sqlite_insert(JobLease).values(name=name, owner=owner, expires_at=now + timedelta(seconds=seconds))
+    statement = statement.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"owner": statement.excluded.owner, "expires_at": statement.excluded.expires_at},
+        where=JobLease.expires_at <= now
+    )
+    with Session(engine) as session:
+        claimed = session.execute(statement).rowcount == 1
+        session.commit()
+    return claimed
+
+def release_lease(name: str, owner: str = WORKER_ID) -> None:
+    with Session(engine) as session:
+        session.execute(
+            update(JobLease).where(JobLease.name == name, JobLease.owner == owner).values(expires_at=datetime.utcnow())
+        )
+        session.commit()
+
+def latest_similarities() -> Optional[datetime]:
+    with Session(engine) as session:
+        return session.exec(select(func.max(TrackSimilarity.computed_at))).one()
+
+def is_stale(latest: Optional[datetime], max_age_seconds: int) -> bool:
+    return latest is None or (datetime.utcnow() - latest).total_seconds() >= max_age_seconds
+
+def refresh_recommendations(max_age_seconds: int = RECOMMENDATION_REFRESH_SECONDS) -> Dict[str, float]:
+    """Recalculer la table si elle est trop ancienne, sinon recharger la version d'un autre worker.
+
+    Un seul worker recalcule (bail "recommendations") ; les autres rechargent
+    la table une fois le calcul terminé.
+    """
+    latest = latest_similarities()
+    if is_stale(latest, max_age_seconds) and claim_lease("recommendations", RECOMMENDATION_LEASE_SECONDS):
+        try:
+            # Un autre worker a pu terminer le calcul juste avant la prise du bail
+            latest = latest_similarities()
+            if is_stale(latest, max_age_seconds):
+                result = build_similarities()
+                result["loaded"] = similarity_index.load()
+                return result
+        finally:
+            release_lease("recommendations")
+    if latest is not None and (similarity_index.computed_at is None or latest > similarity_index.computed_at):
+        return {"loaded": similarity_index.load()}
+    return {}
+
+# ===== RECOMMANDATIONS =====
+
+def user_seeds(session: Session, user_id: int) -> Dict[int, float]:
+    """Morceaux récemment écoutés, favoris et achetés, pondérés"""
+    seeds: Dict[int, float] = defaultdict(float)
+    recent_plays = session.exec(
+        select(PlayHistory.music_id, PlayHistory.duration_played)
+        .where(PlayHistory.user_id == user_id)
+        .order_by(desc(PlayHistory.played_at))
+        .limit(RECENT_PLAYS)
+    ).all()
+    for position, (music_id, duration_played) in enumerate(recent_plays):
+        listened = SKIP_WEIGHT + min(duration_played or 0, FULL_LISTEN_SECONDS) / FULL_LISTEN_SECONDS
+        seeds[music_id] += listened * RECENCY_DECAY ** position
+
+    for music_id in session.exec(select(Favorite.music_id).where(Favorite.user_id == user_id)).all():
+        seeds[music_id] += FAVORITE_WEIGHT
+    for music_id in session.exec(
+        select(Purchase.music_id).where(Purchase.client_id == user_id, Purchase.status == PaymentStatus.COMPLETED)
+    ).all():
+        seeds[music_id] += PURCHASE_WEIGHT
+    return seeds
+
+def popular_track_ids(session: Session) -> List[int]:
+    """Morceaux publiés les plus écoutés (repli pour les nouveaux clients), mis en cache"""
+    def load():
+        return list(session.exec(
+            select(Music.id).where(Music.status == MusicStatus.PUBLISHED)
+            .order_by(desc(Music.play_count)).limit(POPULAR_POOL_SIZE)
+        ).all())
+    return catalog_cache.get_or_load("popular", {"limit": POPULAR_POOL_SIZE}, load)
+
+def recommend_for_user(session: Session, user_id: int, limit: int, index: SimilarityIndex = similarity_index) -> List[Music]:
+    """Morceaux publiés recommandés, du plus au moins pertinent"""
+    seeds = user_seeds(session, user_id)
+    scores: Dict[int, float] = defaultdict(float)
+    for music_id, weight in seeds.items():
+        neighbors = index.get(music_id)
+        if neighbors is None:
+            continue
+        for other_id, similarity in zip(*neighbors):
+            if other_id not in seeds:
+                scores[other_id] += weight * similarity
+
+    # Marge pour les morceaux non publiés, complétée par les plus populaires
+    candidates = [music_id for music_id, _ in heapq.nlargest(limit * 2, scores.items(), key=lambda item: item[1])]
+    candidates += [music_id for music_id in popular_track_ids(session) if music_id not in seeds and music_id not in scores]
+    candidates = candidates[:limit * 3]
+
+    musics = session.exec(
+        select(Music)
+        .where(Music.id.in_(candidates), Music.status == MusicStatus.PUBLISHED)
+        .options(selectinload(Music.artist))
+    ).all()
+    rank = {music_id: position for position, music_id in enumerate(candidates)}
+    return sorted(musics, key=lambda music: rank[music.id])[:limit]
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Recalculer la table des morceaux similaires")
+    parser.add_argument("--top-k", type=int, default=RECOMMENDATION_TOP_K)
+    args = parser.parse_args()
+    print(f"✅ Similarités calculées : {build_similarities(args.top_k)}")
@@ -1,41 +1,39 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from models import (
     User, UserReade, UserUpdate, Music, MusicStatus, UserRole, 
-    Purchase, PaymentCode, Favorite, PlayHistory, PaymentStatus
+    Purchase, PaymentCode, Favorite, PlayHistory, PaymentStatus,
+    MusicFullRead, PaymentCodeRead, Genre, GenreAlias, DailySales, SalesSeries
 )
 from sqlmodel import Session, select, func, desc, and_, or_
+from sqlalchemy import Integer, cast
+from sqlalchemy.orm import selectinload
 from typing import List, Dict, Optional
 from database import get_session
 from routers.auth import get_current_admin, get_current_user
+from cache import catalog_cache, InProcessBackend
+from genres import genre_filter, genre_key, resolve_genre, add_alias
+from suggest import suggest_index
+from monitoring import upload_usage
+from file_cache import file_cache
+from serialization import JSONBytesResponse, Projection, json_list_response
+from profiling import profile_store
+from fastapi.responses import PlainTextResponse
 from decimal import Decimal
-from datetime import datetime, timedelta
+from money import from_cents
+from sales import rebuild_daily_sales, sales_range, sales_series
+from datetime import date, datetime, timedelta, timezone
 import os
 
 admin_router = APIRouter(tags=["Administration"])
 
+# Colonnes des listes (sans entités ORM)
+USER_READ = Projection(UserReade, User)
+MUSIC_FULL_READ = Projection(MusicFullRead, Music, artist=Projection(UserReade, User, prefix="artist_"))
+
 # ===== MODÈLES POUR LES RÉPONSES ADMIN =====
 
 from sqlmodel import SQLModel
 
-class MusicRead(SQLModel):
-    id: int
-    title: str
-    description: Optional[str] = None
-    genre: Optional[str] = None
-    duration: Optional[int] = None
-    file_path: str
-    cover_image_path: Optional[str] = None
-    is_free: bool
-    price: Decimal
-    status: MusicStatus
-    play_count: int
-    download_count: int
-    artist_id: int
-    created_at: datetime
-    updated_at: Optional[datetime] = None
-    # Relations
-    artist: Optional[UserReade] = None
-
 class AdminStats(SQLModel):
     total_users: int
     total_artists: int
@@ -61,45 +59,17 @@ class UserStats(SQLModel):
     revenue: Decimal
 
 class MusicStats(SQLModel):
-    music: MusicRead
+    music: MusicFullRead
     purchase_count: int
     revenue: Decimal
     favorite_count: int
     play_count: int
 
-# ===== FONCTIONS UTILITAIRES =====
+class GenreAliasCreate(SQLModel):
+    alias: str
+    genre: str
 
-def convert_music_to_read(music: Music, artist: Optional[User] = None) -> MusicRead:
-    """Convertir un objet Music en MusicRead"""
-    artist_data = None
-    if artist:
-        artist_data = UserReade(
-            id=artist.id,
-            email=artist.email,
-            username=artist.username,
-            full_name=artist.full_name or "",
-            role=artist.role.value,
-            is_active=artist.is_active
-        )
-    
-    return MusicRead(
-        id=music.id,
-        title=music.title,
-        description=music.description,
-        genre=music.genre,
-        duration=music.duration,
-        file_path=music.file_path,
-        cover_image_path=music.cover_image_path,
-        is_free=music.is_free,
-        price=music.price,
-        status=music.status,
-        play_count=music.play_count,
-        download_count=music.download_count,
-        artist_id=music.artist_id,
-        created_at=music.created_at,
-        updated_at=music.updated_at,
-        artist=artist_data
-    )
+# ===== FONCTIONS UTILITAIRES =====
 
 def calculate_admin_stats(session: Session) -> AdminStats:
     """Calculer les statistiques globales de la plateforme"""
@@ -133,14 +103,14 @@ def calculate_admin_stats(session: Session) -> AdminStats:
     purchases_result = session.exec(
         select(
             func.count(Purchase.id).label('total_purchases'),
-            func.sum(Purchase.amount_paid).label('total_revenue')
+            func.sum(Purchase.amount_paid_cents).label('total_revenue')
         ).where(Purchase.status == PaymentStatus.COMPLETED)
     ).first()
     
     total_purchases = purchases_result.total_purchases if purchases_result and purchases_result.total_purchases else 0
-    total_revenue = purchases_result.total_revenue if purchases_result and purchases_result.total_revenue else Decimal('0.00')
+    total_revenue = from_cents(purchases_result.total_revenue if purchases_result else 0)
     
-    # Statistiques codes de paiement
+    # Statistiques codes de paiement (index sur is_used, expires_at)
     total_payment_codes = session.exec(select(func.count(PaymentCode.id))).one() or 0
     active_payment_codes = session.exec(
         select(func.count(PaymentCode.id)).where(
@@ -151,7 +121,12 @@ def calculate_admin_stats(session: Session) -> AdminStats:
         )
     ).one() or 0
     expired_payment_codes = session.exec(
-        select(func.count(PaymentCode.id)).where(PaymentCode.expires_at <= datetime.utcnow())
+        select(func.count(PaymentCode.id)).where(
+            and_(
+                PaymentCode.is_used == False,
+                PaymentCode.expires_at <= datetime.utcnow()
+            )
+        )
     ).one() or 0
     
     return AdminStats(
@@ -184,7 +159,7 @@ def get_all_users(
     user: User = Depends(get_current_admin)
 ):
     """Obtenir tous les utilisateurs avec filtres"""
-    statement = select(User)
+    statement = select(*USER_READ.columns)
     
     # Appliquer les filtres
     if role:
@@ -203,16 +178,9 @@ def get_all_users(
         )
     
     statement = statement.offset(skip).limit(limit).order_by(desc(User.created_at))
-    users = session.exec(statement).all()
+    rows = session.exec(statement).all()
     
-    return [UserReade(
-        id=u.id,
-        email=u.email,
-        username=u.username,
-        full_name=u.full_name or "",
-        role=u.role.value,
-        is_active=u.is_active
-    ) for u in users]
+    return JSONBytesResponse(USER_READ.dump(UserReade, rows))
 
 @admin_router.get("/users/artists", response_model=List[UserReade])
 def get_all_artists(
@@ -223,14 +191,7 @@ def get_all_artists(
     statement = select(User).where(User.role == UserRole.ARTISTE).order_by(desc(User.created_at))
     artists = session.exec(statement).all()
     
-    return [UserReade(
-        id=a.id,
-        email=a.email,
-        username=a.username,
-        full_name=a.full_name or "",
-        role=a.role.value,
-        is_active=a.is_active
-    ) for a in artists]
+    return json_list_response(UserReade, artists)
 
 @admin_router.get("/users/clients", response_model=List[UserReade])
 def get_all_clients(
@@ -241,14 +202,7 @@ def get_all_clients(
     statement = select(User).where(User.role == UserRole.CLIENT).order_by(desc(User.created_at))
     clients = session.exec(statement).all()
     
-    return [UserReade(
-        id=c.id,
-        email=c.email,
-        username=c.username,
-        full_name=c.full_name or "",
-        role=c.role.value,
-        is_active=c.is_active
-    ) for c in clients]
+    return json_list_response(UserReade, clients)
 
 @admin_router.get("/users/{user_id}", response_model=UserReade)
 def get_user_by_id(
@@ -261,14 +215,7 @@ def get_user_by_id(
     if not target_user:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
     
-    return UserReade(
-        id=target_user.id,
-        email=target_user.email,
-        username=target_user.username,
-        full_name=target_user.full_name or "",
-        role=target_user.role.value,
-        is_active=target_user.is_active
-    )
+    return UserReade.model_validate(target_user)
 
 @admin_router.put("/users/{user_id}", response_model=UserReade)
 def update_user(
@@ -291,15 +238,11 @@ def update_user(
     session.add(target_user)
     session.commit()
     session.refresh(target_user)
+    suggest_index.index_artist(target_user)
+    # Le nom de l'artiste figure dans les pages du catalogue mises en cache
+    catalog_cache.bump_version()
     
-    return UserReade(
-        id=target_user.id,
-        email=target_user.email,
-        username=target_user.username,
-        full_name=target_user.full_name or "",
-        role=target_user.role.value,
-        is_active=target_user.is_active
-    )
+    return UserReade.model_validate(target_user)
 
 @admin_router.post("/users/{user_id}/activate")
 def activate_user(
@@ -371,7 +314,7 @@ def delete_user(
 
 # ===== ROUTES GESTION DES MUSIQUES =====
 
-@admin_router.get("/musics", response_model=List[MusicRead])
+@admin_router.get("/musics", response_model=List[MusicFullRead])
 def get_all_musics(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, le=500),
@@ -383,7 +326,7 @@ def get_all_musics(
     user: User = Depends(get_current_admin)
 ):
     """Obtenir toutes les musiques avec filtres"""
-    statement = select(Music)
+    statement = select(*MUSIC_FULL_READ.columns).join(User, User.id == Music.artist_id)
     
     # Appliquer les filtres
     if status:
@@ -393,23 +336,17 @@ def get_all_musics(
         statement = statement.where(Music.artist_id == artist_id)
     
     if genre:
-        statement = statement.where(Music.genre.ilike(f"%{genre}%"))
+        statement = statement.where(genre_filter(session, genre))
     
     if is_free is not None:
         statement = statement.where(Music.is_free == is_free)
     
     statement = statement.offset(skip).limit(limit).order_by(desc(Music.created_at))
-    musics = session.exec(statement).all()
-    
-    # Charger les artistes
-    result = []
-    for music in musics:
-        artist = session.get(User, music.artist_id)
-        result.append(convert_music_to_read(music, artist))
+    rows = session.exec(statement).all()
     
-    return result
+    return JSONBytesResponse(MUSIC_FULL_READ.dump(MusicFullRead, rows))
 
-@admin_router.get("/musics/{music_id}", response_model=MusicRead)
+@admin_router.get("/musics/{music_id}", response_model=MusicFullRead)
 def get_music_details(
     music_id: int,
     session: Session = Depends(get_session),
@@ -420,8 +357,7 @@ def get_music_details(
     if not music:
         raise HTTPException(status_code=404, detail="Musique non trouvée")
     
-    artist = session.get(User, music.artist_id)
-    return convert_music_to_read(music, artist)
+    return MusicFullRead.model_validate(music)
 
 @admin_router.put("/musics/{music_id}/status")
 def update_music_status(
@@ -439,6 +375,8 @@ def update_music_status(
     music.status = new_status
     session.add(music)
     session.commit()
+    catalog_cache.bump_version()
+    suggest_index.index_music(music)
     
     return {
         "message": f"Statut de la musique '{music.title}' changé de {old_status.value} à {new_status.value}"
@@ -457,17 +395,57 @@ def delete_music(
     
     # Supprimer les fichiers physiques
     if os.path.exists(music.file_path):
+        upload_usage.file_removed(music.file_path)
+        file_cache.invalidate(music.file_path)
         os.remove(music.file_path)
     
     if music.cover_image_path and os.path.exists(music.cover_image_path):
+        upload_usage.file_removed(music.cover_image_path)
         os.remove(music.cover_image_path)
     
     title = music.title
     session.delete(music)
     session.commit()
+    catalog_cache.bump_version()
+    suggest_index.remove_music(music_id)
     
     return {"message": f"Musique '{title}' supprimée avec succès"}
 
+# ===== ROUTES GENRES =====
+
+@admin_router.get("/genres")
+def get_genres(
+    session: Session = Depends(get_session),
+    user: User = Depends(get_current_admin)
+):
+    """Lister les genres normalisés et leurs alias"""
+    aliases: Dict[int, List[str]] = {}
+    for alias, genre_id in session.exec(select(GenreAlias.alias, GenreAlias.genre_id)).all():
+        aliases.setdefault(genre_id, []).append(alias)
+    
+    genres = session.exec(select(Genre).order_by(Genre.name)).all()
+    return [
+        {"id": genre.id, "name": genre.name, "aliases": sorted(aliases.get(genre.id, []))}
+        for genre in genres
+    ]
+
+@admin_router.post("/genres/aliases")
+def create_genre_alias(
+    alias_data: GenreAliasCreate,
+    session: Session = Depends(get_session),
+    user: User = Depends(get_current_admin)
+):
+    """Déclarer un alias de genre (un genre existant sous ce nom est fusionné dans la cible)"""
+    if not genre_key(alias_data.alias) or not genre_key(alias_data.genre):
+        raise HTTPException(status_code=400, detail="Nom de genre invalide")
+    
+    genre = resolve_genre(session, alias_data.genre)
+    add_alias(session, alias_data.alias, genre)
+    session.commit()
+    catalog_cache.bump_version()
+    
+    return {"message": f"'{alias_data.alias}' est désormais un alias de '{genre.name}'"}
+
 # ===== ROUTES STATISTIQUES ET MONITORING =====
 
 @admin_router.get("/statistics", response_model=AdminStats)
@@ -478,6 +456,21 @@ def get_platform_statistics(
     """Obtenir les statistiques globales de la plateforme"""
     return calculate_admin_stats(session)
 
+def totals_by(session: Session, key, aggregate, ids: List[int], *joined) -> Dict[int, int]:
+    """Agrégat par valeur de `key` pour une page d'ids, en une requête GROUP BY.
+
+    `joined` : tables à joindre (la première sert de FROM), ex. (Purchase, Music)
+    pour les revenus par artiste.
+    """
+    if not ids:
+        return {}
+    statement = select(key, aggregate)
+    if joined:
+        statement = statement.select_from(joined[0])
+        for table in joined[1:]:
+            statement = statement.join(table)
+    return dict(session.exec(statement.where(key.in_(ids)).group_by(key)).all())
+
 @admin_router.get("/statistics/users", response_model=List[UserStats])
 def get_users_statistics(
     limit: int = Query(20, le=100),
@@ -488,50 +481,26 @@ def get_users_statistics(
     statement = select(User).limit(limit)
     users = session.exec(statement).all()
     
+    # Une requête groupée par indicateur pour toute la page (pas de requête par utilisateur)
+    user_ids = [target_user.id for target_user in users]
+    music_counts = totals_by(session, Music.artist_id, func.count(Music.id), user_ids)
+    purchase_counts = totals_by(session, Purchase.client_id, func.count(Purchase.id), user_ids)
+    revenues = totals_by(session, Music.artist_id, func.sum(Purchase.amount_paid_cents), user_ids, Purchase, Music)
+    favorite_counts = totals_by(session, Favorite.user_id, func.count(Favorite.id), user_ids)
+    play_counts = totals_by(session, PlayHistory.user_id, func.count(PlayHistory.id), user_ids)
+    
     result = []
     for target_user in users:
-        # Compter les musiques (pour les artistes)
-        music_count = 0
-        if target_user.role == UserRole.ARTISTE:
-            music_count = session.exec(
-                select(func.count(Music.id)).where(Music.artist_id == target_user.id)
-            ).one() or 0
-        
-        # Compter les achats (pour les clients)
-        purchase_count = 0
-        revenue = Decimal('0.00')
-        if target_user.role == UserRole.CLIENT:
-            purchase_count = session.exec(
-                select(func.count(Purchase.id)).where(Purchase.client_id == target_user.id)
-            ).one() or 0
-        elif target_user.role == UserRole.ARTISTE:
-            revenue_result = session.exec(
-                select(func.sum(Purchase.amount_paid))
-                .select_from(Purchase)
-                .join(Music)
-                .where(Music.artist_id == target_user.id)
-            ).one() or Decimal('0.00')
-            revenue = revenue_result if revenue_result else Decimal('0.00')
-        
-        # Compter les favoris
-        favorite_count = session.exec(
-            select(func.count(Favorite.id)).where(Favorite.user_id == target_user.id)
-        ).one() or 0
-        
-        # Compter les écoutes
-        play_count = session.exec(
-            select(func.count(PlayHistory.id)).where(PlayHistory.user_id == target_user.id)
-        ).one() or 0
+        # Musiques et revenus pour les artistes, achats pour les clients
+        is_artist = target_user.role == UserRole.ARTISTE
+        music_count = music_counts.get(target_user.id, 0) if is_artist else 0
+        revenue = from_cents(revenues.get(target_user.id)) if is_artist else Decimal('0.00')
+        purchase_count = purchase_counts.get(target_user.id, 0) if target_user.role == UserRole.CLIENT else 0
+        favorite_count = favorite_counts.get(target_user.id, 0)
+        play_count = play_counts.get(target_user.id, 0)
         
         result.append(UserStats(
-            user=UserReade(
-                id=target_user.id,
-                email=target_user.email,
-                username=target_user.username,
-                full_name=target_user.full_name or "",
-                role=target_user.role.value,
-                is_active=target_user.is_active
-            ),
+            user=UserReade.model_validate(target_user),
             music_count=music_count,
             purchase_count=purchase_count,
             favorite_count=favorite_count,
@@ -541,6 +510,38 @@ def get_users_statistics(
     
     return result
 
+@admin_router.get("/statistics/sales", response_model=SalesSeries)
+def get_sales_statistics(
+    start: Optional[date] = Query(None, description="Premier jour (défaut : il y a 30 jours)"),
+    end: Optional[date] = Query(None, description="Dernier jour inclus (défaut : aujourd'hui)"),
+    granularity: str = Query("day", description="day, week ou month"),
+    artist_id: Optional[int] = Query(None, description="Filtrer par artiste"),
+    music_id: Optional[int] = Query(None, description="Filtrer par musique"),
+    session: Session = Depends(get_session),
+    user: User = Depends(get_current_admin)
+):
+    """Ventes et revenus de la plateforme par jour, semaine ou mois (cumuls journaliers)"""
+    try:
+        start, end = sales_range(start, end, granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    conditions = []
+    if artist_id:
+        conditions.append(DailySales.artist_id == artist_id)
+    if music_id:
+        conditions.append(DailySales.music_id == music_id)
+    return sales_series(session, start, end, granularity, conditions)
+
+@admin_router.post("/statistics/sales/rebuild")
+def rebuild_sales_statistics(
+    session: Session = Depends(get_session),
+    user: User = Depends(get_current_admin)
+):
+    """Recalculer les cumuls de ventes journaliers depuis les achats"""
+    rows = rebuild_daily_sales(session)
+    return {"message": "Cumuls de ventes recalculés", "rows": rows}
+
 @admin_router.get("/statistics/musics", response_model=List[MusicStats])
 def get_musics_statistics(
     limit: int = Query(20, le=100),
@@ -548,40 +549,31 @@ def get_musics_statistics(
     user: User = Depends(get_current_admin)
 ):
     """Obtenir les statistiques des musiques les plus populaires"""
-    statement = select(Music).order_by(desc(Music.play_count)).limit(limit)
+    statement = select(Music).options(selectinload(Music.artist)).order_by(desc(Music.play_count)).limit(limit)
     musics = session.exec(statement).all()
     
+    music_ids = [music.id for music in musics]
+    purchase_counts = totals_by(session, Purchase.music_id, func.count(Purchase.id), music_ids)
+    revenues = totals_by(session, Purchase.music_id, func.sum(Purchase.amount_paid_cents), music_ids)
+    favorite_counts = totals_by(session, Favorite.music_id, func.count(Favorite.id), music_ids)
+    
     result = []
     for music in musics:
-        # Compter les achats
-        purchase_count = session.exec(
-            select(func.count(Purchase.id)).where(Purchase.music_id == music.id)
-        ).one() or 0
-        
-        # Calculer les revenus
-        revenue = session.exec(
-            select(func.sum(Purchase.amount_paid)).where(Purchase.music_id == music.id)
-        ).one() or Decimal('0.00')
-        
-        # Compter les favoris
-        favorite_count = session.exec(
-            select(func.count(Favorite.id)).where(Favorite.music_id == music.id)
-        ).one() or 0
-        
-        # Charger l'artiste
-        artist = session.get(User, music.artist_id)
+        purchase_count = purchase_counts.get(music.id, 0)
+        revenue = from_cents(revenues.get(music.id))
+        favorite_count = favorite_counts.get(music.id, 0)
         
         result.append(MusicStats(
-            music=convert_music_to_read(music, artist),
+            music=MusicFullRead.model_validate(music),
             purchase_count=purchase_count,
-            revenue=revenue if revenue else Decimal('0.00'),
+            revenue=revenue,
             favorite_count=favorite_count,
             play_count=music.play_count
         ))
     
     return result
 
-@admin_router.get("/payment-codes")
+@admin_router.get("/payment-codes", response_model=List[PaymentCodeRead])
 def get_payment_codes(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, le=500),
@@ -597,60 +589,102 @@ def get_payment_codes(
         statement = statement.where(PaymentCode.is_used == is_used)
     
     if expired is not None:
+        # Un code utilisé n'est jamais considéré comme expiré
         if expired:
-            statement = statement.where(PaymentCode.expires_at <= datetime.utcnow())
+            statement = statement.where(
+                and_(PaymentCode.is_used == False, PaymentCode.expires_at <= datetime.utcnow())
+            )
         else:
-            statement = statement.where(PaymentCode.expires_at > datetime.utcnow())
+            statement = statement.where(
+                or_(PaymentCode.is_used == True, PaymentCode.expires_at > datetime.utcnow())
+            )
     
     statement = statement.offset(skip).limit(limit).order_by(desc(PaymentCode.created_at))
     codes = session.exec(statement).all()
     
-    return codes
+    return json_list_response(PaymentCodeRead, codes)
+
+# Activité récente : comptages sur les index de date, mis en cache brièvement
+ACTIVITY_CACHE_SECONDS = 30
+activity_cache = InProcessBackend(max_entries=32)
+
+def count_since(session: Session, column, since: datetime) -> int:
+    """COUNT sur un intervalle de l'index de date (aucune ligne chargée)"""
+    return session.exec(select(func.count()).where(column >= since)).one()
+
+def activity_series(session: Session, column, start: datetime, bucket_seconds: int, buckets: int) -> List[int]:
+    """Nombre d'événements par tranche de `bucket_seconds` depuis `start` (tranches vides comprises)"""
+    origin = int(start.replace(tzinfo=timezone.utc).timestamp()) // bucket_seconds
+    bucket = (cast(func.strftime("%s", column), Integer) // bucket_seconds).label("bucket")
+    rows = session.exec(
+        select(bucket, func.count()).where(column >= start).group_by(bucket)
+    ).all()
+    series = [0] * buckets
+    for index, count in rows:
+        if 0 <= index - origin < buckets:
+            series[index - origin] = count
+    return series
 
 @admin_router.get("/recent-activity")
 def get_recent_activity(
-    limit: int = Query(50, le=200),
+    days: int = Query(7, ge=1, le=90, description="Fenêtre en jours"),
     session: Session = Depends(get_session),
     user: User = Depends(get_current_admin)
 ):
-    """Obtenir l'activité récente de la plateforme"""
-    
-    # Nouveaux utilisateurs
-    new_users = session.exec(
-        select(User)
-        .where(User.created_at >= datetime.utcnow() - timedelta(days=7))
-        .order_by(desc(User.created_at))
-        .limit(limit // 4)
-    ).all()
-    
-    # Nouvelles musiques
-    new_musics = session.exec(
-        select(Music)
-        .where(Music.created_at >= datetime.utcnow() - timedelta(days=7))
-        .order_by(desc(Music.created_at))
-        .limit(limit // 4)
-    ).all()
-    
-    # Achats récents
-    recent_purchases = session.exec(
-        select(Purchase)
-        .where(Purchase.purchased_at >= datetime.utcnow() - timedelta(days=7))
-        .order_by(desc(Purchase.purchased_at))
-        .limit(limit // 4)
-    ).all()
-    
-    # Écoutes récentes
-    recent_plays = session.exec(
-        select(PlayHistory)
-        .where(PlayHistory.played_at >= datetime.utcnow() - timedelta(days=1))
-        .order_by(desc(PlayHistory.played_at))
-        .limit(limit // 4)
-    ).all()
-    
-    return {
-        "new_users": len(new_users),
-        "new_musics": len(new_musics),
-        "recent_purchases": len(recent_purchases),
-        "recent_plays": len(recent_plays),
-        "period": "7 derniers jours"
-    }
\ No newline at end of file
+    """Obtenir l'activité récente de la plateforme, avec une série temporelle par type"""
+    cache_key = f"recent-activity:{days}"
+    cached = activity_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    now = datetime.utcnow()
+    since = now - timedelta(days=days)
+    # Tranches horaires jusqu'à 7 jours, journalières au-delà
+    bucket_seconds = 3600 if days <= 7 else 86400
+    buckets = days * 86400 // bucket_seconds
+    current = int(now.replace(tzinfo=timezone.utc).timestamp()) // bucket_seconds
+    start = datetime.utcfromtimestamp((current - buckets + 1) * bucket_seconds)
+    
+    columns = {
+        "new_users": User.created_at,
+        "new_musics": Music.created_at,
+        "purchases": Purchase.purchased_at,
+        "plays": PlayHistory.played_at,
+    }
+    result = {
+        "new_users": count_since(session, User.created_at, since),
+        "new_musics": count_since(session, Music.created_at, since),
+        "recent_purchases": count_since(session, Purchase.purchased_at, since),
+        "recent_plays": count_since(session, PlayHistory.played_at, now - timedelta(days=1)),
+        "period": f"{days} derniers jours (écoutes : 24 dernières heures)",
+        "series": {
+            "start": start.isoformat(),
+            "bucket_seconds": bucket_seconds,
+            **{name: activity_series(session, column, start, bucket_seconds, buckets) for name, column in columns.items()},
+        },
+    }
+    activity_cache.set(cache_key, result, ACTIVITY_CACHE_SECONDS)
+    return result
+
+# ===== PROFILS DE REQUÊTES =====
+
+@admin_router.get("/profiles")
+def list_profiles(user: User = Depends(get_current_admin)):
+    """Lister les derniers profils de requêtes (en-tête X-Profile ou échantillonnage)"""
+    return [profile.summary() for profile in profile_store.list()]
+
+@admin_router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, user: User = Depends(get_current_admin)):
+    """Détail d'un profil : piles échantillonnées et requêtes SQL exécutées"""
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profil non trouvé")
+    return profile.as_dict()
+
+@admin_router.get("/profiles/{profile_id}/folded", response_class=PlainTextResponse)
+def get_profile_folded(profile_id: str, user: User = Depends(get_current_admin)):
+    """Profil au format « folded » (flamegraph.pl, speedscope, inferno)"""
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profil non trouvé")
+    return PlainTextResponse(profile.folded())
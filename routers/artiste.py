@@ -1,21 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, status
 from fastapi.responses import FileResponse
 from database import get_session
 from sqlmodel import Session, select, and_
 from models import (
-    User, Music, MusicStatus, UserRole, PaymentCode, Purchase, 
-    generate_payment_code, create_payment_code_expires_at
+    User, Music, MusicStatus, UserRole, PaymentCode, PaymentStatus, Purchase, 
+    MusicFullRead, PaymentCodeRead, SalesSeries, DailySales, generate_payment_code, create_payment_code_expires_at
 )
 from typing import List, Optional
 from routers.auth import get_current_artist, get_current_user
+from cache import catalog_cache
+from genres import apply_genre
+from suggest import suggest_index
+from monitoring import upload_usage
+from file_cache import file_cache
+from serialization import JSONBytesResponse, Projection, json_list_response
 from decimal import Decimal
-from datetime import datetime, timedelta
+from money import to_cents, from_cents
+from sales import sales_range, sales_series
+from datetime import date, datetime, timedelta
 import os
 import shutil
 import uuid
 
 artiste_router = APIRouter()
 
+# Colonnes de la liste des codes (sans entités ORM)
+PAYMENT_CODE_READ = Projection(PaymentCodeRead, PaymentCode)
+
 # Configuration pour les uploads
 UPLOAD_DIR = "uploads"
 MUSIC_DIR = os.path.join(UPLOAD_DIR, "music")
@@ -67,34 +78,6 @@ class MusicUpdate(SQLModel):
     price: Optional[Decimal] = None
     status: Optional[MusicStatus] = None
 
-class MusicRead(SQLModel):
-    id: int
-    title: str
-    description: Optional[str] = None
-    genre: Optional[str] = None
-    duration: Optional[int] = None
-    file_path: str
-    cover_image_path: Optional[str] = None
-    is_free: bool
-    price: Decimal
-    status: MusicStatus
-    play_count: int
-    download_count: int
-    artist_id: int
-    created_at: datetime
-    updated_at: Optional[datetime] = None
-
-class PaymentCodeRead(SQLModel):
-    id: int
-    code: str
-    music_id: int
-    price: Decimal
-    is_used: bool
-    expires_at: datetime
-    created_at: datetime
-    used_at: Optional[datetime] = None
-    used_by_client_id: Optional[int] = None
-
 class ArtisteStats(SQLModel):
     total_musics: int
     total_plays: int
@@ -169,12 +152,12 @@ def calculate_artist_stats(session: Session, artist_id: int) -> ArtisteStats:
     sales_result = session.exec(
         select(
             func.count(Purchase.id).label('total_sales'),
-            func.sum(Purchase.amount_paid).label('total_revenue')
+            func.sum(Purchase.amount_paid_cents).label('total_revenue')
         ).select_from(Purchase).join(Music).where(Music.artist_id == artist_id)
     ).first()
     
     total_sales = sales_result.total_sales if sales_result and sales_result.total_sales else 0
-    total_revenue = sales_result.total_revenue if sales_result and sales_result.total_revenue else Decimal('0.00')
+    total_revenue = from_cents(sales_result.total_revenue if sales_result else 0)
     
     return ArtisteStats(
         total_musics=total_musics,
@@ -227,6 +210,9 @@ def update_artiste_profile(
     session.add(artiste)
     session.commit()
     session.refresh(artiste)
+    suggest_index.index_artist(artiste)
+    # Le nom de l'artiste figure dans les pages du catalogue mises en cache
+    catalog_cache.bump_version()
     
     return UserRead(
         id=artiste.id,
@@ -241,7 +227,7 @@ def update_artiste_profile(
         updated_at=artiste.updated_at
     )
 
-@artiste_router.get("/musiques", response_model=List[MusicRead])
+@artiste_router.get("/musiques", response_model=List[MusicFullRead])
 def get_all_musiques(
     session: Session = Depends(get_session),
     user: User = Depends(get_current_artist)
@@ -250,25 +236,9 @@ def get_all_musiques(
     statement = select(Music).where(Music.artist_id == user.id)
     musiques = session.exec(statement).all()
     
-    return [MusicRead(
-        id=music.id,
-        title=music.title,
-        description=music.description,
-        genre=music.genre,
-        duration=music.duration,
-        file_path=music.file_path,
-        cover_image_path=music.cover_image_path,
-        is_free=music.is_free,
-        price=music.price,
-        status=music.status,
-        play_count=music.play_count,
-        download_count=music.download_count,
-        artist_id=music.artist_id,
-        created_at=music.created_at,
-        updated_at=music.updated_at
-    ) for music in musiques]
-
-@artiste_router.post("/musiques", response_model=MusicRead)
+    return json_list_response(MusicFullRead, musiques)
+
+@artiste_router.post("/musiques", response_model=MusicFullRead)
 async def create_musique(
     title: str = Form(...),
     description: str = Form(""),
@@ -295,11 +265,13 @@ async def create_musique(
     
     with open(audio_path, "wb") as buffer:
         shutil.copyfileobj(audio_file.file, buffer)
+    upload_usage.file_added(audio_path)
     
     # Sauvegarder l'image de couverture si fournie
     cover_path = None
     if cover_image and cover_image.filename:
         if not validate_image_file(cover_image.filename, cover_image.content_type):
+            upload_usage.file_removed(audio_path)
             os.remove(audio_path)  # Supprimer le fichier audio en cas d'erreur
             raise HTTPException(
                 status_code=400,
@@ -311,43 +283,28 @@ async def create_musique(
         
         with open(cover_path, "wb") as buffer:
             shutil.copyfileobj(cover_image.file, buffer)
+        upload_usage.file_added(cover_path)
     
     # Créer l'entrée en base de données
     new_music = Music(
         title=title,
         description=description,
-        genre=genre,
         is_free=is_free,
-        price=Decimal(str(price)) if not is_free else Decimal('0.00'),
+        price_cents=to_cents(price) if not is_free else 0,
         file_path=audio_path,
         cover_image_path=cover_path,
         artist_id=user.id,
         status=MusicStatus.DRAFT
     )
+    apply_genre(session, new_music, genre)
     
     session.add(new_music)
     session.commit()
     session.refresh(new_music)
     
-    return MusicRead(
-        id=new_music.id,
-        title=new_music.title,
-        description=new_music.description,
-        genre=new_music.genre,
-        duration=new_music.duration,
-        file_path=new_music.file_path,
-        cover_image_path=new_music.cover_image_path,
-        is_free=new_music.is_free,
-        price=new_music.price,
-        status=new_music.status,
-        play_count=new_music.play_count,
-        download_count=new_music.download_count,
-        artist_id=new_music.artist_id,
-        created_at=new_music.created_at,
-        updated_at=new_music.updated_at
-    )
+    return MusicFullRead.model_validate(new_music)
 
-@artiste_router.get("/musiques/{music_id}", response_model=MusicRead)
+@artiste_router.get("/musiques/{music_id}", response_model=MusicFullRead)
 def get_musique(
     music_id: int,
     session: Session = Depends(get_session),
@@ -362,25 +319,9 @@ def get_musique(
     if not music:
         raise HTTPException(status_code=404, detail="Musique non trouvée")
     
-    return MusicRead(
-        id=music.id,
-        title=music.title,
-        description=music.description,
-        genre=music.genre,
-        duration=music.duration,
-        file_path=music.file_path,
-        cover_image_path=music.cover_image_path,
-        is_free=music.is_free,
-        price=music.price,
-        status=music.status,
-        play_count=music.play_count,
-        download_count=music.download_count,
-        artist_id=music.artist_id,
-        created_at=music.created_at,
-        updated_at=music.updated_at
-    )
+    return MusicFullRead.model_validate(music)
 
-@artiste_router.put("/musiques/{music_id}", response_model=MusicRead)
+@artiste_router.put("/musiques/{music_id}", response_model=MusicFullRead)
 def update_musique(
     music_id: int,
     music_update: MusicUpdate,
@@ -398,6 +339,10 @@ def update_musique(
     
     # Mettre à jour uniquement les champs fournis
     update_data = music_update.dict(exclude_unset=True)
+    if "genre" in update_data:
+        apply_genre(session, music, update_data.pop("genre"))
+    if "price" in update_data:
+        music.price_cents = to_cents(update_data.pop("price"))
     for field, value in update_data.items():
         if hasattr(music, field):
             setattr(music, field, value)
@@ -405,24 +350,10 @@ def update_musique(
     session.add(music)
     session.commit()
     session.refresh(music)
+    catalog_cache.bump_version()
+    suggest_index.index_music(music)
     
-    return MusicRead(
-        id=music.id,
-        title=music.title,
-        description=music.description,
-        genre=music.genre,
-        duration=music.duration,
-        file_path=music.file_path,
-        cover_image_path=music.cover_image_path,
-        is_free=music.is_free,
-        price=music.price,
-        status=music.status,
-        play_count=music.play_count,
-        download_count=music.download_count,
-        artist_id=music.artist_id,
-        created_at=music.created_at,
-        updated_at=music.updated_at
-    )
+    return MusicFullRead.model_validate(music)
 
 @artiste_router.delete("/musiques/{music_id}")
 def delete_musique(
@@ -441,14 +372,19 @@ def delete_musique(
     
     # Supprimer les fichiers physiques
     if os.path.exists(music.file_path):
+        upload_usage.file_removed(music.file_path)
+        file_cache.invalidate(music.file_path)
         os.remove(music.file_path)
     
     if music.cover_image_path and os.path.exists(music.cover_image_path):
+        upload_usage.file_removed(music.cover_image_path)
         os.remove(music.cover_image_path)
     
     # Supprimer de la base de données
     session.delete(music)
     session.commit()
+    catalog_cache.bump_version()
+    suggest_index.remove_music(music_id)
     
     return {"message": "Musique supprimée avec succès"}
 
@@ -482,7 +418,7 @@ def generate_payment_code_for_music(
     payment_code = PaymentCode(
         code=code,
         music_id=music_id,
-        price=music.price,
+        price_cents=music.price_cents,
         expires_at=expires_at
     )
     
@@ -490,17 +426,7 @@ def generate_payment_code_for_music(
     session.commit()
     session.refresh(payment_code)
     
-    return PaymentCodeRead(
-        id=payment_code.id,
-        code=payment_code.code,
-        music_id=payment_code.music_id,
-        price=payment_code.price,
-        is_used=payment_code.is_used,
-        expires_at=payment_code.expires_at,
-        created_at=payment_code.created_at,
-        used_at=payment_code.used_at,
-        used_by_client_id=payment_code.used_by_client_id
-    )
+    return PaymentCodeRead.model_validate(payment_code)
 
 @artiste_router.get("/codes-paiement", response_model=List[PaymentCodeRead])
 def get_payment_codes(
@@ -508,20 +434,10 @@ def get_payment_codes(
     user: User = Depends(get_current_artist)
 ):
     """Obtenir tous les codes de paiement générés par l'artiste"""
-    statement = select(PaymentCode).join(Music).where(Music.artist_id == user.id)
-    codes = session.exec(statement).all()
-    
-    return [PaymentCodeRead(
-        id=code.id,
-        code=code.code,
-        music_id=code.music_id,
-        price=code.price,
-        is_used=code.is_used,
-        expires_at=code.expires_at,
-        created_at=code.created_at,
-        used_at=code.used_at,
-        used_by_client_id=code.used_by_client_id
-    ) for code in codes]
+    statement = select(*PAYMENT_CODE_READ.columns).join(Music).where(Music.artist_id == user.id)
+    rows = session.exec(statement).all()
+    
+    return JSONBytesResponse(PAYMENT_CODE_READ.dump(PaymentCodeRead, rows))
 
 @artiste_router.get("/statistiques", response_model=ArtisteStats)
 def get_artist_statistics(
@@ -531,6 +447,26 @@ def get_artist_statistics(
     """Obtenir les statistiques de l'artiste"""
     return calculate_artist_stats(session, user.id)
 
+@artiste_router.get("/statistiques/ventes", response_model=SalesSeries)
+def get_artist_sales(
+    start: Optional[date] = Query(None, description="Premier jour (défaut : il y a 30 jours)"),
+    end: Optional[date] = Query(None, description="Dernier jour inclus (défaut : aujourd'hui)"),
+    granularity: str = Query("day", description="day, week ou month"),
+    music_id: Optional[int] = Query(None, description="Limiter à une musique"),
+    session: Session = Depends(get_session),
+    user: User = Depends(get_current_artist)
+):
+    """Ventes et revenus de l'artiste par jour, semaine ou mois (cumuls journaliers)"""
+    try:
+        start, end = sales_range(start, end, granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    conditions = [DailySales.artist_id == user.id]
+    if music_id:
+        conditions.append(DailySales.music_id == music_id)
+    return sales_series(session, start, end, granularity, conditions)
+
 @artiste_router.post("/musiques/{music_id}/publier")
 def publish_music(
     music_id: int,
@@ -549,6 +485,8 @@ def publish_music(
     music.status = MusicStatus.PUBLISHED
     session.add(music)
     session.commit()
+    catalog_cache.bump_version()
+    suggest_index.index_music(music)
     
     return {"message": "Musique publiée avec succès"}
 
@@ -570,5 +508,7 @@ def archive_music(
     music.status = MusicStatus.ARCHIVED
     session.add(music)
     session.commit()
+    catalog_cache.bump_version()
+    suggest_index.index_music(music)
     
     return {"message": "Musique archivée avec succès"}
\ No newline at end of file
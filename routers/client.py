@@ -1,17 +1,30 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
-from fastapi.responses import FileResponse, StreamingResponse
 from database import get_session
-from sqlmodel import Session, select, and_, or_, func, desc
+from sqlmodel import Session, select, update, and_, or_, func, desc
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
 from models import (
     User, Music, MusicStatus, UserRole, PaymentCode, Purchase, 
-    Favorite, PlayHistory, PaymentStatus, DownloadLog, UserReade, UserUpdate
+    Favorite, PlayHistory, PaymentStatus, DownloadLog, UserReade, UserUpdate, Genre
 )
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 from routers.auth import get_current_client, get_current_user, get_current_active_user
-from decimal import Decimal
+from money import from_cents, min_cents, max_cents
 from datetime import datetime
+from cache import catalog_cache
+from recommendations import recommend_for_user
+from charts import chart_book
+from genres import find_genre, genre_filter, genre_counts
+from suggest import suggest_index, SUGGEST_MAX_LIMIT
+from search import music_search, SearchTimeout, SEARCH_MAX_CANDIDATES
+from facets import music_facets
+from sales import record_sale
+from file_cache import file_cache, file_headers, iter_chunks
+from delivery import DeliverySlot, DeliveryFileResponse, DeliveryStreamingResponse, delivery_pool, iter_file
+from bundles import BUNDLE_MAX_TRACKS, BundleEntry, entry_name, stream_zip
+from serialization import JSONBytesResponse, Projection, json_list_response
 import os
-from models import ClientStats ,MusicRead, PurchaseRead, PurchaseCreate, FavoriteRead, FavoriteCreate, PlayHistoryRead, PlayHistoryCreate
+from models import ClientStats ,ChartEntry ,GenreCount ,MusicFacets ,Suggestion ,MusicRead, PurchaseRead, PurchaseCreate, FavoriteRead, FavoriteCreate, PlayHistoryRead, PlayHistoryCreate
 
 
 
@@ -20,6 +33,9 @@ from models import ClientStats ,MusicRead, PurchaseRead, PurchaseCreate, Favorit
 
 client_router = APIRouter()
 
+# Colonnes des listes de musiques (artiste joint)
+MUSIC_READ = Projection(MusicRead, Music, artist=Projection(UserReade, User, prefix="artist_"))
+
 
 
 def validate_payment_code(session: Session, code: str) -> Optional[PaymentCode]:
@@ -38,17 +54,72 @@ def validate_payment_code(session: Session, code: str) -> Optional[PaymentCode]:
     
     return payment_code
 
+def redeem_payment_code(session: Session, code: str, music_id: int, client_id: int):
+    """Consommer un code de paiement en une seule requête UPDATE conditionnelle.
+
+    Retourne (id, price_cents) du code si la consommation a réussi, None sinon.
+    Deux requêtes concurrentes ne peuvent pas consommer le même code.
+    """
+    now = datetime.utcnow()
+    statement = (
+        update(PaymentCode)
+        .where(
+            and_(
+                PaymentCode.code == code,
+                PaymentCode.music_id == music_id,
+                PaymentCode.is_used == False,
+                PaymentCode.expires_at > now
+            )
+        )
+        .values(is_used=True, status=PaymentStatus.COMPLETED, used_at=now, used_by_client_id=client_id)
+        .returning(PaymentCode.id, PaymentCode.price_cents)
+        .execution_options(synchronize_session=False)
+    )
+    return session.exec(statement).first()
+
+def consume_download(session: Session, purchase_id: int) -> bool:
+    """Incrémenter le compteur de téléchargements d'un achat si la limite n'est pas atteinte"""
+    statement = (
+        update(Purchase)
+        .where(
+            and_(
+                Purchase.id == purchase_id,
+                Purchase.download_count < Purchase.max_downloads
+            )
+        )
+        .values(download_count=Purchase.download_count + 1)
+        .returning(Purchase.id)
+        .execution_options(synchronize_session=False)
+    )
+    return session.exec(statement).first() is not None
+
+def consume_downloads(session: Session, purchase_ids: List[int]) -> List[int]:
+    """consume_download pour plusieurs achats en une requête : ids effectivement incrémentés"""
+    statement = (
+        update(Purchase)
+        .where(
+            and_(
+                Purchase.id.in_(purchase_ids),
+                Purchase.download_count < Purchase.max_downloads
+            )
+        )
+        .values(download_count=Purchase.download_count + 1)
+        .returning(Purchase.id)
+        .execution_options(synchronize_session=False)
+    )
+    return [row[0] for row in session.exec(statement).all()]
+
 def calculate_client_stats(session: Session, client_id: int) -> ClientStats:
     purchases_result = session.exec(
         select(
             func.count(Purchase.id).label('total_purchases'),
-            func.sum(Purchase.amount_paid).label('total_spent'),
+            func.sum(Purchase.amount_paid_cents).label('total_spent'),
             func.sum(Purchase.download_count).label('total_downloads')
         ).where(Purchase.client_id == client_id)
     ).first()
     
     total_purchases = purchases_result.total_purchases if purchases_result and purchases_result.total_purchases else 0
-    total_spent = purchases_result.total_spent if purchases_result and purchases_result.total_spent else Decimal('0.00')
+    total_spent = from_cents(purchases_result.total_spent if purchases_result else 0)
     total_downloads = purchases_result.total_downloads if purchases_result and purchases_result.total_downloads else 0
     
     # Nombre de favoris
@@ -63,16 +134,17 @@ def calculate_client_stats(session: Session, client_id: int) -> ClientStats:
     
     # Genre favori
     favorite_genre_result = session.exec(
-        select(Music.genre, func.count(PlayHistory.id).label('play_count'))
+        select(Genre.name, func.count(PlayHistory.id).label('play_count'))
         .select_from(PlayHistory)
         .join(Music)
-        .where(and_(PlayHistory.user_id == client_id, Music.genre.isnot(None)))
-        .group_by(Music.genre)
+        .join(Genre, Genre.id == Music.genre_id)
+        .where(PlayHistory.user_id == client_id)
+        .group_by(Music.genre_id, Genre.name)
         .order_by(desc(func.count(PlayHistory.id)))
         .limit(1)
     ).first()
     
-    favorite_genre = favorite_genre_result.genre if favorite_genre_result else None
+    favorite_genre = favorite_genre_result.name if favorite_genre_result else None
     
     return ClientStats(
         total_purchases=total_purchases,
@@ -83,55 +155,6 @@ def calculate_client_stats(session: Session, client_id: int) -> ClientStats:
         total_downloads=total_downloads
     )
 
-def convert_music_to_read(music: Music, artist: Optional[User] = None) -> MusicRead:
-    """Convertir un objet Music en MusicRead"""
-    artist_data = None
-    if artist:
-        artist_data = UserReade(
-            id=artist.id,
-            email=artist.email,
-            username=artist.username,
-            full_name=artist.full_name or "",
-            role=artist.role.value,
-            is_active=artist.is_active
-        )
-    
-    return MusicRead(
-        id=music.id,
-        title=music.title,
-        description=music.description,
-        genre=music.genre,
-        duration=music.duration,
-        cover_image_path=music.cover_image_path,
-        is_free=music.is_free,
-        price=music.price,
-        status=music.status,
-        play_count=music.play_count,
-        download_count=music.download_count,
-        artist_id=music.artist_id,
-        created_at=music.created_at,
-        artist=artist_data
-    )
-
-def convert_purchase_to_read(purchase: Purchase, music: Optional[Music] = None) -> PurchaseRead:
-    """Convertir un objet Purchase en PurchaseRead"""
-    music_data = None
-    if music:
-        music_data = convert_music_to_read(music)
-    
-    return PurchaseRead(
-        id=purchase.id,
-        client_id=purchase.client_id,
-        music_id=purchase.music_id,
-        payment_code_id=purchase.payment_code_id,
-        amount_paid=purchase.amount_paid,
-        status=purchase.status,
-        download_count=purchase.download_count,
-        max_downloads=purchase.max_downloads,
-        purchased_at=purchase.purchased_at,
-        music=music_data
-    )
-
 # ===== ROUTES CLIENT =====
 
 @client_router.get("/me", response_model=UserReade)
@@ -179,6 +202,34 @@ def update_client_profile(
         is_active=client.is_active
     )
 
+def browse_conditions(
+    session: Session,
+    genre: Optional[str],
+    is_free: Optional[bool],
+    artist_id: Optional[int],
+    min_price: Optional[float],
+    max_price: Optional[float]
+) -> list:
+    """Filtres du catalogue publié (parcours et facettes)"""
+    conditions = [Music.status == MusicStatus.PUBLISHED]
+    
+    if genre:
+        conditions.append(genre_filter(session, genre))
+    
+    if is_free is not None:
+        conditions.append(Music.is_free == is_free)
+    
+    if artist_id:
+        conditions.append(Music.artist_id == artist_id)
+    
+    if min_price is not None:
+        conditions.append(Music.price_cents >= min_cents(min_price))
+    
+    if max_price is not None:
+        conditions.append(Music.price_cents <= max_cents(max_price))
+    
+    return conditions
+
 @client_router.get("/musiques", response_model=List[MusicRead])
 def browse_musiques(
     skip: int = Query(0, ge=0),
@@ -186,49 +237,128 @@ def browse_musiques(
     genre: Optional[str] = Query(None, description="Filtrer par genre"),
     is_free: Optional[bool] = Query(None, description="Filtrer par type (gratuit/payant)"),
     artist_id: Optional[int] = Query(None, description="Filtrer par artiste"),
-    search: Optional[str] = Query(None, description="Rechercher dans titre/description"),
+    search: Optional[str] = Query(None, description="Rechercher dans titre/artiste/description (tolère les fautes de frappe)"),
     min_price: Optional[float] = Query(None, ge=0, description="Prix minimum"),
     max_price: Optional[float] = Query(None, ge=0, description="Prix maximum"),
     session: Session = Depends(get_session),
     user: User = Depends(get_current_client)
 ):
-    """Parcourir les musiques disponibles"""
-    statement = select(Music).where(Music.status == MusicStatus.PUBLISHED)
-    
-    # Appliquer les filtres
-    if genre:
-        statement = statement.where(Music.genre.ilike(f"%{genre}%"))
-    
-    if is_free is not None:
-        statement = statement.where(Music.is_free == is_free)
-    
-    if artist_id:
-        statement = statement.where(Music.artist_id == artist_id)
-    
-    if search:
-        statement = statement.where(
-            or_(
-                Music.title.ilike(f"%{search}%"),
-                Music.description.ilike(f"%{search}%")
+    """Parcourir les musiques disponibles (mis en cache par version du catalogue)"""
+    params = {
+        "skip": skip,
+        "limit": limit,
+        "genre": genre,
+        "is_free": is_free,
+        "artist_id": artist_id,
+        "search": search,
+        "min_price": min_price,
+        "max_price": max_price
+    }
+    
+    def load():
+        conditions = browse_conditions(session, genre, is_free, artist_id, min_price, max_price)
+        
+        if search:
+            # Recherche approchée (trigrammes) : résultats classés par similarité
+            try:
+                ranked_ids = music_search.search_ids(session, search, conditions, skip + limit)
+            except SearchTimeout:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Recherche trop longue, veuillez préciser votre requête"
+                )
+            if ranked_ids is not None:
+                page = ranked_ids[skip:skip + limit]
+                rows = session.exec(
+                    select(*MUSIC_READ.columns).join(User, User.id == Music.artist_id).where(Music.id.in_(page))
+                ).all()
+                by_id = {row.id: row for row in rows}
+                return MUSIC_READ.dump(MusicRead, [by_id[music_id] for music_id in page if music_id in by_id]).decode()
+            
+            conditions.append(
+                or_(
+                    Music.title.ilike(f"%{search}%"),
+                    Music.description.ilike(f"%{search}%")
+                )
             )
+        
+        # Colonnes utiles seulement (pas d'entités ORM) ; l'artiste vient de la jointure
+        statement = (
+            select(*MUSIC_READ.columns)
+            .join(User, User.id == Music.artist_id)
+            .where(*conditions)
+            .offset(skip).limit(limit).order_by(desc(Music.created_at))
         )
+        rows = session.exec(statement).all()
+        
+        # Sérialisé une seule fois : le cache conserve directement le JSON
+        return MUSIC_READ.dump(MusicRead, rows).decode()
     
-    if min_price is not None:
-        statement = statement.where(Music.price >= Decimal(str(min_price)))
-    
-    if max_price is not None:
-        statement = statement.where(Music.price <= Decimal(str(max_price)))
-    
-    statement = statement.offset(skip).limit(limit).order_by(desc(Music.created_at))
-    musiques = session.exec(statement).all()
-    
-    # Charger les artistes
-    result = []
-    for music in musiques:
-        artist = session.get(User, music.artist_id)
-        result.append(convert_music_to_read(music, artist))
+    return JSONBytesResponse(catalog_cache.get_or_load("browse", params, load))
+
+@client_router.get("/musiques/facets", response_model=MusicFacets)
+def get_musique_facets(
+    genre: Optional[str] = Query(None, description="Filtrer par genre"),
+    is_free: Optional[bool] = Query(None, description="Filtrer par type (gratuit/payant)"),
+    artist_id: Optional[int] = Query(None, description="Filtrer par artiste"),
+    search: Optional[str] = Query(None, description="Rechercher dans titre/artiste/description (tolère les fautes de frappe)"),
+    min_price: Optional[float] = Query(None, ge=0, description="Prix minimum"),
+    max_price: Optional[float] = Query(None, ge=0, description="Prix maximum"),
+    session: Session = Depends(get_session),
+    user: User = Depends(get_current_client)
+):
+    """Comptages par genre, gratuit/payant et tranche de prix pour les filtres de /musiques"""
+    params = {
+        "genre": genre,
+        "is_free": is_free,
+        "artist_id": artist_id,
+        "search": search,
+        "min_price": min_price,
+        "max_price": max_price
+    }
+    
+    def load():
+        conditions = browse_conditions(session, genre, is_free, artist_id, min_price, max_price)
+        
+        if search:
+            # Mêmes résultats que le parcours : les candidats de la recherche approchée
+            try:
+                ranked_ids = music_search.search_ids(session, search, conditions, SEARCH_MAX_CANDIDATES)
+            except SearchTimeout:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Recherche trop longue, veuillez préciser votre requête"
+                )
+            if ranked_ids is not None:
+                conditions.append(Music.id.in_(ranked_ids))
+            else:
+                conditions.append(
+                    or_(
+                        Music.title.ilike(f"%{search}%"),
+                        Music.description.ilike(f"%{search}%")
+                    )
+                )
+        
+        return music_facets(session, conditions)
     
-    return result
+    return catalog_cache.get_or_load("facets", params, load)
+
+@client_router.get("/genres", response_model=List[GenreCount])
+def get_genres(
+    session: Session = Depends(get_session),
+    user: User = Depends(get_current_client)
+):
+    """Genres du catalogue avec leur nombre de musiques publiées"""
+    return catalog_cache.get_or_load("genres", {}, lambda: genre_counts(session))
+
+@client_router.get("/suggest", response_model=List[Suggestion])
+def suggest(
+    q: str = Query(..., min_length=1, max_length=100, description="Début de titre, d'artiste ou de genre"),
+    limit: int = Query(8, ge=1, le=SUGGEST_MAX_LIMIT),
+    user: User = Depends(get_current_client)
+):
+    """Autocomplétion (index en mémoire, sans requête SQL)"""
+    return json_list_response(Suggestion, suggest_index.suggest(q, limit))
 
 @client_router.get("/musiques/{music_id}", response_model=MusicRead)
 def get_musique_details(
@@ -237,17 +367,63 @@ def get_musique_details(
     user: User = Depends(get_current_client)
 ):
     """Obtenir les détails d'une musique"""
-    statement = select(Music).where(
-        and_(Music.id == music_id, Music.status == MusicStatus.PUBLISHED)
-    )
-    music = session.exec(statement).first()
+    def load():
+        statement = select(Music).where(
+            and_(Music.id == music_id, Music.status == MusicStatus.PUBLISHED)
+        )
+        music = session.exec(statement).first()
+        
+        if not music:
+            raise HTTPException(status_code=404, detail="Musique non trouvée")
+        
+        return MusicRead.model_validate(music).model_dump(mode="json")
     
-    if not music:
-        raise HTTPException(status_code=404, detail="Musique non trouvée")
+    return catalog_cache.get_or_load("detail", {"music_id": music_id}, load)
+
+@client_router.get("/recommendations", response_model=List[MusicRead])
+def get_recommendations(
+    limit: int = Query(20, ge=1, le=50),
+    session: Session = Depends(get_session),
+    user: User = Depends(get_current_client)
+):
+    """Recommandations personnalisées : historique récent × morceaux similaires précalculés"""
+    musiques = recommend_for_user(session, user.id, limit)
+    return json_list_response(MusicRead, musiques)
+
+@client_router.get("/charts", response_model=List[ChartEntry])
+def get_charts(
+    chart: str = Query("hot", description="Classement (ex: hot, weekly)"),
+    genre: Optional[str] = Query(None, description="Classement d'un genre"),
+    limit: int = Query(20, ge=1, le=50),
+    session: Session = Depends(get_session),
+    user: User = Depends(get_current_client)
+):
+    """Tendances : scores décroissants maintenus en mémoire, aucune agrégation en base"""
+    if chart not in chart_book.charts:
+        raise HTTPException(status_code=400, detail="Classement inconnu")
     
-    # Charger l'artiste
-    artist = session.get(User, music.artist_id)
-    return convert_music_to_read(music, artist)
+    # Marge pour les morceaux dépubliés depuis leur entrée au classement
+    if genre:
+        # Alias -> nom canonique ("hip hop", "rap" -> "Hip-Hop")
+        canonical = find_genre(session, genre)
+        if canonical is None:
+            return json_list_response(ChartEntry, [])
+        genre = canonical.name
+    ranked = chart_book.top(chart, genre, limit * 2)
+    musiques = session.exec(
+        select(Music)
+        .where(Music.id.in_([music_id for music_id, _ in ranked]), Music.status == MusicStatus.PUBLISHED)
+        .options(selectinload(Music.artist))
+    ).all()
+    by_id = {music.id: music for music in musiques}
+    
+    entries = [
+        {"score": round(score, 4), "music": by_id[music_id]}
+        for music_id, score in ranked if music_id in by_id
+    ][:limit]
+    for rank, entry in enumerate(entries, start=1):
+        entry["rank"] = rank
+    return json_list_response(ChartEntry, entries)
 
 @client_router.post("/purchase", response_model=PurchaseRead)
 def purchase_music(
@@ -284,40 +460,38 @@ def purchase_music(
             detail="Vous possédez déjà cette musique"
         )
     
-    # Valider le code de paiement
-    payment_code = validate_payment_code(session, purchase_data.payment_code)
-    if not payment_code:
+    # Consommer le code de paiement de manière atomique
+    redeemed = redeem_payment_code(session, purchase_data.payment_code, purchase_data.music_id, user.id)
+    if not redeemed:
+        session.rollback()
+        payment_code = validate_payment_code(session, purchase_data.payment_code)
+        if payment_code and payment_code.music_id != purchase_data.music_id:
+            raise HTTPException(
+                status_code=400,
+                detail="Ce code de paiement n'est pas valide pour cette musique"
+            )
         raise HTTPException(
             status_code=400,
             detail="Code de paiement invalide ou expiré"
         )
     
-    if payment_code.music_id != purchase_data.music_id:
-        raise HTTPException(
-            status_code=400,
-            detail="Ce code de paiement n'est pas valide pour cette musique"
-        )
-    
-    # Marquer le code comme utilisé
-    payment_code.is_used = True
-    payment_code.used_at = datetime.utcnow()
-    payment_code.used_by_client_id = user.id
-    
-    # Créer l'achat
+    # Créer l'achat dans la même transaction
     new_purchase = Purchase(
         client_id=user.id,
         music_id=purchase_data.music_id,
-        payment_code_id=payment_code.id,
-        amount_paid=payment_code.price,
+        payment_code_id=redeemed.id,
+        amount_paid_cents=redeemed.price_cents,
         status=PaymentStatus.COMPLETED
     )
     
-    session.add(payment_code)
+    genre = music.genre
     session.add(new_purchase)
+    record_sale(session, music, new_purchase.amount_paid_cents, new_purchase.purchased_at)
     session.commit()
     session.refresh(new_purchase)
+    chart_book.record("purchase", purchase_data.music_id, genre)
     
-    return convert_purchase_to_read(new_purchase, music)
+    return PurchaseRead.model_validate(new_purchase)
 
 @client_router.get("/purchases", response_model=List[PurchaseRead])
 def get_my_purchases(
@@ -325,16 +499,15 @@ def get_my_purchases(
     user: User = Depends(get_current_client)
 ):
     """Obtenir l'historique des achats du client"""
-    statement = select(Purchase).where(Purchase.client_id == user.id).order_by(desc(Purchase.purchased_at))
+    statement = (
+        select(Purchase)
+        .where(Purchase.client_id == user.id)
+        .options(selectinload(Purchase.music).selectinload(Music.artist))
+        .order_by(desc(Purchase.purchased_at))
+    )
     purchases = session.exec(statement).all()
     
-    # Charger les musiques associées
-    result = []
-    for purchase in purchases:
-        music = session.get(Music, purchase.music_id)
-        result.append(convert_purchase_to_read(purchase, music))
-    
-    return result
+    return json_list_response(PurchaseRead, purchases)
 
 @client_router.post("/favorites", response_model=FavoriteRead)
 def add_to_favorites(
@@ -370,17 +543,13 @@ def add_to_favorites(
         music_id=favorite_data.music_id
     )
     
+    genre = music.genre
     session.add(new_favorite)
     session.commit()
     session.refresh(new_favorite)
+    chart_book.record("favorite", favorite_data.music_id, genre)
     
-    return FavoriteRead(
-        id=new_favorite.id,
-        user_id=new_favorite.user_id,
-        music_id=new_favorite.music_id,
-        created_at=new_favorite.created_at,
-        music=convert_music_to_read(music)
-    )
+    return FavoriteRead.model_validate(new_favorite)
 
 @client_router.get("/favorites", response_model=List[FavoriteRead])
 def get_my_favorites(
@@ -388,24 +557,16 @@ def get_my_favorites(
     user: User = Depends(get_current_client)
 ):
     """Obtenir la liste des favoris du client"""
-    statement = select(Favorite).where(Favorite.user_id == user.id).order_by(desc(Favorite.created_at))
+    statement = (
+        select(Favorite)
+        .where(Favorite.user_id == user.id)
+        .options(selectinload(Favorite.music).selectinload(Music.artist))
+        .order_by(desc(Favorite.created_at))
+    )
     favorites = session.exec(statement).all()
     
-    # Charger les musiques associées
-    result = []
-    for favorite in favorites:
-        music = session.get(Music, favorite.music_id)
-        if music:  # Vérifier que la musique existe encore
-            music_read = convert_music_to_read(music)
-            result.append(FavoriteRead(
-                id=favorite.id,
-                user_id=favorite.user_id,
-                music_id=favorite.music_id,
-                created_at=favorite.created_at,
-                music=music_read
-            ))
-    
-    return result
+    # Ignorer les favoris dont la musique n'existe plus
+    return json_list_response(FavoriteRead, [f for f in favorites if f.music])
 
 @client_router.delete("/favorites/{favorite_id}")
 def remove_from_favorites(
@@ -437,26 +598,13 @@ def get_play_history(
     """Obtenir l'historique d'écoute du client"""
     statement = select(PlayHistory).where(
         PlayHistory.user_id == user.id
+    ).options(
+        selectinload(PlayHistory.music).selectinload(Music.artist)
     ).order_by(desc(PlayHistory.played_at)).offset(skip).limit(limit)
     
     history = session.exec(statement).all()
     
-    # Charger les musiques associées
-    result = []
-    for play in history:
-        music = session.get(Music, play.music_id)
-        if music:
-            music_read = convert_music_to_read(music)
-            result.append(PlayHistoryRead(
-                id=play.id,
-                user_id=play.user_id,
-                music_id=play.music_id,
-                played_at=play.played_at,
-                duration_played=play.duration_played,
-                music=music_read
-            ))
-    
-    return result
+    return json_list_response(PlayHistoryRead, [play for play in history if play.music])
 
 @client_router.get("/statistics", response_model=ClientStats)
 def get_client_statistics(
@@ -466,11 +614,122 @@ def get_client_statistics(
     """Obtenir les statistiques du client"""
     return calculate_client_stats(session, user.id)
 
+def delivery_slot(kind: str):
+    """Dépendance : créneau de livraison, rendu par la réponse (ou ici si la route échoue)"""
+    async def dependency(user: User = Depends(get_current_client)) -> AsyncIterator[DeliverySlot]:
+        slot = await delivery_pool.acquire(user.id, kind)
+        try:
+            yield slot
+        finally:
+            if not slot.handed_off:
+                slot.release()
+    return dependency
+
+@client_router.get("/download/bundle")
+def download_bundle(
+    request: Request,
+    music_ids: Optional[List[int]] = Query(None, description="Musiques à inclure (par défaut : tous les achats encore téléchargeables)"),
+    session: Session = Depends(get_session),
+    user: User = Depends(get_current_client),
+    slot: DeliverySlot = Depends(delivery_slot("bundle"))
+):
+    """Télécharger plusieurs musiques (gratuites ou achetées) dans une archive ZIP"""
+    requested = list(dict.fromkeys(music_ids)) if music_ids else None
+    
+    # Achats du client : un achat encore téléchargeable par musique
+    purchase_query = select(
+        Purchase.id, Purchase.music_id, Purchase.max_downloads - Purchase.download_count
+    ).where(
+        and_(
+            Purchase.client_id == user.id,
+            Purchase.status == PaymentStatus.COMPLETED
+        )
+    )
+    if requested:
+        purchase_query = purchase_query.where(Purchase.music_id.in_(requested))
+    available, exhausted = {}, set()
+    for purchase_id, music_id, remaining in session.exec(purchase_query.order_by(Purchase.id)).all():
+        if remaining > 0:
+            available.setdefault(music_id, purchase_id)
+        else:
+            exhausted.add(music_id)
+    
+    if requested is None:
+        requested = list(available)
+        if not requested:
+            raise HTTPException(status_code=404, detail="Aucun achat à télécharger")
+    if len(requested) > BUNDLE_MAX_TRACKS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Trop de musiques pour une archive (maximum {BUNDLE_MAX_TRACKS})"
+        )
+    
+    musics = {
+        row[0]: row for row in session.exec(
+            select(Music.id, Music.title, Music.file_path, Music.is_free, User.username)
+            .join(User, User.id == Music.artist_id)
+            .where(Music.id.in_(requested))
+        ).all()
+    }
+    
+    # Vérifier les droits et les fichiers de toutes les musiques avant de consommer un téléchargement
+    entries, purchase_ids, used_names = [], [], set()
+    for music_id in requested:
+        if music_id not in musics:
+            raise HTTPException(status_code=404, detail="Musique non trouvée")
+        _, title, file_path, is_free, artist = musics[music_id]
+        if not is_free:
+            if music_id not in available:
+                if music_id in exhausted:
+                    raise HTTPException(status_code=400, detail=f"Limite de téléchargements atteinte : {title}")
+                raise HTTPException(
+                    status_code=403,
+                    detail=f"Vous n'avez pas l'autorisation de télécharger cette musique : {title}"
+                )
+            purchase_ids.append(available[music_id])
+        try:
+            size = os.stat(file_path).st_size
+        except OSError:
+            raise HTTPException(status_code=404, detail=f"Fichier non trouvé : {title}")
+        entries.append(BundleEntry(entry_name(artist, title, file_path, used_names), file_path, size))
+    
+    # Une seule transaction : compteurs des achats, compteurs des musiques, journaux
+    if purchase_ids and len(consume_downloads(session, purchase_ids)) != len(purchase_ids):
+        session.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="Limite de téléchargements atteinte"
+        )
+    session.exec(
+        update(Music)
+        .where(Music.id.in_(requested))
+        .values(download_count=Music.download_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if purchase_ids:
+        now = datetime.utcnow()
+        ip_address = request.client.host if request.client else None
+        user_agent = request.headers.get("user-agent")
+        session.execute(insert(DownloadLog), [
+            {"purchase_id": purchase_id, "downloaded_at": now, "ip_address": ip_address, "user_agent": user_agent}
+            for purchase_id in purchase_ids
+        ])
+    session.commit()
+    
+    filename = f"e-vazo-{datetime.utcnow():%Y%m%d-%H%M%S}.zip"
+    return DeliveryStreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers=file_headers(None, filename)
+    ).hold(slot)
+
 @client_router.get("/download/{music_id}")
 def download_music(
     music_id: int,
+    request: Request,
     session: Session = Depends(get_session),
-    user: User = Depends(get_current_client)
+    user: User = Depends(get_current_client),
+    slot: DeliverySlot = Depends(delivery_slot("download"))
 ):
     """Télécharger une musique (gratuite ou achetée)"""
     music = session.get(Music, music_id)
@@ -496,16 +755,7 @@ def download_music(
         ).first()
         
         if purchase:
-            if purchase.download_count < purchase.max_downloads:
-                can_download = True
-                # Incrémenter le compteur de téléchargements
-                purchase.download_count += 1
-                session.add(purchase)
-            else:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Limite de téléchargements atteinte"
-                )
+            can_download = True
     
     if not can_download:
         raise HTTPException(
@@ -513,13 +763,25 @@ def download_music(
             detail="Vous n'avez pas l'autorisation de télécharger cette musique"
         )
     
-    # Vérifier si le fichier existe
+    # Vérifier si le fichier existe avant de consommer un téléchargement
     if not os.path.exists(music.file_path):
         raise HTTPException(status_code=404, detail="Fichier non trouvé")
     
+    # Incrémenter le compteur de téléchargements de l'achat (atomique)
+    if purchase and not consume_download(session, purchase.id):
+        session.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="Limite de téléchargements atteinte"
+        )
+    
     # Incrémenter le compteur de téléchargements global
-    music.download_count += 1
-    session.add(music)
+    session.exec(
+        update(Music)
+        .where(Music.id == music.id)
+        .values(download_count=Music.download_count + 1)
+        .execution_options(synchronize_session=False)
+    )
     
     # Enregistrer le log de téléchargement si c'est un achat
     if purchase:
@@ -532,19 +794,35 @@ def download_music(
     
     session.commit()
     
-    # Retourner le fichier
+    # Retourner le fichier (depuis le cache des fichiers les plus demandés si possible,
+    # sinon lu sur les threads de livraison) ; les reprises avec Range passent par FileResponse
     filename = f"{music.title}.{music.file_path.split('.')[-1]}"
-    return FileResponse(
-        path=music.file_path,
+    if "range" in request.headers:
+        return DeliveryFileResponse(
+            path=music.file_path,
+            media_type='application/octet-stream',
+            filename=filename
+        ).hold(slot)
+    
+    data = file_cache.get(music.file_path)
+    if data is not None:
+        return DeliveryStreamingResponse(
+            iter_chunks(data),
+            media_type='application/octet-stream',
+            headers={**file_headers(len(data), filename), "accept-ranges": "bytes"}
+        ).hold(slot)
+    return DeliveryStreamingResponse(
+        iter_file(music.file_path),
         media_type='application/octet-stream',
-        filename=filename
-    )
+        headers={**file_headers(os.path.getsize(music.file_path), filename), "accept-ranges": "bytes"}
+    ).hold(slot)
 
 @client_router.get("/stream/{music_id}")
 def stream_music(
     music_id: int,
     session: Session = Depends(get_session),
-    user: User = Depends(get_current_client)
+    user: User = Depends(get_current_client),
+    slot: DeliverySlot = Depends(delivery_slot("stream"))
 ):
     """Écouter une musique en streaming"""
     music = session.get(Music, music_id)
@@ -564,17 +842,23 @@ def stream_music(
         music_id=music_id,
         duration_played=0  # À mettre à jour côté client
     )
+    genre = music.genre
     session.add(play_history)
     session.commit()
-    
-    def iterfile(file_path: str):
-        with open(file_path, mode="rb") as file_like:
-            yield from file_like
-    
-    return StreamingResponse(
-        iterfile(music.file_path),
+    chart_book.record("play", music_id, genre)
+    
+    data = file_cache.get(music.file_path)
+    if data is not None:
+        return DeliveryStreamingResponse(
+            iter_chunks(data),
+            media_type="audio/mpeg",
+            headers=file_headers(len(data))
+        ).hold(slot)
+    
+    return DeliveryStreamingResponse(
+        iter_file(music.file_path),
         media_type="audio/mpeg"
-    )
+    ).hold(slot)
 
 @client_router.post("/play-history", response_model=PlayHistoryRead)
 def record_play_session(
@@ -595,16 +879,10 @@ def record_play_session(
         duration_played=play_data.duration_played
     )
     
+    genre = music.genre
     session.add(play_history)
     session.commit()
     session.refresh(play_history)
+    chart_book.record("play", play_data.music_id, genre)
     
-    music_read = convert_music_to_read(music)
-    return PlayHistoryRead(
-        id=play_history.id,
-        user_id=play_history.user_id,
-        music_id=play_history.music_id,
-        played_at=play_history.played_at,
-        duration_played=play_history.duration_played,
-        music=music_read
-    )
\ No newline at end of file
+    return PlayHistoryRead.model_validate(play_history)
\ No newline at end of file
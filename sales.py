@@ -0,0 +1,120 @@
+"""Cumuls de ventes journaliers par musique (et artiste).
+
+Chaque achat incrémente la ligne (jour, musique) de daily_sales dans la
+transaction de l'achat. Les séries par jour, semaine ou mois additionnent ces
+cumuls au lieu de parcourir purchases ; la table peut être reconstruite
+depuis purchases à tout moment.
+"""
+from sqlmodel import Session, select, delete, func
+from sqlalchemy import insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import engine
+from models import DailySales, Music, Purchase, PaymentStatus
+from money import from_cents
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Sequence, Tuple
+
+# Configuration
+GRANULARITIES = ("day", "week", "month")
+SALES_DEFAULT_DAYS = 30
+SALES_MAX_DAYS = 3 * 366
+
+def period_start(day: date, granularity: str) -> date:
+    """Premier jour de la période contenant `day` (semaines ISO : lundi)"""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def next_period(start: date, granularity: str) -> date:
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+def sales_range(start: Optional[date], end: Optional[date], granularity: str) -> Tuple[date, date]:
+    """Plage demandée, par défaut les SALES_DEFAULT_DAYS derniers jours (ValueError si invalide)"""
+    if granularity not in GRANULARITIES:
+        raise ValueError("Granularité inconnue (day, week ou month)")
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=SALES_DEFAULT_DAYS - 1)
+    if start > end:
+        raise ValueError("Période invalide : start est postérieur à end")
+    if (end - start).days >= SALES_MAX_DAYS:
+        raise ValueError(f"Période trop longue (maximum {SALES_MAX_DAYS} jours)")
+    return start, end
+
+# ===== MISE À JOUR =====
+
+def record_sale(session: Session, music: Music, amount_cents: int, purchased_at: datetime) -> None:
+    """Ajouter un achat au cumul du jour (à appeler avant le commit de l'achat)"""
+    statement = sqlite_insert(DailySales).values(
+        day=purchased_at.date(), music_id=music.id, artist_id=music.artist_id,
+        sales_count=1, revenue_cents=amount_cents
+    )
+    session.execute(statement.on_conflict_do_update(
+        index_elements=["day", "music_id"],
+        set_={
+            "sales_count": DailySales.sales_count + 1,
+            "revenue_cents": DailySales.revenue_cents + statement.excluded.revenue_cents,
+        }
+    ))
+
+def rebuild_daily_sales(session: Session) -> int:
+    """Recalculer tous les cumuls depuis purchases (en une requête INSERT ... SELECT)"""
+    session.exec(delete(DailySales))
+    day = func.date(Purchase.purchased_at)
+    session.exec(insert(DailySales).from_select(
+        ["day", "music_id", "artist_id", "sales_count", "revenue_cents"],
+        select(day, Purchase.music_id, Music.artist_id, func.count(Purchase.id), func.sum(Purchase.amount_paid_cents))
+        .join(Music, Music.id == Purchase.music_id)
+        .where(Purchase.status == PaymentStatus.COMPLETED)
+        .group_by(day, Purchase.music_id, Music.artist_id)
+    ))
+    rows = session.exec(select(func.count()).select_from(DailySales)).one()
+    session.commit()
+    return rows
+
+def ensure_daily_sales() -> None:
+    """Au démarrage : remplir les cumuls s'ils sont vides alors que des achats existent"""
+    with Session(engine) as session:
+        if session.exec(select(DailySales.day).limit(1)).first() is not None:
+            return
+        if session.exec(select(Purchase.id).limit(1)).first() is None:
+            return
+        rows = rebuild_daily_sales(session)
+    print(f"📈 Cumuls de ventes reconstruits: {rows} lignes")
+
+# ===== SÉRIES =====
+
+def sales_series(session: Session, start: date, end: date, granularity: str, conditions: Sequence = ()) -> Dict:
+    """Ventes et revenus par période sur [start, end] (périodes sans vente comprises)"""
+    rows = session.exec(
+        select(DailySales.day, func.sum(DailySales.sales_count), func.sum(DailySales.revenue_cents))
+        .where(DailySales.day >= start, DailySales.day <= end, *conditions)
+        .group_by(DailySales.day)
+    ).all()
+
+    totals: Dict[date, list] = {}
+    period = period_start(start, granularity)
+    while period <= end:
+        totals[period] = [0, 0]
+        period = next_period(period, granularity)
+    for day, sales, revenue_cents in rows:
+        bucket = totals[period_start(day, granularity)]
+        bucket[0] += sales
+        bucket[1] += revenue_cents
+
+    return {
+        "start": start,
+        "end": end,
+        "granularity": granularity,
+        "total_sales": sum(sales for sales, _ in totals.values()),
+        "total_revenue": from_cents(sum(revenue for _, revenue in totals.values())),
+        "points": [
+            {"period": period, "sales": sales, "revenue": from_cents(revenue)}
+            for period, (sales, revenue) in totals.items()
+        ],
+    }
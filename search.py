@@ -0,0 +1,182 @@
+"""Recherche tolérante aux fautes de frappe : index trigramme SQLite FTS5.
+
+La table virtuelle music_search (titre, artiste, description) est tenue à jour
+par des triggers sur musics et users. Une requête est découpée en trigrammes ;
+seuls les plus sélectifs (d'après music_search_vocab) sont cherchés, ce qui borne
+le coût. Les documents sont classés par nombre de trigrammes trouvés, filtrés
+comme dans browse_musiques, puis les meilleurs candidats sont classés par
+similarité : part des trigrammes de la requête présents dans le champ (comme
+word_similarity de pg_trgm), sans tenir compte des accents.
+"""
+from sqlmodel import Session, select, func, desc
+from sqlalchemy import text, table, column, union_all
+from sqlalchemy.exc import OperationalError
+from database import engine
+from models import Music, User
+from suggest import normalize_text
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+import os
+import time
+
+# Configuration
+SEARCH_BUDGET_MS = float(os.getenv("SEARCH_BUDGET_MS", "250"))  # Au-delà, la requête SQL est interrompue
+SEARCH_MAX_POSTINGS = 50000     # Documents cumulés des trigrammes cherchés (les plus rares d'abord)
+SEARCH_MAX_TERMS = 16
+SEARCH_CANDIDATES = 200         # Candidats (les plus de trigrammes trouvés) classés par similarité
+SEARCH_MAX_CANDIDATES = 1000
+SEARCH_MIN_SIMILARITY = 0.3
+DESCRIPTION_WEIGHT = 0.8        # Une correspondance dans la description compte un peu moins
+
+search_table = table("music_search", column("rowid"))
+
+ARTIST_TEXT = "coalesce({row}.full_name, '') || ' ' || {row}.username"
+
+SEARCH_SCHEMA = [
+    "CREATE VIRTUAL TABLE music_search USING fts5(title, artist, description, tokenize='trigram')",
+    "INSERT INTO music_search(rowid, title, artist, description) "
+    "SELECT musics.id, musics.title, " + ARTIST_TEXT.format(row="users") + ", musics.description "
+    "FROM musics JOIN users ON users.id = musics.artist_id",
+]
+
+SEARCH_TRIGGERS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS music_search_vocab USING fts5vocab(music_search, 'row')",
+    "CREATE TRIGGER IF NOT EXISTS musics_search_insert AFTER INSERT ON musics BEGIN "
+    "INSERT INTO music_search(rowid, title, artist, description) "
+    "SELECT new.id, new.title, " + ARTIST_TEXT.format(row="users") + ", new.description "
+    "FROM users WHERE users.id = new.artist_id; END",
+    "CREATE TRIGGER IF NOT EXISTS musics_search_update AFTER UPDATE OF title, description, artist_id ON musics BEGIN "
+    "UPDATE music_search SET title = new.title, description = new.description, "
+    "artist = (SELECT " + ARTIST_TEXT.format(row="users") + " FROM users WHERE users.id = new.artist_id) "
+    "WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS musics_search_delete AFTER DELETE ON musics BEGIN "
+    "DELETE FROM music_search WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS users_search_update AFTER UPDATE OF username, full_name ON users BEGIN "
+    "UPDATE music_search SET artist = " + ARTIST_TEXT.format(row="new") + " "
+    "WHERE rowid IN (SELECT id FROM musics WHERE artist_id = new.id); END",
+]
+
+class SearchTimeout(Exception):
+    """La recherche a dépassé son budget de latence"""
+
+def trigrams(value: str) -> List[str]:
+    """Trigrammes dans l'ordre d'apparition, espaces compris (comme le tokenizer trigram)"""
+    seen: Dict[str, None] = {}
+    for start in range(len(value) - 2):
+        seen.setdefault(value[start:start + 3], None)
+    return list(seen)
+
+def similarity(query_grams: Set[str], value: Optional[str]) -> float:
+    """Part des trigrammes de la requête présents dans `value` (0 à 1)"""
+    if not value or not query_grams:
+        return 0.0
+    return len(query_grams.intersection(trigrams(normalize_text(value)))) / len(query_grams)
+
+def match_expression(grams: Sequence[str]) -> str:
+    return " OR ".join('"' + gram.replace('"', '""') + '"' for gram in grams)
+
+@contextmanager
+def latency_budget(session: Session, budget_ms: float) -> Iterator[None]:
+    """Interrompre la requête SQL en cours au-delà de `budget_ms`"""
+    dbapi_connection = session.connection().connection.dbapi_connection
+    deadline = time.perf_counter() + budget_ms / 1000
+    dbapi_connection.set_progress_handler(lambda: time.perf_counter() > deadline, 10000)
+    try:
+        yield
+    except OperationalError as e:
+        if "interrupted" in str(e):
+            raise SearchTimeout() from e
+        raise
+    finally:
+        dbapi_connection.set_progress_handler(None, 10000)
+
+# ===== INDEX =====
+
+class MusicSearch:
+    def __init__(self, budget_ms: float = SEARCH_BUDGET_MS):
+        self.budget_ms = budget_ms
+        self.available = False
+
+    def setup(self) -> None:
+        """Créer l'index (rempli depuis les musiques existantes) et ses triggers"""
+        if engine.dialect.name != "sqlite":
+            return
+        with engine.begin() as connection:
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'music_search'")
+            ).first()
+            if not exists:
+                try:
+                    for statement in SEARCH_SCHEMA:
+                        connection.execute(text(statement))
+                except OperationalError as e:
+                    print(f"⚠️ Recherche approchée indisponible (FTS5 trigram requis): {e}")
+                    return
+                print("🔎 Index de recherche créé")
+            for statement in SEARCH_TRIGGERS:
+                connection.execute(text(statement))
+        self.available = True
+
+    def select_terms(self, session: Session, grams: List[str]) -> List[str]:
+        """Trigrammes à chercher : les plus rares, dans la limite de SEARCH_MAX_POSTINGS documents"""
+        vocab = table("music_search_vocab", column("term"), column("doc"))
+        frequencies = dict(session.exec(
+            select(vocab.c.term, vocab.c.doc).where(vocab.c.term.in_(grams))
+        ).all())
+
+        terms, postings = [], 0
+        for gram in sorted((gram for gram in grams if gram in frequencies), key=frequencies.get):
+            if terms and (postings + frequencies[gram] > SEARCH_MAX_POSTINGS or len(terms) >= SEARCH_MAX_TERMS):
+                break
+            terms.append(gram)
+            postings += frequencies[gram]
+        return terms
+
+    def search_ids(self, session: Session, query: str, conditions: Sequence, limit: int) -> Optional[List[int]]:
+        """Identifiants des musiques les plus proches de `query` respectant `conditions`.
+
+        None si la recherche approchée ne s'applique pas (index absent, requête de
+        moins de 3 caractères) : l'appelant revient alors à une recherche ilike.
+        """
+        indexed = " ".join(query.casefold().split())
+        normalized = normalize_text(query)
+        if not self.available or len(indexed) < 3 or len(normalized) < 3:
+            return None
+
+        with latency_budget(session, self.budget_ms):
+            terms = self.select_terms(session, trigrams(indexed))
+            if not terms:
+                return []
+            # Nombre de trigrammes trouvés par document (une liste de documents par trigramme)
+            postings = union_all(*(
+                select(search_table.c.rowid).where(
+                    text(f"music_search MATCH :term_{index}").bindparams(**{f"term_{index}": match_expression([term])})
+                )
+                for index, term in enumerate(terms)
+            )).subquery()
+            hits = func.count().label("hits")
+            matches = select(postings.c.rowid, hits).group_by(postings.c.rowid).subquery()
+            rows = session.exec(
+                select(Music.id, Music.title, Music.description, User.username, User.full_name)
+                .select_from(matches)
+                .join(Music, Music.id == matches.c.rowid)
+                .join(User, User.id == Music.artist_id)
+                .where(*conditions)
+                .order_by(desc(matches.c.hits))
+                .limit(min(max(SEARCH_CANDIDATES, limit), SEARCH_MAX_CANDIDATES))
+            ).all()
+
+        query_grams = set(trigrams(normalized))
+        scored: List[Tuple[float, int, int]] = []
+        for position, (music_id, title, description, username, full_name) in enumerate(rows):
+            score = max(
+                similarity(query_grams, title),
+                similarity(query_grams, f"{full_name or ''} {username}"),
+                DESCRIPTION_WEIGHT * similarity(query_grams, description),
+            )
+            if score >= SEARCH_MIN_SIMILARITY:
+                scored.append((-score, position, music_id))
+        scored.sort()
+        return [music_id for _, _, music_id in scored[:limit]]
+
+music_search = MusicSearch()
@@ -0,0 +1,78 @@
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+from functools import lru_cache
+from money import from_cents
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Type
+
+# ===== SÉRIALISATION RAPIDE =====
+
+class JSONBytesResponse(Response):
+    """Réponse JSON déjà sérialisée.
+
+    FastAPI renvoie tel quel un objet Response : le `response_model` de la route
+    sert uniquement à la documentation et n'est pas revalidé.
+    """
+    media_type = "application/json"
+
+@lru_cache(maxsize=None)
+def list_adapter(model: Type) -> TypeAdapter:
+    """TypeAdapter compilé une seule fois par modèle de réponse"""
+    return TypeAdapter(List[model])
+
+def dump_list(model: Type, rows: Iterable[Any]) -> bytes:
+    """Valider des lignes ORM (from_attributes) et les sérialiser en JSON en une passe"""
+    adapter = list_adapter(model)
+    return adapter.dump_json(adapter.validate_python(list(rows), from_attributes=True))
+
+def json_list_response(model: Type, rows: Iterable[Any]) -> JSONBytesResponse:
+    return JSONBytesResponse(dump_list(model, rows))
+
+# ===== PROJECTIONS =====
+
+class Projection:
+    """Colonnes SQL d'un modèle de réponse, lues en tuples sans entités ORM.
+
+    Chaque champ de `model` présent dans la table de `entity` est sélectionné
+    (étiqueté `prefix + nom`) ; un montant absent de la table est lu dans sa
+    colonne en centimes (`price` -> `price_cents`). Les champs imbriqués
+    (ex: MusicRead.artist) sont décrits par une autre Projection, jointe par
+    l'appelant. Aucune instance n'est construite ni suivie par la session.
+    """
+
+    def __init__(self, model: Type, entity: Any, prefix: str = "", **nested: "Projection"):
+        table_columns = entity.__table__.columns
+        self.fields: List[str] = []
+        self.cents: List[str] = []
+        self.columns: List[Any] = []
+        for name in model.model_fields:
+            if name in nested:
+                continue
+            if name in table_columns:
+                column = getattr(entity, name)
+            elif f"{name}_cents" in table_columns:
+                column = getattr(entity, f"{name}_cents")
+                self.cents.append(name)
+            else:
+                continue
+            self.fields.append(name)
+            self.columns.append(column.label(prefix + name))
+        self.nested = nested
+        for projection in nested.values():
+            self.columns.extend(projection.columns)
+
+    def to_dict(self, row: Sequence[Any], start: int = 0) -> Optional[Dict[str, Any]]:
+        """Champs de la ligne à partir de la colonne `start` (None si l'identifiant est nul)"""
+        end = start + len(self.fields)
+        value = dict(zip(self.fields, row[start:end]))
+        if "id" in value and value["id"] is None:
+            return None  # Jointure externe sans correspondance
+        for name in self.cents:
+            value[name] = from_cents(value[name])
+        for name, projection in self.nested.items():
+            value[name] = projection.to_dict(row, end)
+            end += len(projection.columns)
+        return value
+
+    def dump(self, model: Type, rows: Iterable[Sequence[Any]]) -> bytes:
+        """Sérialiser des lignes de `select(*projection.columns)` en JSON"""
+        return dump_list(model, [self.to_dict(row) for row in rows])
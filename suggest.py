@@ -0,0 +1,339 @@
+from sqlmodel import Session, select, func, desc
+from database import engine
+from models import Music, MusicStatus, User, Genre
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import heapq
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+
+# Configuration
+SUGGEST_MAX_TRACKS = int(os.getenv("SUGGEST_MAX_TRACKS", "200000"))  # Les plus écoutés (borne mémoire)
+SUGGEST_REFRESH_INTERVAL_SECONDS = 600  # Popularité et modifications des autres workers
+SUGGEST_MAX_LIMIT = 20
+SUGGEST_CACHE_ENTRIES = 10000           # Classements mémorisés par préfixe
+SUGGEST_SCAN_KEYS = 1000                # Au-delà (préfixe « large ») : classement précalculé à la construction
+BROAD_RANKED = 2 * SUGGEST_MAX_LIMIT    # Marge des classements précalculés (retraits sans recalcul)
+MAX_KEY_LENGTH = 32
+MAX_KEYS_PER_TEXT = 3                   # Le texte entier puis ses suffixes à partir du 2e et 3e mot
+
+# Types d'entrée (référence = identifiant * 4 + type)
+TRACK, ARTIST, GENRE = 0, 1, 2
+KINDS = ("track", "artist", "genre")
+
+def normalize_text(text: Optional[str]) -> str:
+    """Minuscules sans accents, ponctuation remplacée par des espaces"""
+    if not text:
+        return ""
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", text.casefold()).split())
+
+def text_keys(text: Optional[str]) -> List[str]:
+    """Clés indexées : le texte puis ses fins de phrase ("daft punk" -> "daft punk", "punk")"""
+    words = normalize_text(text).split()
+    keys = []
+    for start in range(min(len(words), MAX_KEYS_PER_TEXT)):
+        key = " ".join(words[start:])[:MAX_KEY_LENGTH]
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+def entry_ref(kind: int, entry_id: int) -> int:
+    return entry_id * 4 + kind
+
+class Entry:
+    __slots__ = ("label", "detail", "weight", "keys", "first_key")
+
+    def __init__(self, label: str, detail: Optional[str], weight: int, texts: Tuple[str, ...]):
+        self.label = label
+        self.detail = detail
+        self.weight = weight
+        keys = text_keys(texts[0])
+        self.first_key = keys[0] if keys else ""
+        for text in texts[1:]:
+            keys.extend(key for key in text_keys(text) if key not in keys)
+        self.keys = tuple(keys)
+
+def base_score(entry: Entry, key: str) -> float:
+    # Popularité ; début du libellé > début d'un mot
+    score = math.log1p(entry.weight)
+    if key == entry.first_key:
+        score += 2.0
+    return score
+
+def match_score(entry: Entry, key: str, prefix: str) -> float:
+    # Correspondance exacte en bonus
+    return base_score(entry, key) + (1.0 if key == prefix else 0.0)
+
+def prefix_range(keys: List[str], prefix: str, lo: int = 0, hi: Optional[int] = None) -> Tuple[int, int]:
+    """Positions [début, fin) des clés commençant par `prefix` (clés triées)"""
+    hi = len(keys) if hi is None else hi
+    start = bisect_left(keys, prefix, lo, hi)
+    return start, bisect_left(keys, prefix + "\U0010ffff", start, hi)
+
+def broad_prefix_rankings(keys: List[str], refs: array, entries: Dict[int, Entry],
+                          scan_keys: int = SUGGEST_SCAN_KEYS) -> Dict[str, List[Tuple[float, int]]]:
+    """Classements des préfixes larges (plus de `scan_keys` clés), en un seul parcours des clés.
+
+    Un préfixe large fusionne les meilleurs de ses sous-préfixes (scores sans bonus
+    d'égalité) et de ses propres clés ; le bonus d'égalité n'est ajouté qu'à ces dernières.
+    """
+    rankings: Dict[str, List[Tuple[float, int]]] = {}
+
+    def keep(scores: Dict[int, float], ref: int, score: float) -> None:
+        if score > scores.get(ref, -1.0):
+            scores[ref] = score
+
+    def visit(prefix: str, lo: int, hi: int) -> List[Tuple[float, int]]:
+        scores: Dict[int, float] = {}
+        if hi - lo <= scan_keys:
+            for position in range(lo, hi):
+                keep(scores, refs[position], base_score(entries[refs[position]], keys[position]))
+            return heapq.nlargest(BROAD_RANKED, ((score, ref) for ref, score in scores.items()))
+
+        depth, position = len(prefix), lo
+        exact: Dict[int, float] = {}
+        while position < hi and len(keys[position]) == depth:
+            keep(exact, refs[position], base_score(entries[refs[position]], keys[position]))
+            position += 1
+        scores.update(exact)
+        while position < hi:
+            child = keys[position][:depth + 1]
+            _, end = prefix_range(keys, child, position, hi)
+            for score, ref in visit(child, position, end):
+                keep(scores, ref, score)
+            position = end
+
+        if prefix:
+            final = dict(scores)
+            for ref, score in exact.items():
+                keep(final, ref, score + 1.0)
+            rankings[prefix] = heapq.nlargest(BROAD_RANKED, ((score, ref) for ref, score in final.items()))
+        return heapq.nlargest(BROAD_RANKED, ((score, ref) for ref, score in scores.items()))
+
+    visit("", 0, len(keys))
+    return rankings
+
+# ===== INDEX =====
+
+class SuggestIndex:
+    """Autocomplétion par préfixe : tableau trié de clés normalisées + recherche dichotomique.
+
+    Indexe les titres publiés (les `max_tracks` plus écoutés), les artistes (nom
+    d'utilisateur et nom complet) et les genres. Le classement combine la
+    popularité (`play_count`) et la position de la correspondance ; il est
+    mémorisé par préfixe et tenu à jour lors des modifications.
+
+    Les préfixes larges (plus de SUGGEST_SCAN_KEYS clés) sont classés à la
+    construction ; les autres en parcourant leurs clés à la première demande.
+    Une recherche examine ainsi au plus SUGGEST_SCAN_KEYS clés, sauf pour un
+    préfixe devenu large depuis la dernière construction.
+    """
+
+    def __init__(self, max_tracks: int = SUGGEST_MAX_TRACKS):
+        self.max_tracks = max_tracks
+        self._keys: List[str] = []
+        self._refs = array("q")
+        self._entries: Dict[int, Entry] = {}
+        self._ranked: "OrderedDict[str, List[Tuple[float, int]]]" = OrderedDict()
+        self._broad: Dict[str, List[Tuple[float, int]]] = {}
+        self._lock = threading.Lock()
+        self.built_at: Optional[datetime] = None
+        self.build_seconds = 0.0
+
+    # ----- Construction -----
+
+    def build(self) -> int:
+        """Reconstruire l'index depuis la base (au démarrage puis périodiquement)"""
+        started = time.perf_counter()
+        published = Music.status == MusicStatus.PUBLISHED
+        entries: Dict[int, Entry] = {}
+        with Session(engine) as session:
+            tracks = session.exec(
+                select(Music.id, Music.title, Music.play_count, User.username, User.full_name)
+                .join(User, User.id == Music.artist_id)
+                .where(published)
+                .order_by(desc(Music.play_count))
+                .limit(self.max_tracks)
+            ).all()
+            artists = session.exec(
+                select(User.id, User.username, User.full_name, func.sum(Music.play_count))
+                .join(Music, Music.artist_id == User.id)
+                .where(published)
+                .group_by(User.id, User.username, User.full_name)
+            ).all()
+            genres = session.exec(
+                select(Genre.id, Genre.name, func.sum(Music.play_count))
+                .join(Music, Music.genre_id == Genre.id)
+                .where(published)
+                .group_by(Genre.id, Genre.name)
+            ).all()
+
+        for music_id, title, play_count, username, full_name in tracks:
+            entries[entry_ref(TRACK, music_id)] = Entry(title, full_name or username, play_count or 0, (title,))
+        for artist_id, username, full_name, play_count in artists:
+            entries[entry_ref(ARTIST, artist_id)] = Entry(
+                full_name or username, None, play_count or 0, (full_name or username, username)
+            )
+        for genre_id, name, play_count in genres:
+            entries[entry_ref(GENRE, genre_id)] = Entry(name, None, play_count or 0, (name,))
+
+        self.load_entries(entries)
+        self.build_seconds = time.perf_counter() - started
+        return len(entries)
+
+    def load_entries(self, entries: Dict[int, Entry]) -> None:
+        """Remplacer le contenu de l'index (clés triées et classements des préfixes larges)"""
+        pairs = sorted((key, ref) for ref, entry in entries.items() for key in entry.keys)
+        keys = [key for key, _ in pairs]
+        refs = array("q", (ref for _, ref in pairs))
+        broad = broad_prefix_rankings(keys, refs, entries)
+
+        with self._lock:
+            self._keys, self._refs, self._entries, self._broad = keys, refs, entries, broad
+            self._ranked = OrderedDict()
+            self.built_at = datetime.utcnow()
+
+    # ----- Mises à jour incrémentales -----
+
+    def index_music(self, music: Music) -> None:
+        """Après publication / modification : (ré)indexer le titre, son artiste et son genre"""
+        if music.status != MusicStatus.PUBLISHED:
+            self.remove_music(music.id)
+            return
+
+        artist = music.artist
+        artist_name = artist.full_name or artist.username
+        with self._lock:
+            previous = self._entries.get(entry_ref(TRACK, music.id))
+            weight = max(music.play_count or 0, previous.weight if previous else 0)
+            self._put(entry_ref(TRACK, music.id), Entry(music.title, artist_name, weight, (music.title,)))
+            if entry_ref(ARTIST, artist.id) not in self._entries:
+                self._put(entry_ref(ARTIST, artist.id), Entry(artist_name, None, weight, (artist_name, artist.username)))
+            if music.genre_id and entry_ref(GENRE, music.genre_id) not in self._entries:
+                self._put(entry_ref(GENRE, music.genre_id), Entry(music.genre, None, weight, (music.genre,)))
+
+    def index_artist(self, artist: User) -> None:
+        """Après modification du profil : renommer l'artiste s'il est indexé"""
+        artist_name = artist.full_name or artist.username
+        with self._lock:
+            previous = self._entries.get(entry_ref(ARTIST, artist.id))
+            if previous is not None:
+                self._put(entry_ref(ARTIST, artist.id), Entry(artist_name, None, previous.weight, (artist_name, artist.username)))
+
+    def remove_music(self, music_id: int) -> None:
+        with self._lock:
+            self._remove(entry_ref(TRACK, music_id))
+
+    def _put(self, ref: int, entry: Entry) -> None:
+        self._remove(ref)
+        self._entries[ref] = entry
+        for key in entry.keys:
+            position = bisect_left(self._keys, key)
+            self._keys.insert(position, key)
+            self._refs.insert(position, ref)
+            self._offer(ref, entry, key)
+
+    def _remove(self, ref: int) -> None:
+        entry = self._entries.pop(ref, None)
+        if entry is None:
+            return
+        for key in entry.keys:
+            position = bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key:
+                if self._refs[position] == ref:
+                    del self._keys[position]
+                    del self._refs[position]
+                    break
+                position += 1
+        self._withdraw(ref, entry.keys)
+
+    # Les classements mémorisés sont tenus à jour plutôt que recalculés
+
+    def _offer(self, ref: int, entry: Entry, key: str) -> None:
+        for end in range(1, len(key) + 1):
+            prefix = key[:end]
+            for rankings, size in ((self._broad, BROAD_RANKED), (self._ranked, SUGGEST_MAX_LIMIT)):
+                ranked = rankings.get(prefix)
+                if ranked is None:
+                    continue
+                score = match_score(entry, key, prefix)
+                previous = next((value for value, other in ranked if other == ref), None)
+                if previous is not None and previous >= score:
+                    continue
+                ranked = [(value, other) for value, other in ranked if other != ref]
+                ranked.append((score, ref))
+                ranked.sort(reverse=True)
+                rankings[prefix] = ranked[:size]
+
+    def _withdraw(self, ref: int, keys) -> None:
+        for key in keys:
+            for end in range(1, len(key) + 1):
+                prefix = key[:end]
+                for rankings, size in ((self._broad, BROAD_RANKED), (self._ranked, SUGGEST_MAX_LIMIT)):
+                    ranked = rankings.get(prefix)
+                    if ranked is None or all(other != ref for _, other in ranked):
+                        continue
+                    remaining = [(value, other) for value, other in ranked if other != ref]
+                    if len(ranked) < size or len(remaining) >= SUGGEST_MAX_LIMIT:
+                        # Classement complet, ou marge suffisante : il suffit de retirer l'entrée
+                        rankings[prefix] = remaining
+                    else:
+                        # Une entrée non classée doit remonter : recalcul à la prochaine demande
+                        del rankings[prefix]
+
+    # ----- Recherche -----
+
+    def suggest(self, query: str, limit: int = 8) -> List[Dict]:
+        prefix = normalize_text(query)[:MAX_KEY_LENGTH]
+        if not prefix:
+            return []
+
+        with self._lock:
+            ranked = self._broad.get(prefix)
+            if ranked is None:
+                ranked = self._ranked.get(prefix)
+                if ranked is None:
+                    ranked = self._ranked[prefix] = self._scan(prefix)
+                    if len(self._ranked) > SUGGEST_CACHE_ENTRIES:
+                        self._ranked.popitem(last=False)
+                else:
+                    self._ranked.move_to_end(prefix)
+            return [self._suggestion(ref) for _, ref in ranked[:limit]]
+
+    def _scan(self, prefix: str) -> List[Tuple[float, int]]:
+        """Préfixe étroit (ou devenu large depuis la construction) : parcours de ses clés"""
+        scores: Dict[int, float] = {}
+        keys, refs = self._keys, self._refs
+        start, end = prefix_range(keys, prefix)
+        for position in range(start, end):
+            ref = refs[position]
+            score = match_score(self._entries[ref], keys[position], prefix)
+            if score > scores.get(ref, -1.0):
+                scores[ref] = score
+        return heapq.nlargest(SUGGEST_MAX_LIMIT, ((score, ref) for ref, score in scores.items()))
+
+    def _suggestion(self, ref: int) -> Dict:
+        entry = self._entries[ref]
+        return {"type": KINDS[ref % 4], "id": ref // 4, "label": entry.label, "detail": entry.detail}
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "keys": len(self._keys),
+            "cached_prefixes": len(self._ranked),
+            "broad_prefixes": len(self._broad),
+            "built_at": self.built_at.isoformat() if self.built_at else None,
+            "build_seconds": round(self.build_seconds, 3),
+        }
+
+suggest_index = SuggestIndex()
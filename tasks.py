@@ -0,0 +1,145 @@
+from sqlmodel import Session, select, update, delete, and_
+from starlette.concurrency import run_in_threadpool
+from database import engine
+from models import PaymentCode, PaymentStatus, Purchase
+from monitoring import system_sampler, SYSTEM_SAMPLE_INTERVAL_SECONDS
+from recommendations import refresh_recommendations
+from charts import chart_book, CHART_SNAPSHOT_INTERVAL_SECONDS
+from suggest import suggest_index, SUGGEST_REFRESH_INTERVAL_SECONDS
+from datetime import datetime, timedelta
+from typing import Dict
+import asyncio
+
+# Vérification de la fraîcheur de la table des similarités
+RECOMMENDATION_CHECK_INTERVAL_SECONDS = 300
+
+# Configuration du balayage des codes de paiement
+PAYMENT_CODE_SWEEP_INTERVAL_SECONDS = 60
+PAYMENT_CODE_SWEEP_BATCH_SIZE = 500
+PAYMENT_CODE_RETENTION = timedelta(days=30)
+
+# ===== CODES DE PAIEMENT =====
+
+def expire_payment_codes(batch_size: int = PAYMENT_CODE_SWEEP_BATCH_SIZE) -> int:
+    """Passer les codes non utilisés arrivés à échéance au statut EXPIRED, par lots.
+
+    Chaque lot est une transaction courte pour ne pas bloquer les écritures.
+    """
+    total = 0
+    while True:
+        now = datetime.utcnow()
+        with Session(engine) as session:
+            batch = select(PaymentCode.id).where(
+                and_(
+                    PaymentCode.is_used == False,
+                    PaymentCode.expires_at <= now,
+                    PaymentCode.status == PaymentStatus.PENDING
+                )
+            ).limit(batch_size)
+            result = session.exec(
+                update(PaymentCode)
+                .where(PaymentCode.id.in_(batch.scalar_subquery()))
+                .values(status=PaymentStatus.EXPIRED)
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+        
+        total += result.rowcount or 0
+        if (result.rowcount or 0) < batch_size:
+            return total
+
+def purge_old_payment_codes(
+    retention: timedelta = PAYMENT_CODE_RETENTION,
+    batch_size: int = PAYMENT_CODE_SWEEP_BATCH_SIZE
+) -> int:
+    """Supprimer les codes jamais utilisés expirés depuis plus que la période de rétention.
+
+    Les codes utilisés sont conservés : ils sont référencés par les achats.
+    """
+    total = 0
+    while True:
+        cutoff = datetime.utcnow() - retention
+        with Session(engine) as session:
+            batch = select(PaymentCode.id).where(
+                and_(
+                    PaymentCode.is_used == False,
+                    PaymentCode.expires_at <= cutoff,
+                    ~PaymentCode.id.in_(
+                        select(Purchase.payment_code_id).where(Purchase.payment_code_id.isnot(None))
+                    )
+                )
+            ).limit(batch_size)
+            result = session.exec(
+                delete(PaymentCode)
+                .where(PaymentCode.id.in_(batch.scalar_subquery()))
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+        
+        total += result.rowcount or 0
+        if (result.rowcount or 0) < batch_size:
+            return total
+
+def sweep_payment_codes() -> Dict[str, int]:
+    """Un passage complet du balayage"""
+    return {
+        "expired": expire_payment_codes(),
+        "purged": purge_old_payment_codes()
+    }
+
+async def run_payment_code_sweeper(interval_seconds: int = PAYMENT_CODE_SWEEP_INTERVAL_SECONDS):
+    """Boucle de fond lancée au démarrage de l'application"""
+    while True:
+        try:
+            result = await run_in_threadpool(sweep_payment_codes)
+            if result["expired"] or result["purged"]:
+                print(f"🧹 Codes de paiement: {result['expired']} expirés, {result['purged']} purgés")
+        except Exception as e:
+            print(f"❌ Erreur lors du balayage des codes de paiement: {e}")
+        await asyncio.sleep(interval_seconds)
+
+# ===== ÉCHANTILLONNAGE SYSTÈME =====
+
+async def run_system_sampler(interval_seconds: int = SYSTEM_SAMPLE_INTERVAL_SECONDS):
+    """Rafraîchir CPU / mémoire / disque / base pour /system-info, /storage et /health"""
+    while True:
+        try:
+            await run_in_threadpool(system_sampler.sample)
+        except Exception as e:
+            print(f"❌ Erreur lors de l'échantillonnage système: {e}")
+        await asyncio.sleep(interval_seconds)
+
+# ===== RECOMMANDATIONS =====
+
+async def run_recommendation_builder(interval_seconds: int = RECOMMENDATION_CHECK_INTERVAL_SECONDS):
+    """Recalculer les similarités quand elles sont trop anciennes (ou recharger celles d'un autre worker)"""
+    while True:
+        try:
+            result = await run_in_threadpool(refresh_recommendations)
+            if "tracks" in result:
+                print(f"🎯 Similarités recalculées: {result['tracks']} morceaux en {result['seconds']} s")
+        except Exception as e:
+            print(f"❌ Erreur lors du calcul des recommandations: {e}")
+        await asyncio.sleep(interval_seconds)
+
+# ===== CLASSEMENTS =====
+
+async def run_chart_snapshots(interval_seconds: int = CHART_SNAPSHOT_INTERVAL_SECONDS):
+    """Enregistrer les scores de tendance et recharger ceux des autres workers"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_in_threadpool(chart_book.snapshot)
+        except Exception as e:
+            print(f"❌ Erreur lors de l'enregistrement des classements: {e}")
+
+# ===== AUTOCOMPLÉTION =====
+
+async def run_suggest_refresh(interval_seconds: int = SUGGEST_REFRESH_INTERVAL_SECONDS):
+    """Reconstruire l'index d'autocomplétion (popularité, modifications des autres workers)"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_in_threadpool(suggest_index.build)
+        except Exception as e:
+            print(f"❌ Erreur lors de la reconstruction de l'autocomplétion: {e}")
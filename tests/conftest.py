@@ -0,0 +1,31 @@
+"""Configuration des tests : base SQLite et uploads dans un répertoire temporaire.
+
+DATABASE_URL et les dossiers d'upload sont relatifs au répertoire courant :
+on s'y place avant d'importer l'application.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="evazo-tests-"))
+# Budgets de requêtes SQL lus dans l'en-tête X-Query-Count
+os.environ["QUERY_DEBUG_HEADERS"] = "1"
+
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from ratelimit import rate_limiter
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture(scope="session", autouse=True)
+def no_rate_limit():
+    """Limiteur coupé par défaut (les tests s'inscrivent et se connectent en rafale)"""
+    enabled = rate_limiter.enabled
+    rate_limiter.enabled = False
+    yield
+    rate_limiter.enabled = enabled
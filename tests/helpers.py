@@ -0,0 +1,89 @@
+"""Outils partagés par les tests (utilisateurs, musiques, concurrence, budgets SQL)"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from sqlmodel import Session, select
+from database import QueryStats, current_query_stats, engine
+from models import User, UserRole
+from typing import Callable, Dict, Iterator, List
+import itertools
+import threading
+
+_names = itertools.count(1)
+
+def create_user(client, role: str = "client") -> str:
+    """Inscrire un utilisateur, retourne son nom"""
+    name = f"{role}{next(_names)}"
+    response = client.post("/api/register", json={
+        "name": name, "email": f"{name}@example.com", "password": "secret", "role": role
+    })
+    assert response.status_code == 200, response.text
+    return name
+
+def login(client, name: str) -> Dict[str, str]:
+    response = client.post("/api/login", data={"username": f"{name}@example.com", "password": "secret"})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def register(client, role: str = "client") -> Dict[str, str]:
+    """Inscrire un utilisateur et retourner ses en-têtes d'authentification"""
+    return login(client, create_user(client, role))
+
+def register_admin(client) -> Dict[str, str]:
+    name = create_user(client)
+    with Session(engine) as session:
+        user = session.exec(select(User).where(User.username == name)).one()
+        user.role = UserRole.ADMIN
+        session.add(user)
+        session.commit()
+    return login(client, name)
+
+def upload_music(client, artist: Dict[str, str], title: str = "Titre", is_free: bool = False,
+                 price: str = "2.50", size: int = 5000, genre: str = "Rock") -> int:
+    """Uploader et publier une musique, retourne son id"""
+    response = client.post(
+        "/api/artiste/musiques", headers=artist,
+        data={"title": title, "genre": genre, "is_free": str(is_free).lower(), "price": price, "description": title},
+        files={"audio_file": ("piste.mp3", b"\x01" * size, "audio/mpeg")}
+    )
+    assert response.status_code == 200, response.text
+    music_id = response.json()["id"]
+    response = client.post(f"/api/artiste/musiques/{music_id}/publier", headers=artist)
+    assert response.status_code == 200, response.text
+    return music_id
+
+def payment_code(client, artist: Dict[str, str], music_id: int) -> str:
+    response = client.post(f"/api/artiste/musiques/{music_id}/generate-code", headers=artist)
+    assert response.status_code == 200, response.text
+    return response.json()["code"]
+
+def race(calls: List[Callable]) -> List:
+    """Lancer les appels en même temps (une barrière libère tous les threads d'un coup)"""
+    barrier = threading.Barrier(len(calls))
+
+    def run(call):
+        barrier.wait()
+        return call()
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        return list(executor.map(run, calls))
+
+# ===== BUDGETS DE REQUÊTES SQL =====
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """Compter les requêtes SQL exécutées dans le bloc (appel direct des fonctions)"""
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+
+def assert_max_queries(response, max_queries: int) -> None:
+    """Vérifier le budget de requêtes SQL d'une réponse HTTP (en-tête X-Query-Count)"""
+    assert response.status_code == 200, response.text
+    count = int(response.headers["x-query-count"])
+    assert count <= max_queries, (
+        f"{response.request.method} {response.request.url.path} : "
+        f"{count} requêtes SQL (budget {max_queries})"
+    )
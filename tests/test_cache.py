@@ -0,0 +1,29 @@
+"""Cache du catalogue"""
+from concurrent.futures import ThreadPoolExecutor
+from cache import CatalogCache, InProcessBackend
+from helpers import register, upload_music
+
+def test_counters_are_exact_under_concurrency():
+    cache = CatalogCache(InProcessBackend())
+    calls_per_thread, threads = 2000, 8
+
+    def work(thread: int) -> None:
+        for index in range(calls_per_thread):
+            cache.get_or_load("test", {"page": index % 50, "thread": thread % 2}, lambda: [index])
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(work, range(threads)))
+
+    stats = cache.stats()
+    assert stats["hits"] + stats["misses"] == calls_per_thread * threads
+
+def test_artist_rename_refreshes_cached_pages(client):
+    artist = register(client, "artiste")
+    buyer = register(client)
+    upload_music(client, artist, "Renommage")
+    artist_id = client.get("/api/artiste/me", headers=artist).json()["id"]
+    page = f"/api/client/musiques?artist_id={artist_id}"
+    assert client.get(page, headers=buyer).json()[0]["artist"]["full_name"] != "Nouveau Nom"
+
+    assert client.put("/api/artiste/me", headers=artist, json={"full_name": "Nouveau Nom"}).status_code == 200
+    assert client.get(page, headers=buyer).json()[0]["artist"]["full_name"] == "Nouveau Nom"
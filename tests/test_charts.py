@@ -0,0 +1,20 @@
+"""Classements de tendance"""
+from pathlib import Path
+import subprocess
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def test_decay_function_exists_without_importing_charts(tmp_path):
+    # Connexion ouverte avant tout import de charts.py (ex: benchmarks/loadtest.py)
+    script = (
+        "import database\n"
+        "with database.engine.connect() as connection:\n"
+        "    print(connection.exec_driver_sql(\"SELECT chart_decay('2024-01-01 00:00:00', '2024-01-01 06:00:00', 21600)\").scalar())\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True,
+        env={"PYTHONPATH": str(ROOT)}
+    )
+    assert result.returncode == 0, result.stderr
+    assert float(result.stdout) == 0.5
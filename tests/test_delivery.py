@@ -0,0 +1,20 @@
+"""Livraison des fichiers : téléchargements complets et reprises (Range)"""
+from helpers import register, upload_music
+
+def test_download_miss_and_range_resume(client):
+    artist = register(client, "artiste")
+    buyer = register(client)
+    music_id = upload_music(client, artist, "Livraison", is_free=True, size=200_000)
+
+    # Premier téléchargement : absent du cache, lu par blocs sur les threads de livraison
+    response = client.get(f"/api/client/download/{music_id}", headers=buyer)
+    assert response.status_code == 200
+    assert response.content == b"\x01" * 200_000
+    assert response.headers["content-length"] == "200000"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert 'filename="Livraison.mp3"' in response.headers["content-disposition"]
+
+    # Reprise : FileResponse répond 206 avec la plage demandée
+    response = client.get(f"/api/client/download/{music_id}", headers={**buyer, "Range": "bytes=100000-"})
+    assert response.status_code == 206
+    assert len(response.content) == 100_000
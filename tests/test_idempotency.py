@@ -0,0 +1,64 @@
+"""Rejeu des requêtes réessayées (Idempotency-Key)"""
+from idempotency import IdempotencyStore
+from helpers import payment_code, register, upload_music
+import uuid
+
+def test_concurrent_save_keeps_first_response(client):
+    # Deux workers ont traité la même clé : le second enregistrement ne lève pas d'erreur
+    first, second = IdempotencyStore(), IdempotencyStore()
+    key = uuid.uuid4().hex
+    first.save(key, 200, "application/json", b'{"id": 1}')
+    stored = second.save(key, 400, "application/json", b'{"detail": "doublon"}')
+    assert stored[:3] == (200, "application/json", b'{"id": 1}')
+    assert second.get(key)[:3] == (200, "application/json", b'{"id": 1}')
+
+def refreshed(headers):
+    """Nouveau jeton pour le même utilisateur (comme après un renouvellement)"""
+    from jose import jwt
+    from routers.auth import ALGORITHM, SECRET_KEY, create_access_token
+    from datetime import timedelta
+    payload = jwt.decode(headers["Authorization"][7:], SECRET_KEY, algorithms=[ALGORITHM])
+    token = create_access_token({"user_id": int(payload["sub"])}, timedelta(minutes=5))
+    assert token != headers["Authorization"][7:]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_retry_after_token_refresh_is_replayed(client):
+    artist = register(client, "artiste")
+    music_id = upload_music(client, artist, "Rejeu")
+    buyer = register(client)
+    body = {"music_id": music_id, "payment_code": payment_code(client, artist, music_id)}
+    key = {"Idempotency-Key": uuid.uuid4().hex}
+
+    first = client.post("/api/client/purchase", headers={**buyer, **key}, json=body)
+    retry = client.post("/api/client/purchase", headers={**refreshed(buyer), **key}, json=body)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers.get("idempotent-replayed") == "true"
+    assert retry.json()["id"] == first.json()["id"]
+
+def test_same_key_with_other_payload_is_rejected(client):
+    artist = register(client, "artiste")
+    first_music, other_music = upload_music(client, artist, "Un"), upload_music(client, artist, "Deux")
+    buyer = register(client)
+    key = {"Idempotency-Key": uuid.uuid4().hex}
+    body = {"music_id": first_music, "payment_code": payment_code(client, artist, first_music)}
+    assert client.post("/api/client/purchase", headers={**buyer, **key}, json=body).status_code == 200
+
+    other = {"music_id": other_music, "payment_code": payment_code(client, artist, other_music)}
+    response = client.post("/api/client/purchase", headers={**buyer, **key}, json=other)
+
+    assert response.status_code == 422
+    assert "idempotent-replayed" not in response.headers
+
+def test_upload_retry_is_replayed(client):
+    artist = register(client, "artiste")
+    key = {"Idempotency-Key": uuid.uuid4().hex}
+    upload = lambda: client.post(
+        "/api/artiste/musiques", headers={**artist, **key},
+        data={"title": "Upload", "genre": "Rock", "is_free": "true", "price": "0", "description": "d"},
+        files={"audio_file": ("piste.mp3", b"\x01" * 5000, "audio/mpeg")}
+    )
+    first, retry = upload(), upload()
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers.get("idempotent-replayed") == "true"
+    assert retry.json()["id"] == first.json()["id"]
@@ -0,0 +1,17 @@
+"""Profilage à la demande"""
+from helpers import register_admin
+
+def test_client_request_id_does_not_replace_profiles(client):
+    admin = register_admin(client)
+    headers = {**admin, "X-Profile": "1", "X-Request-Id": "meme-id"}
+    first = client.get("/api/admin/users", headers=headers)
+    second = client.get("/api/admin/genres", headers=headers)
+    assert first.status_code == second.status_code == 200
+
+    first_id, second_id = first.headers["x-profile-id"], second.headers["x-profile-id"]
+    assert first_id != second_id
+    for profile_id, path in ((first_id, "/api/admin/users"), (second_id, "/api/admin/genres")):
+        profile = client.get(f"/api/admin/profiles/{profile_id}", headers=admin).json()
+        assert profile["path"] == path
+        assert profile["request_id"] == "meme-id"
+    assert client.get("/api/admin/profiles/meme-id", headers=admin).status_code == 404
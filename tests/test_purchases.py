@@ -0,0 +1,48 @@
+"""Achats et téléchargements concurrents : pas de double dépense"""
+from sqlmodel import Session, select
+from database import engine
+from delivery import delivery_pool
+from models import Purchase, PaymentCode
+from helpers import payment_code, race, register, upload_music
+
+# Sous la taille du pool de connexions SQLAlchemy (5 + 10 de débordement)
+CONCURRENCY = 8
+
+def test_payment_code_is_redeemed_once(client):
+    artist = register(client, "artiste")
+    music_id = upload_music(client, artist, "Code unique")
+    code = payment_code(client, artist, music_id)
+    clients = [register(client) for _ in range(CONCURRENCY)]
+
+    responses = race([
+        lambda headers=headers: client.post(
+            "/api/client/purchase", headers=headers, json={"music_id": music_id, "payment_code": code}
+        )
+        for headers in clients
+    ])
+
+    assert sorted(response.status_code for response in responses) == [200] + [400] * (CONCURRENCY - 1)
+    with Session(engine) as session:
+        assert len(session.exec(select(Purchase).where(Purchase.music_id == music_id)).all()) == 1
+        assert session.exec(select(PaymentCode).where(PaymentCode.code == code)).one().is_used
+
+def test_download_quota_is_not_exceeded(client, monkeypatch):
+    artist = register(client, "artiste")
+    music_id = upload_music(client, artist, "Quota")
+    buyer = register(client)
+    code = payment_code(client, artist, music_id)
+    response = client.post("/api/client/purchase", headers=buyer, json={"music_id": music_id, "payment_code": code})
+    assert response.status_code == 200, response.text
+    # Toutes les demandes passent le plafond de livraison par utilisateur
+    monkeypatch.setattr(delivery_pool, "per_user", CONCURRENCY)
+
+    responses = race([
+        lambda: client.get(f"/api/client/download/{music_id}", headers=buyer)
+        for _ in range(CONCURRENCY)
+    ])
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200] * 5 + [400] * (CONCURRENCY - 5)
+    with Session(engine) as session:
+        purchase = session.exec(select(Purchase).where(Purchase.music_id == music_id)).one()
+        assert purchase.download_count == purchase.max_downloads == 5
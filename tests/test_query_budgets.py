@@ -0,0 +1,73 @@
+"""Budgets de requêtes SQL des listes : un N+1 fait échouer ces tests.
+
+Chaque liste est servie avec ROWS lignes ; les budgets ne dépendent pas de ce
+nombre (authentification comprise).
+"""
+import pytest
+from helpers import assert_max_queries, payment_code, register, register_admin, upload_music
+
+ROWS = 10
+
+@pytest.fixture(scope="module")
+def catalog(client):
+    artist = register(client, "artiste")
+    buyer = register(client)
+    music_ids = [upload_music(client, artist, f"Budget {index}", genre=("Rock", "Jazz")[index % 2]) for index in range(ROWS)]
+    for music_id in music_ids:
+        code = payment_code(client, artist, music_id)
+        assert client.post("/api/client/purchase", headers=buyer, json={"music_id": music_id, "payment_code": code}).status_code == 200
+        assert client.post("/api/client/favorites", headers=buyer, json={"music_id": music_id}).status_code == 200
+        assert client.post("/api/client/play-history", headers=buyer, json={"music_id": music_id, "duration_played": 30}).status_code == 200
+    for _ in range(ROWS):
+        register(client)
+    return {"artist": artist, "client": buyer, "admin": register_admin(client)}
+
+CLIENT_BUDGETS = {
+    "/api/client/musiques?limit=50": 3,
+    "/api/client/musiques?search=budget": 5,  # Recherche par trigrammes : termes, candidats, page
+    "/api/client/musiques/facets": 4,
+    "/api/client/genres": 3,
+    "/api/client/suggest?q=bud": 2,
+    "/api/client/recommendations": 8,  # + liste des plus populaires quand son cache est froid
+    "/api/client/charts": 4,
+    "/api/client/purchases": 5,
+    "/api/client/favorites": 5,
+    "/api/client/play-history": 5,
+    "/api/client/statistics": 6,
+}
+
+ADMIN_BUDGETS = {
+    "/api/admin/users?limit=100": 3,
+    "/api/admin/users/artists": 3,
+    "/api/admin/users/clients": 3,
+    "/api/admin/musics?limit=100": 3,
+    "/api/admin/genres": 4,
+    "/api/admin/statistics": 14,
+    "/api/admin/statistics/users?limit=100": 8,
+    "/api/admin/statistics/musics": 7,
+    "/api/admin/statistics/sales": 3,
+    "/api/admin/payment-codes": 3,
+    "/api/admin/recent-activity": 10,
+}
+
+@pytest.mark.parametrize("path, budget", CLIENT_BUDGETS.items())
+def test_client_list_query_budget(client, catalog, path, budget):
+    response = client.get(path, headers=catalog["client"])
+    assert_max_queries(response, budget)
+
+@pytest.mark.parametrize("path, budget", ADMIN_BUDGETS.items())
+def test_admin_list_query_budget(client, catalog, path, budget):
+    response = client.get(path, headers=catalog["admin"])
+    assert_max_queries(response, budget)
+
+def test_grouped_statistics_match_catalog(client, catalog):
+    users = client.get("/api/admin/statistics/users?limit=100", headers=catalog["admin"]).json()
+    assert any(stats["music_count"] == ROWS and stats["revenue"] == f"{2.5 * ROWS:.2f}" for stats in users)
+    assert any(
+        (stats["purchase_count"], stats["favorite_count"], stats["play_count"]) == (ROWS, ROWS, ROWS)
+        for stats in users
+    )
+    musics = client.get("/api/admin/statistics/musics?limit=100", headers=catalog["admin"]).json()
+    budget = [stats for stats in musics if stats["music"]["title"].startswith("Budget ")]
+    assert len(budget) == ROWS
+    assert all((stats["purchase_count"], stats["favorite_count"], stats["revenue"]) == (1, 1, "2.50") for stats in budget)
@@ -0,0 +1,31 @@
+"""Limitation de débit"""
+from concurrent.futures import ThreadPoolExecutor
+from ratelimit import InProcessBuckets, RateLimiter, RateLimitMiddleware, RatePolicy
+
+def test_counters_are_exact_under_concurrency():
+    limiter = RateLimiter(InProcessBuckets())
+    policy = RatePolicy("test", 100, 3600)
+    calls_per_thread, threads = 2000, 8
+
+    def work(thread: int) -> None:
+        for index in range(calls_per_thread):
+            limiter.hit(policy, f"user{index % 20}")
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(work, range(threads)))
+
+    stats = limiter.stats()
+    assert stats["allowed"]["test"] == 20 * 100
+    assert stats["allowed"]["test"] + stats["limited"]["test"] == calls_per_thread * threads
+
+def app_rate_limit_middleware() -> RateLimitMiddleware:
+    from main import app
+    options = next(middleware for middleware in app.user_middleware if middleware.cls is RateLimitMiddleware)
+    return RateLimitMiddleware(None, **options.kwargs)
+
+def test_bundle_has_its_own_policy():
+    middleware = app_rate_limit_middleware()
+    policy = lambda path: middleware.match({"method": "GET", "path": path}).name
+    assert policy("/api/client/download/bundle") == "bundle"
+    assert policy("/api/client/download/12") == "download"
+    assert policy("/api/client/stream/12") == "stream"
@@ -0,0 +1,30 @@
+"""Recalcul des recommandations partagé entre workers"""
+from sqlmodel import Session, delete
+from database import engine
+from models import JobLease
+from helpers import race
+import recommendations
+import time
+
+WORKERS = 8
+
+def test_only_one_worker_rebuilds(client, monkeypatch):
+    builds = []
+
+    def build_similarities():
+        builds.append(1)
+        time.sleep(0.3)  # Les autres workers arrivent pendant le calcul
+        return {"tracks": 0, "seconds": 0.3}
+
+    monkeypatch.setattr(recommendations, "build_similarities", build_similarities)
+    with Session(engine) as session:
+        session.exec(delete(JobLease))
+        session.commit()
+
+    results = race([lambda: recommendations.refresh_recommendations(max_age_seconds=0)] * WORKERS)
+    assert len(builds) == 1
+    assert sum("tracks" in result for result in results) == 1
+
+    # Bail libéré à la fin du calcul : le prochain recalcul peut avoir lieu
+    assert recommendations.claim_lease("recommendations", 60)
+    recommendations.release_lease("recommendations")
@@ -0,0 +1,82 @@
+"""Autocomplétion : classement et latence des préfixes"""
+from sqlmodel import Session, select
+from database import engine
+from models import Music, MusicStatus, User
+from suggest import KINDS, TRACK, Entry, SuggestIndex, entry_ref, match_score
+from helpers import create_user
+import heapq
+import random
+import time
+import pytest
+
+def expected_ranking(index: SuggestIndex, prefix: str, limit: int = 8):
+    """Classement de référence : toutes les entrées, sans index"""
+    scores = {}
+    for ref, entry in index._entries.items():
+        matches = [match_score(entry, key, prefix) for key in entry.keys if key.startswith(prefix)]
+        if matches:
+            scores[ref] = max(matches)
+    return [ref for _, ref in heapq.nlargest(limit, ((score, ref) for ref, score in scores.items()))]
+
+def ranking(index: SuggestIndex, query: str, limit: int = 8):
+    return [entry_ref(KINDS.index(item["type"]), item["id"]) for item in index.suggest(query, limit)]
+
+def test_long_prefix_ranks_by_popularity(client):
+    name = create_user(client, "artiste")
+    with Session(engine) as session:
+        artist = session.exec(select(User).where(User.username == name)).one()
+        session.add_all(
+            Music(title=f"The a{index:04d}", file_path="piste.mp3", status=MusicStatus.PUBLISHED,
+                  play_count=index, artist_id=artist.id)
+            for index in range(3000)
+        )
+        hit = Music(title="The zebra hit", file_path="piste.mp3", status=MusicStatus.PUBLISHED,
+                    play_count=10_000_000, artist_id=artist.id)
+        session.add(hit)
+        session.commit()
+        hit_id = hit.id
+
+    index = SuggestIndex()
+    index.build()
+    for query in ("th", "the", "the z"):
+        assert index.suggest(query)[0]["label"] == "The zebra hit", query
+    for prefix in ("t", "the", "the a2", "the a29", "the a2999"):
+        assert ranking(index, prefix) == expected_ranking(index, prefix), prefix
+
+    # Mises à jour incrémentales : retrait puis republication
+    index.remove_music(hit_id)
+    assert all(suggestion["label"] != "The zebra hit" for suggestion in index.suggest("the", 20))
+    with Session(engine) as session:
+        index.index_music(session.get(Music, hit_id))
+    assert index.suggest("the")[0]["label"] == "The zebra hit"
+    assert ranking(index, "the") == expected_ranking(index, "the")
+
+# ===== LATENCE =====
+
+WORDS = [
+    "the", "love", "fire", "night", "thunder", "dream", "heart", "summer", "dance", "light",
+    "rain", "blue", "gold", "river", "storm", "city", "star", "wild", "road", "moon",
+    "this", "that", "those", "thorn", "thrill", "through", "time", "tide", "tiger", "town",
+]
+
+@pytest.fixture(scope="module")
+def large_index():
+    """200 000 titres aux popularités très inégales (comme SUGGEST_MAX_TRACKS)"""
+    rng = random.Random(7)
+    entries = {}
+    for music_id in range(200_000):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))) + f" {music_id}"
+        entries[entry_ref(TRACK, music_id)] = Entry(title, None, int(rng.paretovariate(1.2) * 100), (title,))
+    index = SuggestIndex()
+    index.load_entries(entries)
+    return index
+
+def test_first_suggestion_is_fast_on_a_large_index(large_index):
+    queries = ("t", "th", "the", "thunder love", "thxyz", "the fire qzx", "love the", "lo", "summer night 1")
+    for query in queries:
+        started = time.perf_counter()
+        large_index.suggest(query)
+        elapsed = time.perf_counter() - started
+        # Objectif : moins d'une milliseconde ; marge pour les machines de CI
+        assert elapsed < 0.02, f"{query!r} : {elapsed * 1000:.1f} ms"
+        assert ranking(large_index, query) == expected_ranking(large_index, query), query